@@ -1,33 +1,59 @@
-import pandas as pd
-import json
-from datetime import datetime
-from pathlib import Path
+import time
+from datetime import datetime, timedelta
+
 import streamlit as st
-from rules import PatientInput, predict_state
 
-from utils.ui_data import log_prediction, load_stats
-from utils.ui_style import style_cards, style_sidebar, header
+# Configuración básica de la página (debe ser la primera llamada a Streamlit)
+st.set_page_config(
+    page_title="Clasificador de Enfermedades",
+    page_icon="🏥",
+    layout="centered",
+)
+
+# Duración de cada rerun del script (se registra al final)
+_rerun_started = time.perf_counter()
+
+# Solo módulos livianos al arrancar: pandas, pyarrow y Pillow se importan
+# dentro de las vistas que los usan
+from rules import PatientInput
+from rules_cache import cached_predict_state
+from utils import metrics
+from utils.ui_data import SORTABLE_COLUMNS, log_identity, log_prediction
+from utils.ui_style import header, inject_styles
 
-style_cards()
-style_sidebar()
+# Solo el primer rerun del proceso consulta MEDAPP_PROFILE (ver utils.metrics)
+metrics.maybe_start_profiler()
+inject_styles()
 
 # Valores de sesión base
 if "form_submitted" not in st.session_state:
     st.session_state["form_submitted"] = False
     submitted = False
 
-# Configuración básica de la página
-st.set_page_config(
-    page_title="Clasificador de Enfermedades",
-    page_icon="🏥",
-    layout="centered",
-)
-
 st.sidebar.title("Navegación")
-mode = st.sidebar.radio("Seleccionar vista", ["Realizar predicción", "Ver reporte"])
+mode = st.sidebar.radio(
+    "Seleccionar vista", ["Realizar predicción", "Ver reporte", "Operaciones"]
+)
 
 st.sidebar.markdown("---")
 
+# Nombres de las columnas ordenables de la tabla de predicciones
+SORT_LABELS = {
+    "timestamp": "Fecha",
+    "state": "Estado",
+    "age": "Edad",
+    "severity": "Severidad",
+    "duration_days": "Duración (días)",
+}
+
+
+def _export_csv() -> bytes:
+    from utils.export import export_bytes
+
+    with metrics.timed("csv"):
+        return export_bytes("csv")
+
+
 if mode == "Realizar predicción":
     # Mostrar formulario solo si no se ha enviado aún
     if not st.session_state["form_submitted"]:
@@ -109,6 +135,14 @@ if mode == "Realizar predicción":
             st.markdown("")
             submitted = st.form_submit_button("Predecir estado", type="secondary")
             if submitted:
+                # La imagen va al almacén en disco; la sesión guarda solo su hash
+                st.session_state["image_ref"] = None
+                if image_file is not None:
+                    from utils.images import store_upload
+
+                    with metrics.timed("image"):
+                        st.session_state["image_ref"] = store_upload(image_file)
+                    del st.session_state["image_file_input"]
                 st.session_state["form_submitted"] = True
                 st.rerun()
 
@@ -130,6 +164,7 @@ if mode == "Realizar predicción":
                     "refractory_pain_input",
                     "multiple_organ_failure_input",
                     "image_file_input",
+                    "image_ref",
                 ]:
                     if key in st.session_state:
                         del st.session_state[key]
@@ -137,7 +172,8 @@ if mode == "Realizar predicción":
                 st.rerun()
 
             # Construir el objeto PatientInput y "predecir"
-            has_recent_imaging = st.session_state.get("image_file_input") is not None
+            image_ref = st.session_state.get("image_ref")
+            has_recent_imaging = image_ref is not None
 
             try:
                 patient = PatientInput(
@@ -156,7 +192,16 @@ if mode == "Realizar predicción":
                     ),
                     has_recent_imaging=bool(has_recent_imaging),
                 )
-                state, explanation = predict_state(patient)
+                # ruleset trae NumPy: se importa al predecir, no al arrancar
+                import ruleset
+                import shadow
+
+                rules = ruleset.current()
+                started = time.perf_counter()
+                with metrics.timed("predict_state"):
+                    state, explanation = cached_predict_state(patient, rules)
+                rule_seconds = time.perf_counter() - started
+                metrics.record_prediction(state)
 
                 with st.expander("Ver detalle de los datos de entrada"):
                     st.json(
@@ -186,20 +231,29 @@ if mode == "Realizar predicción":
                 st.markdown(f"**Explicación:** {explanation}")
 
                 # Registrar la predicción en el log
-                log_prediction(state, explanation, patient)
+                with metrics.timed("log_prediction"):
+                    log_prediction(state, explanation, patient, rule_version=rules.version)
+                # Candidato en sombra (SHADOW_CANDIDATE): se evalúa en segundo plano
+                shadow.submit(patient, state, rules.version, rule_seconds)
 
-                if st.session_state.get("image_file_input") is not None:
+                if image_ref is not None:
                     st.info(
                         "**Doctor:** Se ha cargado una imagen diagnóstica reciente. "
                         "Es necesario revisarla manualmente antes de tomar cualquier decisión clínica."
                     )
 
                     with st.expander("Ver imagen diagnóstica cargada"):
-                        st.image(
-                            st.session_state.get("image_file_input"),
-                            caption="Imagen diagnóstica cargada (vista previa)",
-                            use_container_width=True,
-                        )
+                        from utils.images import preview_path
+
+                        preview = preview_path(image_ref)
+                        if preview.exists():
+                            st.image(
+                                str(preview),
+                                caption="Imagen diagnóstica cargada (vista previa)",
+                                use_container_width=True,
+                            )
+                        else:
+                            st.warning("No se pudo generar la vista previa de la imagen.")
 
             except Exception as e:
                 st.error(f"Ocurrió un error al calcular la predicción: {e}")
@@ -208,10 +262,12 @@ if mode == "Realizar predicción":
     [col1, col2, col3] = st.columns([3, 4, 3])  # Espaciar el botón al centro
     try:
         with col2:
-            df = pd.read_json("predictions_log.jsonl", lines=True)
+            if log_identity() is None:
+                raise FileNotFoundError("No hay predicciones registradas.")
+            # El CSV se genera solo al hacer clic (y se reutiliza si el log no cambió)
             st.download_button(
                 "Descargar listado de predicciones",
-                data=df.to_csv(index=False).encode("utf-8"),
+                data=_export_csv,
                 file_name="Reporte.csv",
                 mime="text/csv",
                 type="secondary",
@@ -230,7 +286,16 @@ if mode == "Realizar predicción":
 elif mode == "Ver reporte":
     st.title("Reporte de predicciones")
 
-    stats = load_stats()
+    from utils.report_cache import (
+        cached_sorted_table,
+        cached_stats,
+        cached_tail,
+        cached_trends,
+        prediction_page,
+    )
+
+    # Resultados compartidos entre reruns y sesiones mientras el log no cambie
+    stats = cached_stats()
 
     total_by_state = stats["total_by_state"]
     last_five = stats["last_five"]
@@ -243,7 +308,7 @@ elif mode == "Ver reporte":
     else:
         view = st.segmented_control(
             "Escoja la vista:",
-            ["Estadísticas", "Predicciones"],
+            ["Estadísticas", "Tendencias", "Predicciones"],
             default="Estadísticas",
         )
 
@@ -251,14 +316,113 @@ elif mode == "Ver reporte":
 
         if view == "Predicciones":
             try:
-                df = pd.read_json("predictions_log.jsonl", lines=True)
-                st.dataframe(
-                    df.sort_values(by="timestamp", ascending=False),
-                    width="content",
+                today = datetime.utcnow().date()
+                rango = st.date_input(
+                    "Rango de fechas (UTC)",
+                    value=(today - timedelta(days=30), today),
                 )
+                # Mientras se elige el rango, date_input devuelve una sola fecha
+                if not isinstance(rango, tuple):
+                    rango = (rango,)
+                start, end = (rango[0], rango[-1]) if rango else (today, today)
+
+                col_state, col_age, col_sev = st.columns(3)
+                states = col_state.multiselect(
+                    "Estado", sorted(total_by_state), placeholder="Todos"
+                )
+                age_range = col_age.slider("Edad", 0, 120, (0, 120))
+                severity_range = col_sev.slider("Severidad", 0.0, 10.0, (0.0, 10.0), 0.1)
+
+                col_sort, col_order, col_size = st.columns(3)
+                sort_by = col_sort.selectbox(
+                    "Ordenar por",
+                    SORTABLE_COLUMNS,
+                    format_func=lambda c: SORT_LABELS.get(c, c),
+                )
+                descending = col_order.radio(
+                    "Orden", ["Descendente", "Ascendente"], horizontal=True
+                ) == "Descendente"
+                page_size = col_size.selectbox("Filas por página", [25, 50, 100, 250], index=1)
+
+                filters = dict(
+                    start=start,
+                    end=end + timedelta(days=1),
+                    states=states or None,
+                    age_range=None if age_range == (0, 120) else age_range,
+                    severity_range=None if severity_range == (0.0, 10.0) else severity_range,
+                    sort_by=sort_by,
+                    descending=descending,
+                )
+                total = cached_sorted_table(**filters).num_rows
+                pages = max(1, -(-total // page_size))
+                # Al cambiar los filtros se vuelve a la primera página
+                if st.session_state.get("table_filters") != filters:
+                    st.session_state["table_filters"] = filters
+                    st.session_state["table_page"] = 1
+                elif st.session_state.get("table_page", 1) > pages:
+                    st.session_state["table_page"] = pages
+
+                page = st.number_input(
+                    f"Página (de {pages})",
+                    min_value=1,
+                    max_value=pages,
+                    step=1,
+                    key="table_page",
+                )
+                # Solo la página actual se pasa a pandas y al navegador
+                df, total = prediction_page(page - 1, page_size, **filters)
+                first = (page - 1) * page_size
+                st.caption(
+                    f"Mostrando filas {first + 1 if total else 0}–{first + len(df)} de {total}"
+                )
+                st.dataframe(df, width="content", hide_index=True)
             except Exception as e:
                 st.error(f"Ocurrió un error al cargar la tabla de predicciones: {e}")
 
+        elif view == "Tendencias":
+            try:
+                granularity = st.radio(
+                    "Agrupar por", ["day", "hour"], horizontal=True,
+                    format_func=lambda g: "Día" if g == "day" else "Hora",
+                )
+                now = datetime.utcnow()
+                # 30 días por día o 48 horas por hora
+                span = timedelta(days=30) if granularity == "day" else timedelta(hours=48)
+                trends = cached_trends(granularity, start=(now - span).isoformat())
+                trend = trends["trend"]
+                if trend.empty:
+                    st.info("No hay predicciones en el periodo.")
+                else:
+                    st.markdown("### Predicciones por estado")
+                    st.bar_chart(
+                        trend.pivot(index="bucket", columns="state", values="count").fillna(0)
+                    )
+                    # Promedios por tramo ponderados por el conteo de cada estado
+                    totals = trend.groupby("bucket")["count"].sum()
+                    col_sev, col_age = st.columns(2)
+                    for col, name, label in (
+                        (col_sev, "severity_avg", "Severidad promedio"),
+                        (col_age, "age_avg", "Edad promedio"),
+                    ):
+                        with col:
+                            st.markdown(f"### {label}")
+                            weighted = (trend[name] * trend["count"]).groupby(trend["bucket"]).sum()
+                            st.line_chart(weighted / totals)
+
+                    col_sev, col_age = st.columns(2)
+                    with col_sev:
+                        st.markdown("### Distribución de severidad")
+                        st.bar_chart(trends["severity"].groupby("bin")["count"].sum())
+                    with col_age:
+                        st.markdown("### Distribución de edad")
+                        ages = trends["age"].groupby("bin")["count"].sum()
+                        from utils.rollups import age_bin_label
+
+                        ages.index = [age_bin_label(b) for b in ages.index]
+                        st.bar_chart(ages, sort=False)
+            except Exception as e:
+                st.error(f"Ocurrió un error al cargar las tendencias: {e}")
+
         else:
             st.subheader("Número total de predicciones por categoría")
 
@@ -266,7 +430,8 @@ elif mode == "Ver reporte":
                 st.write(f"- **{state}**: {count} predicción(es)")
 
             st.markdown("### Últimas 5 predicciones")
-            for rec in reversed(last_five):  # más reciente primero
+            # Se leen solo los últimos bloques del log
+            for rec in reversed(cached_tail(5)):  # más reciente primero
                 st.markdown(
                     f"- `{rec.get('timestamp')}` — **{rec.get('state')}** "
                     f"(edad: {rec.get('inputs', {}).get('age')}, "
@@ -284,3 +449,151 @@ elif mode == "Ver reporte":
     st.caption(
         "El reporte se genera a partir de las predicciones almacenadas en el archivo de logs."
     )
+
+# --- Vista de operaciones ---
+elif mode == "Operaciones":
+    st.title("Operaciones")
+
+    st.subheader("Tiempo por etapa")
+    stages = metrics.STAGE_SECONDS.summary()
+    if stages:
+        st.table(
+            [
+                {
+                    "etapa": dict(key).get("stage"),
+                    "llamadas": s["count"],
+                    "promedio (ms)": round(s["avg"] * 1000, 3),
+                    "total (s)": round(s["sum"], 3),
+                }
+                for key, s in sorted(stages.items())
+            ]
+        )
+    else:
+        st.write("Aún no hay mediciones en este proceso.")
+
+    st.subheader("Predicciones por estado")
+    for key, count in sorted(metrics.PREDICTIONS.samples().items()):
+        st.write(f"- **{dict(key).get('state')}**: {count:g}")
+
+    st.subheader("Caché del reporte")
+    from utils import report_cache
+
+    cache = report_cache.default_cache.stats()
+    st.write(
+        f"{cache['size']} entradas, {cache['bytes'] / 2**20:.1f} de "
+        f"{cache['max_bytes'] / 2**20:.0f} MB — aciertos: {cache['hits']}, "
+        f"fallos: {cache['misses']}, descartes: {cache['evictions']}"
+    )
+
+    st.subheader("Conjunto de reglas")
+    import ruleset
+
+    rules = ruleset.current()
+    st.write(f"Versión **{rules.version}** ({rules.source}) — {rules.description}")
+    if ruleset.last_error():
+        st.error(f"No se pudo recargar {ruleset.RULESET_FILE}: {ruleset.last_error()}")
+
+    st.subheader("Escritor del log")
+    import utils.ui_data as ui_data
+    from utils.log_writer import WRITER_BATCH_SECONDS
+
+    if ui_data.LOG_ASYNC:
+        writer = ui_data.get_async_writer().stats()
+        batches = WRITER_BATCH_SECONDS.summary().get((), {"count": 0, "avg": 0.0})
+        st.write(
+            f"En cola: {writer['queue_depth']} de {ui_data.LOG_QUEUE_SIZE} "
+            f"(política: {ui_data.LOG_QUEUE_FULL}) — escritos: {writer['written']}, "
+            f"derramados: {writer['spilled']}, descartados: {writer['dropped']}, "
+            f"fallidos: {writer['failed']}"
+        )
+        st.caption(
+            f"{batches['count']} lotes, {batches['avg'] * 1000:.2f} ms promedio por lote"
+        )
+    else:
+        st.write("Escritura síncrona (PREDICTIONS_LOG_ASYNC=1 activa la cola en segundo plano).")
+
+    st.subheader("Evaluación en sombra")
+    import shadow
+    from utils.report_cache import cached_shadow_report
+
+    evaluator = shadow.get_evaluator()
+    report = None
+    if evaluator is None:
+        st.write("Sin candidato (SHADOW_CANDIDATE activa la evaluación en sombra).")
+    else:
+        queue_stats = evaluator.stats()
+        where = "proceso aparte" if queue_stats["mode"] == "process" else "hilo de fondo"
+        st.write(
+            f"Candidato **{queue_stats['candidate']}** ({where}) — en cola: {queue_stats['queue_depth']} "
+            f"de {shadow.QUEUE_SIZE}, evaluados: {queue_stats['evaluated']}, "
+            f"descartados: {queue_stats['dropped']}, errores: {queue_stats['errors']}"
+        )
+        if evaluator.last_error:
+            st.error(f"Falla del evaluador: {evaluator.last_error}")
+        # Solo se vuelve a leer el log en sombra cuando el evaluador agregó resultados
+        report = cached_shadow_report()
+    if report and report["total"]:
+        agreement = report["agreement"]
+        st.write(
+            f"{report['total']} evaluaciones de {report['candidate']}, acuerdo "
+            f"{'—' if agreement is None else f'{agreement:.1%}'}, {report['errors']} errores."
+        )
+        st.table(
+            [
+                {
+                    "": label,
+                    **{
+                        q: shadow.format_ms(report["latency"][who][q])
+                        for q in ("p50", "p95", "p99")
+                    },
+                }
+                for who, label in (("rule", "Reglas"), ("candidate", "Candidato"))
+            ]
+        )
+        st.caption("Confusión (filas: reglas; columnas: candidato)")
+        st.table(
+            [{"reglas": rule_state, **row} for rule_state, row in sorted(report["confusion"].items())]
+        )
+        st.caption(
+            f"Deriva (PSI) frente a los primeros {report['reference_size']} registros; "
+            f"≥ {shadow.DRIFT_PSI} se marca."
+        )
+        st.table(
+            [
+                {
+                    "día": day["day"],
+                    "registros": day["count"],
+                    "acuerdo": "—" if day["agreement"] is None else f"{day['agreement']:.1%}",
+                    **{dim: round(value, 3) for dim, value in day["psi"].items()},
+                    "deriva": ", ".join(day["drift"]),
+                }
+                for day in report["days"]
+            ]
+        )
+
+    st.subheader("Perfilador por muestreo")
+    # El perfilador es uno por proceso: el interruptor muestra y cambia su
+    # estado para todas las sesiones, no solo para esta
+    running = metrics.profiler_running()
+    profiling = st.toggle(
+        "Activar perfilador (compartido por todas las sesiones)",
+        value=running,
+        help="Muestrea las pilas de todos los hilos del servidor; también "
+        f"arranca con {metrics.PROFILE_ENV}=1.",
+    )
+    if profiling and not running:
+        metrics.start_profiler()
+    elif running and not profiling:
+        metrics.stop_profiler()
+    profiler = metrics.get_profiler()
+    if profiler is not None and profiler.total:
+        st.caption(f"{profiler.total} muestras")
+        st.code(
+            "\n".join(f"{count} {stack}" for stack, count in profiler.top(20)),
+            language="text",
+        )
+
+    with st.expander("Métricas (formato Prometheus)"):
+        st.code(metrics.render_prometheus(), language="text")
+
+metrics.STAGE_SECONDS.observe(time.perf_counter() - _rerun_started, stage="rerun")
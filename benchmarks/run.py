@@ -0,0 +1,285 @@
+# benchmarks/run.py
+"""
+Suite de benchmarks del camino de predicción.
+
+Mide:
+- predict_state: rendimiento (llamadas/s) y latencia p50/p99.
+- log_prediction: costo de agregar al log con 1, 4 y 16 escritores concurrentes.
+- load_stats: tiempo (en frío y en caliente) y memoria pico para logs de
+  1e3, 1e5 y 1e7 líneas.
+- log binario: bytes por registro y conteo por estado con NumPy sobre el
+  mapeo en memoria (utils/binlog.py), hasta BINLOG_MAX_SIZE líneas.
+- arranque: importación de las dependencias de app.py y primera ejecución
+  del script en un proceso nuevo (ver benchmarks/startup.py).
+
+Los resultados se guardan como JSON para compararlos entre commits. Con
+--baseline la corrida falla (código 1) si alguna métrica empeora más que
+--threshold respecto a la línea base.
+
+Uso:
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --quick --baseline bench.json --threshold 0.15
+    python -m benchmarks.run --import-report
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import utils.ui_data as ui_data
+from benchmarks.startup import bench_startup, import_report
+from benchmarks.synthetic import patients, write_log
+from rules import predict_state
+
+DEFAULT_WRITERS = (1, 4, 16)
+DEFAULT_SIZES = (1_000, 100_000, 10_000_000)
+QUICK_SIZES = (1_000, 10_000)
+# La conversión a binario es en Python puro: no se mide sobre logs mayores
+BINLOG_MAX_SIZE = 1_000_000
+
+
+def _percentile(sorted_values, q: float) -> float:
+    idx = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def _metric(value: float, unit: str, better: str) -> dict:
+    return {"value": value, "unit": unit, "better": better}
+
+
+def bench_predict_state(n: int) -> dict:
+    inputs = patients(n, seed=1)
+    latencies = []
+    clock = time.perf_counter_ns
+    started = clock()
+    for patient in inputs:
+        t0 = clock()
+        predict_state(patient)
+        latencies.append(clock() - t0)
+    elapsed = (clock() - started) / 1e9
+    latencies.sort()
+    return {
+        "predict_state.throughput": _metric(n / elapsed, "calls/s", "higher"),
+        "predict_state.p50_us": _metric(_percentile(latencies, 0.50) / 1e3, "us", "lower"),
+        "predict_state.p99_us": _metric(_percentile(latencies, 0.99) / 1e3, "us", "lower"),
+    }
+
+
+def _writer_worker(args) -> tuple[list[int], float]:
+    log_file, n, seed = args
+    ui_data.LOG_FILE = Path(log_file)
+    inputs = [(p, *predict_state(p)) for p in patients(n, seed)]
+    latencies = []
+    clock = time.perf_counter_ns
+    started = clock()
+    for patient, state, explanation in inputs:
+        t0 = clock()
+        ui_data.log_prediction(state, explanation, patient)
+        latencies.append(clock() - t0)
+    return latencies, (clock() - started) / 1e9
+
+
+def bench_log_prediction(writers: int, n_per_writer: int, workdir: Path) -> dict:
+    log_file = workdir / f"writers-{writers}.jsonl"
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(writers) as pool:
+        results = pool.map(
+            _writer_worker, [(str(log_file), n_per_writer, w) for w in range(writers)]
+        )
+    latencies = sorted(lat for worker, _ in results for lat in worker)
+    # Tiempo medido dentro de los procesos (sin el arranque del pool)
+    elapsed = max(seconds for _, seconds in results)
+    prefix = f"log_prediction.w{writers}"
+    return {
+        f"{prefix}.appends_per_s": _metric(len(latencies) / elapsed, "appends/s", "higher"),
+        f"{prefix}.p50_us": _metric(_percentile(latencies, 0.50) / 1e3, "us", "lower"),
+        f"{prefix}.p99_us": _metric(_percentile(latencies, 0.99) / 1e3, "us", "lower"),
+    }
+
+
+def bench_load_stats(size: int, workdir: Path) -> dict:
+    ui_data.LOG_FILE = write_log(workdir / f"log-{size}.jsonl", size)
+    checkpoint = ui_data.stats_checkpoint_file()
+
+    checkpoint.unlink(missing_ok=True)
+    t0 = time.perf_counter()
+    ui_data.load_stats()
+    cold = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    ui_data.load_stats()
+    warm = time.perf_counter() - t0
+
+    # Memoria pico en frío (corrida aparte: tracemalloc altera los tiempos)
+    checkpoint.unlink(missing_ok=True)
+    tracemalloc.start()
+    ui_data.load_stats()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ui_data.LOG_FILE.unlink()
+    checkpoint.unlink(missing_ok=True)
+    prefix = f"load_stats.{size}"
+    return {
+        f"{prefix}.cold_s": _metric(cold, "s", "lower"),
+        f"{prefix}.warm_s": _metric(warm, "s", "lower"),
+        f"{prefix}.peak_mb": _metric(peak / 2**20, "MB", "lower"),
+    }
+
+
+def bench_binlog(size: int, workdir: Path) -> dict:
+    from utils import binlog
+
+    jsonl = write_log(workdir / f"binlog-{size}.jsonl", size)
+    path = workdir / f"binlog-{size}.bin"
+    binlog.jsonl_to_binary(jsonl, path)
+
+    t0 = time.perf_counter()
+    binlog.state_counts(path)
+    elapsed = time.perf_counter() - t0
+
+    prefix = f"binlog.{size}"
+    metrics = {
+        f"{prefix}.jsonl_bytes_per_record": _metric(jsonl.stat().st_size / size, "B", "lower"),
+        f"{prefix}.bytes_per_record": _metric(path.stat().st_size / size, "B", "lower"),
+        f"{prefix}.state_counts_s": _metric(elapsed, "s", "lower"),
+    }
+    for f in (jsonl, path, binlog.vocab_file(path)):
+        f.unlink()
+    return metrics
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    sizes,
+    writers,
+    predict_calls: int,
+    appends_per_writer: int,
+    progress=print,
+    startup: bool = True,
+) -> dict:
+    metrics = {}
+    original_log = ui_data.LOG_FILE
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            workdir = Path(tmp)
+            if startup:
+                progress("arranque de app.py")
+                metrics.update(bench_startup(cwd=workdir))
+            progress(f"predict_state ({predict_calls} llamadas)")
+            metrics.update(bench_predict_state(predict_calls))
+            for w in writers:
+                progress(f"log_prediction ({w} escritores)")
+                metrics.update(bench_log_prediction(w, appends_per_writer, workdir))
+            for size in sizes:
+                progress(f"load_stats ({size} líneas)")
+                metrics.update(bench_load_stats(size, workdir))
+                if size <= BINLOG_MAX_SIZE:
+                    progress(f"log binario ({size} líneas)")
+                    metrics.update(bench_binlog(size, workdir))
+    finally:
+        ui_data.LOG_FILE = original_log
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created": datetime.utcnow().isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+        },
+        "metrics": metrics,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Métricas que empeoraron más que threshold (fracción) respecto a la línea base."""
+    regressions = []
+    for name, base in baseline.get("metrics", {}).items():
+        cur = current["metrics"].get(name)
+        if cur is None or not base["value"]:
+            continue
+        if base["better"] == "lower":
+            change = (cur["value"] - base["value"]) / base["value"]
+        else:
+            change = (base["value"] - cur["value"]) / base["value"]
+        if change > threshold:
+            regressions.append(
+                f"{name}: {base['value']:.4g} → {cur['value']:.4g} {cur['unit']} "
+                f"({change:+.1%} peor)"
+            )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks del camino de predicción.")
+    parser.add_argument("--output", type=Path, default=Path("bench.json"))
+    parser.add_argument("--quick", action="store_true", help="Tamaños pequeños para CI")
+    parser.add_argument("--sizes", type=int, nargs="+", help="Líneas de log para load_stats")
+    parser.add_argument("--writers", type=int, nargs="+", default=list(DEFAULT_WRITERS))
+    parser.add_argument("--predict-calls", type=int, default=200_000)
+    parser.add_argument("--appends", type=int, default=500, help="Escrituras por escritor")
+    parser.add_argument(
+        "--no-startup", action="store_true", help="Omitir el tiempo de arranque de app.py"
+    )
+    parser.add_argument(
+        "--import-report",
+        action="store_true",
+        help="Solo mostrar los módulos más lentos de importar al arrancar app.py",
+    )
+    parser.add_argument("--baseline", type=Path, help="JSON de una corrida anterior")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Empeoramiento máximo tolerado (fracción) con --baseline",
+    )
+    args = parser.parse_args(argv)
+
+    if args.import_report:
+        for name, seconds in import_report():
+            print(f"{name:40s} {seconds * 1000:10.1f} ms")
+        return 0
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)
+    predict_calls = 20_000 if args.quick else args.predict_calls
+    result = run(
+        sizes, args.writers, predict_calls, args.appends, startup=not args.no_startup
+    )
+
+    args.output.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    for name, m in result["metrics"].items():
+        print(f"{name:40s} {m['value']:>14.4g} {m['unit']}")
+    print(f"Resultados guardados en {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print("Regresiones detectadas:")
+            for line in regressions:
+                print(f"- {line}")
+            return 1
+        print("Sin regresiones respecto a la línea base.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+# benchmarks/startup.py
+"""
+Tiempo de arranque de la app (arranque en frío de un contenedor).
+
+- app_imports(): importaciones de nivel superior de app.py (se leen con ast,
+  así una importación pesada nueva al inicio del script se mide sola).
+- bench_startup(): en procesos nuevos, tiempo de importar esas dependencias
+  y de la primera ejecución completa de app.py (streamlit.testing).
+- import_report(): módulos que más tardan en importarse (python -X importtime).
+
+Uso:
+    python -m benchmarks.startup          # reporte de importación
+"""
+import ast
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_FILE = ROOT / "app.py"
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)")
+
+_FIRST_RUN = """
+import time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+AppTest.from_file({app!r}, default_timeout=120).run()
+print(time.perf_counter() - t0)
+"""
+
+
+def app_imports(path: Path = APP_FILE) -> list[str]:
+    """Módulos importados en el nivel superior de app.py, en orden."""
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def _python(code: str, cwd: Path) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def _timed_import(modules, cwd: Path) -> float:
+    code = (
+        "import time\n"
+        "t0 = time.perf_counter()\n"
+        + "".join(f"import {name}\n" for name in modules)
+        + "print(time.perf_counter() - t0)"
+    )
+    return float(_python(code, cwd).stdout.strip().splitlines()[-1])
+
+
+def import_report(modules=None, top: int = 15, cwd: Path = ROOT) -> list[tuple[str, float]]:
+    """(módulo de primer nivel, segundos acumulados) de los más lentos al importar."""
+    modules = modules or app_imports()
+    code = "".join(f"import {name}\n" for name in modules)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    totals = {}
+    for line in proc.stderr.splitlines():
+        m = _IMPORTTIME_LINE.match(line)
+        # Solo importaciones de primer nivel (sin sangría extra en el árbol)
+        if m and len(m.group(3)) == 1:
+            totals[m.group(4)] = int(m.group(2)) / 1e6
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def bench_startup(repeat: int = 3, cwd: Path = ROOT, first_run: bool = True) -> dict:
+    """
+    Mejor tiempo de `repeat` procesos nuevos para importar las dependencias
+    de app.py y, opcionalmente, para la primera ejecución completa del script.
+    """
+    from benchmarks.run import _metric
+
+    modules = app_imports()
+    metrics = {
+        "startup.import_s": _metric(
+            min(_timed_import(modules, cwd) for _ in range(repeat)), "s", "lower"
+        )
+    }
+    if first_run:
+        code = _FIRST_RUN.format(app=str(APP_FILE))
+        seconds = min(
+            float(_python(code, cwd).stdout.strip().splitlines()[-1]) for _ in range(repeat)
+        )
+        metrics["startup.first_run_s"] = _metric(seconds, "s", "lower")
+    return metrics
+
+
+if __name__ == "__main__":
+    print("Importaciones de nivel superior de app.py:", ", ".join(app_imports()))
+    for name, seconds in import_report():
+        print(f"{name:40s} {seconds * 1000:10.1f} ms")
@@ -0,0 +1,76 @@
+# benchmarks/synthetic.py
+"""
+Generador de pacientes sintéticos con los mismos rangos del formulario de
+app.py: edad 0–120 (entero), severidad 0–10 en pasos de 0.1, duración
+0–3650 días y las banderas clínicas (mayormente en falso).
+"""
+import json
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from rules import PatientInput, predict_state
+
+AGE_RANGE = (0, 120)
+SEVERITY_RANGE = (0.0, 10.0)
+DURATION_RANGE = (0, 3650)
+
+# Probabilidad de cada bandera en los datos sintéticos
+FLAG_PROBABILITY = {
+    "has_chronic_disease": 0.25,
+    "has_metastasis": 0.05,
+    "recent_weight_loss": 0.10,
+    "is_bedridden": 0.08,
+    "refractory_pain": 0.08,
+    "multiple_organ_failure": 0.03,
+    "has_recent_imaging": 0.30,
+}
+
+
+def random_patient(rng: random.Random) -> PatientInput:
+    """Un paciente con valores dentro de los rangos de la UI."""
+    age = min(max(int(rng.gauss(50, 20)), AGE_RANGE[0]), AGE_RANGE[1])
+    severity = rng.randint(0, 100) / 10
+    # Mayoría de cuadros cortos, con cola larga de cuadros crónicos
+    duration = min(int(rng.expovariate(1 / 20)), DURATION_RANGE[1])
+    flags = {name: rng.random() < p for name, p in FLAG_PROBABILITY.items()}
+    return PatientInput(age=age, severity=severity, duration_days=duration, **flags)
+
+
+def patients(n: int, seed: int = 0) -> list[PatientInput]:
+    rng = random.Random(seed)
+    return [random_patient(rng) for _ in range(n)]
+
+
+def log_lines(n: int, seed: int = 0, distinct: int = 10_000):
+    """
+    Genera n líneas del log JSONL (con timestamps crecientes). Para poder
+    generar logs muy grandes se serializan a lo sumo `distinct` pacientes y
+    se reutilizan cambiando solo el timestamp.
+    """
+    pool = []
+    for patient in patients(min(n, distinct), seed):
+        state, explanation = predict_state(patient)
+        body = json.dumps(
+            {"state": state, "explanation": explanation, "inputs": vars(patient)},
+            ensure_ascii=False,
+        )
+        pool.append(body[1:])  # sin la llave inicial
+
+    start = datetime(2024, 1, 1)
+    for i in range(n):
+        ts = (start + timedelta(seconds=i)).isoformat()
+        yield f'{{"timestamp": "{ts}", {pool[i % len(pool)]}\n'
+
+
+def write_log(path: Path, n: int, seed: int = 0, chunk: int = 100_000) -> Path:
+    """Escribe un log sintético de n líneas en path."""
+    buf = []
+    with Path(path).open("w", encoding="utf-8") as f:
+        for line in log_lines(n, seed):
+            buf.append(line)
+            if len(buf) >= chunk:
+                f.write("".join(buf))
+                buf = []
+        f.write("".join(buf))
+    return Path(path)
@@ -0,0 +1,409 @@
+# rescore.py
+"""
+Recálculo del historial de predicciones al cambiar las reglas.
+
+Vuelve a clasificar las entradas guardadas en el log con dos versiones de
+las reglas (la anterior y la nueva) y cuenta cuántos pacientes pasan de
+cada estado a cada otro (matriz de transición), con una muestra de los
+registros que cambian.
+
+El trabajo se reparte en un pool de procesos por fragmentos del log: rangos
+de bytes del log JSONL activo (cada proceso lee y parsea su propio rango),
+un fragmento por segmento rotado y rangos de id con el backend SQLite. El
+proceso principal solo suma los resultados, así que el tiempo escala con el
+número de núcleos.
+
+Versiones de las reglas (--old / --new):
+- Ruta a un conjunto de reglas .json (ver ruleset.py); por defecto --new es
+  el conjunto activo (RULESET_FILE).
+- "módulo:función", p. ej. "rules:predict_state".
+- Ruta a un archivo .py que define predict_state.
+- "git:REV" o "git:REV:ruta", p. ej. "git:HEAD~1": rulesets/default.json en
+  ese commit (rules.py si ese commit aún no lo tiene), o la ruta dada, p. ej.
+  "git:HEAD~1:rulesets/estricto.json".
+
+Uso:
+    python rescore.py --old git:HEAD~1 --workers 8 --sample 20 --sample-out cambios.jsonl
+"""
+import argparse
+import heapq
+import importlib
+import os
+import subprocess
+import sys
+import time
+import types
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import utils.ui_data as ui_data
+from rules import PatientKey
+
+DEFAULT_SAMPLE_SIZE = 20
+# Bytes del log JSONL por fragmento (a lo más; se achica para repartir entre procesos)
+SHARD_BYTES = 16 * 2**20
+MIN_SHARD_BYTES = 2**20
+# Registros por fragmento con el backend SQLite
+SHARD_ROWS = 200_000
+# Entradas distintas que recuerda cada proceso antes de vaciar su memo
+MEMO_SIZE = 200_000
+# Conjunto de reglas que se lee con "git:REV" sin ruta
+GIT_RULESET_PATH = "rulesets/default.json"
+
+_rules = {}  # "old" / "new" ⇒ función, en cada proceso del pool
+
+
+# --- Versiones de las reglas ---
+
+
+def resolve_rules(spec: str) -> tuple:
+    """
+    Descriptor serializable de una versión de las reglas, para cargarla en
+    cada proceso del pool sin volver a consultar git.
+    """
+    if spec.startswith("git:"):
+        rev, _, path = spec[4:].partition(":")
+        root = Path(__file__).resolve().parent
+        if not path:
+            has_ruleset = subprocess.run(
+                ["git", "cat-file", "-e", f"{rev}:{GIT_RULESET_PATH}"],
+                cwd=root,
+                capture_output=True,
+            ).returncode == 0
+            path = GIT_RULESET_PATH if has_ruleset else "rules.py"
+        source = subprocess.run(
+            ["git", "show", f"{rev}:{path}"],
+            cwd=root,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        return ("ruleset" if path.endswith(".json") else "source", spec, source)
+    if spec.endswith(".py"):
+        return ("source", spec, Path(spec).read_text(encoding="utf-8"))
+    if spec.endswith(".json"):
+        return ("ruleset", spec, Path(spec).read_text(encoding="utf-8"))
+    return ("import", spec)
+
+
+def load_rules(descriptor: tuple):
+    """Función predict_state de una versión resuelta con resolve_rules."""
+    if descriptor[0] == "import":
+        module_name, _, attr = descriptor[1].partition(":")
+        return getattr(importlib.import_module(module_name), attr or "predict_state")
+    if descriptor[0] == "ruleset":
+        import ruleset
+
+        _, name, text = descriptor
+        return ruleset.parse_ruleset(text, source=name).predict
+    _, name, source = descriptor
+    module = types.ModuleType(f"rules_{zlib.crc32(name.encode()):08x}")
+    exec(compile(source, name, "exec"), module.__dict__)
+    return module.predict_state
+
+
+def _init_worker(old: tuple, new: tuple) -> None:
+    _rules["old"] = load_rules(old)
+    _rules["new"] = load_rules(new)
+
+
+# --- Fragmentos del historial ---
+
+
+def plan_shards(workers: int = 1, start=None, end=None) -> list[tuple]:
+    """
+    Fragmentos del historial en orden: ("gzip", ruta), ("jsonl", ruta, inodo,
+    desde, hasta) o ("sqlite", ruta, id_desde, id_hasta). El log activo se
+    toma hasta su tamaño actual; lo que llegue después no se recalcula.
+    """
+    if ui_data._use_sqlite():
+        if not ui_data.DB_FILE.exists():
+            return []
+        with ui_data.get_store().session() as conn:
+            (max_id,) = conn.execute("SELECT MAX(id) FROM predictions").fetchone()
+        return [
+            ("sqlite", str(ui_data.DB_FILE), lo, min(lo + SHARD_ROWS, max_id))
+            for lo in range(0, max_id or 0, SHARD_ROWS)
+        ]
+
+    shards = [
+        ("gzip", str(ui_data.SEGMENTS_DIR / segment["file"]))
+        for segment in ui_data.read_manifest()
+        if not (
+            (start is not None and segment["end"] and segment["end"] < start)
+            or (end is not None and segment["start"] and segment["start"] >= end)
+        )
+    ]
+    try:
+        st = ui_data.LOG_FILE.stat()
+    except FileNotFoundError:
+        return shards
+    size = max(MIN_SHARD_BYTES, min(SHARD_BYTES, st.st_size // (4 * max(1, workers)) + 1))
+    shards += [
+        ("jsonl", str(ui_data.LOG_FILE), st.st_ino, lo, min(lo + size, st.st_size))
+        for lo in range(0, st.st_size, size)
+    ]
+    return shards
+
+
+def _iter_jsonl_range(path: str, inode: int, lo: int, hi: int):
+    """Registros de las líneas que empiezan en [lo, hi)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_ino != inode:
+            raise RuntimeError(
+                "El log fue rotado durante el recálculo; vuelva a ejecutarlo."
+            )
+        if lo > 0:
+            # La línea que cruza lo pertenece al fragmento anterior
+            f.seek(lo - 1)
+            f.readline()
+        pos = f.tell()
+        while pos < hi:
+            raw = f.readline()
+            if not raw.endswith(b"\n"):
+                return
+            pos += len(raw)
+            rec = ui_data._parse_line(raw)
+            if rec is not None:
+                yield rec
+
+
+def _iter_shard(shard: tuple):
+    kind = shard[0]
+    if kind == "gzip":
+        import gzip
+
+        with gzip.open(shard[1], "rb") as f:
+            for raw in f:
+                rec = ui_data._parse_line(raw)
+                if rec is not None:
+                    yield rec
+    elif kind == "jsonl":
+        yield from _iter_jsonl_range(*shard[1:])
+    else:
+        from utils.log_store import SqliteLogStore
+
+        store = SqliteLogStore(Path(shard[1]))
+        last_id, hi = shard[2], shard[3]
+        while last_id < hi:
+            rows = store.read_after(last_id, min(10_000, hi - last_id))
+            if not rows:
+                return
+            for row_id, rec in rows:
+                if row_id > hi:
+                    return
+                yield rec
+            last_id = rows[-1][0]
+
+
+# --- Recálculo ---
+
+
+def _sample_key(rec: dict) -> int:
+    """Orden pseudoaleatorio estable de un registro, para muestrear de forma mezclable."""
+    return zlib.crc32(f"{rec.get('timestamp')}|{sorted(rec['inputs'].items())}".encode())
+
+
+def rescore_shard(shard: tuple, start=None, end=None, sample_size: int = DEFAULT_SAMPLE_SIZE) -> dict:
+    """Recalcula un fragmento con las reglas cargadas en este proceso."""
+    old, new = _rules["old"], _rules["new"]
+    memo = {}
+    transitions = Counter()
+    rows = invalid = stored_mismatch = 0
+    sample = []  # montículo de (-llave, n, registro): las sample_size llaves menores
+    for rec in _iter_shard(shard):
+        if not ui_data._in_range(rec, start, end):
+            continue
+        inputs = rec.get("inputs") or {}
+        rows += 1
+        try:
+            key = PatientKey(**{name: inputs[name] for name in ui_data.INPUT_FIELDS})
+        except (KeyError, TypeError):
+            invalid += 1
+            continue
+        result = memo.get(key)
+        if result is None:
+            try:
+                result = (old(key), new(key))
+            except (ValueError, TypeError):
+                result = ()
+            if len(memo) >= MEMO_SIZE:
+                memo.clear()
+            memo[key] = result
+        if not result:
+            invalid += 1
+            continue
+        (old_state, old_expl), (new_state, new_expl) = result
+        transitions[(old_state, new_state)] += 1
+        if rec.get("state") != old_state:
+            stored_mismatch += 1
+        if old_state != new_state and sample_size > 0:
+            k = _sample_key(rec)
+            if len(sample) < sample_size or -sample[0][0] > k:
+                item = (
+                    -k,
+                    rows,
+                    {
+                        "timestamp": rec.get("timestamp"),
+                        "inputs": inputs,
+                        "old_state": old_state,
+                        "new_state": new_state,
+                        "old_explanation": old_expl,
+                        "new_explanation": new_expl,
+                    },
+                )
+                if len(sample) < sample_size:
+                    heapq.heappush(sample, item)
+                else:
+                    heapq.heapreplace(sample, item)
+    return {
+        "rows": rows,
+        "invalid": invalid,
+        "stored_mismatch": stored_mismatch,
+        "transitions": transitions,
+        "sample": [(-neg, rec) for neg, _, rec in sample],
+    }
+
+
+def _rescore_shard_star(args):
+    return rescore_shard(*args)
+
+
+def rescore(
+    old: str,
+    new: str | None = None,
+    workers: int = 1,
+    start=None,
+    end=None,
+    sample_size: int = DEFAULT_SAMPLE_SIZE,
+    progress=None,
+) -> dict:
+    """
+    Recalcula el historial con las reglas old y new (por defecto el conjunto
+    de reglas activo, ruleset.RULESET_FILE). Devuelve filas leídas,
+    inválidas, cuántas no coinciden con el estado guardado al usar old,
+    transiciones {(estado anterior, estado nuevo): n}, cambiadas, una
+    muestra uniforme de hasta sample_size registros cambiados, segundos y
+    filas por segundo.
+    """
+    started = time.perf_counter()
+    if new is None:
+        import ruleset
+
+        new = str(ruleset.RULESET_FILE)
+    descriptors = (resolve_rules(old), resolve_rules(new))
+    shards = plan_shards(workers, start, end)
+    tasks = [(shard, start, end, sample_size) for shard in shards]
+
+    if workers <= 1:
+        _init_worker(*descriptors)
+        results = map(_rescore_shard_star, tasks)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=descriptors
+        )
+        results = pool.map(_rescore_shard_star, tasks)
+
+    summary = {"rows": 0, "invalid": 0, "stored_mismatch": 0}
+    transitions = Counter()
+    sample = []
+    try:
+        for done, part in enumerate(results, 1):
+            for name in summary:
+                summary[name] += part[name]
+            transitions.update(part["transitions"])
+            sample = heapq.nsmallest(sample_size, sample + part["sample"], key=lambda s: s[0])
+            if progress is not None:
+                elapsed = time.perf_counter() - started
+                progress(
+                    f"{done}/{len(tasks)} fragmentos, {summary['rows']} filas "
+                    f"({summary['rows'] / elapsed:,.0f} filas/s)"
+                )
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    elapsed = time.perf_counter() - started
+    return {
+        **summary,
+        "transitions": dict(transitions),
+        "changed": sum(n for (a, b), n in transitions.items() if a != b),
+        "sample": [rec for _, rec in sorted(sample, key=lambda s: s[1]["timestamp"] or "")],
+        "seconds": elapsed,
+        "rows_per_second": summary["rows"] / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def transition_matrix(transitions: dict):
+    """Matriz de transición como DataFrame: filas = estado anterior, columnas = nuevo."""
+    import pandas as pd
+
+    states = sorted({s for pair in transitions for s in pair})
+    matrix = pd.DataFrame(0, index=states, columns=states, dtype="int64")
+    for (old_state, new_state), n in transitions.items():
+        matrix.loc[old_state, new_state] = n
+    matrix.index.name = "anterior \\ nuevo"
+    return matrix
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Recalcula el historial con dos versiones de las reglas."
+    )
+    parser.add_argument("--old", required=True, help="Reglas anteriores (.json, módulo:función, .py o git:REV)")
+    parser.add_argument("--new", default=None, help="Reglas nuevas (por defecto el conjunto activo)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Procesos para recalcular fragmentos en paralelo",
+    )
+    parser.add_argument("--start", default=None, help="Timestamp ISO inicial (incluido)")
+    parser.add_argument("--end", default=None, help="Timestamp ISO final (excluido)")
+    parser.add_argument("--sample", type=int, default=DEFAULT_SAMPLE_SIZE, help="Registros cambiados a mostrar")
+    parser.add_argument("--sample-out", type=Path, default=None, help="Guardar la muestra como JSONL")
+    parser.add_argument("--log-file", type=Path, default=None, help="Log de predicciones a recalcular")
+    args = parser.parse_args(argv)
+
+    if args.log_file is not None:
+        ui_data.LOG_FILE = args.log_file
+
+    def progress(msg):
+        print(msg, file=sys.stderr)
+
+    summary = rescore(
+        args.old,
+        args.new,
+        workers=args.workers,
+        start=args.start,
+        end=args.end,
+        sample_size=args.sample,
+        progress=progress,
+    )
+    scored = summary["rows"] - summary["invalid"]
+    print(
+        f"{summary['rows']} registros en {summary['seconds']:.2f} s "
+        f"({summary['rows_per_second']:,.0f} filas/s); {summary['invalid']} inválidos; "
+        f"{summary['changed']} cambian de estado ({summary['changed'] / max(1, scored):.2%})."
+    )
+    if summary["stored_mismatch"]:
+        print(
+            f"Aviso: en {summary['stored_mismatch']} registros las reglas anteriores no "
+            "dan el estado guardado en el log."
+        )
+    if summary["transitions"]:
+        print(transition_matrix(summary["transitions"]).to_string())
+    for rec in summary["sample"]:
+        print(f"- {rec['timestamp']}: {rec['old_state']} → {rec['new_state']} {rec['inputs']}")
+    if args.sample_out is not None:
+        from utils.log_writer import encode_record
+
+        args.sample_out.write_bytes(b"".join(encode_record(rec) for rec in summary["sample"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
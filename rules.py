@@ -1,4 +1,5 @@
 # rules.py
+import math
 from dataclasses import dataclass
 
 
@@ -16,6 +17,43 @@ class PatientInput:
     has_recent_imaging: bool  # ¿se cargó imagen diagnóstica reciente?
 
 
+@dataclass(frozen=True, slots=True)
+class PatientKey:
+    """
+    Variante inmutable y hashable de PatientInput (mismos campos), usable
+    como llave de caché. from_input normaliza los tipos sin alterar el
+    resultado de predict_state.
+    """
+
+    age: int
+    severity: float
+    duration_days: int
+    has_chronic_disease: bool
+    has_metastasis: bool
+    recent_weight_loss: bool
+    is_bedridden: bool
+    refractory_pain: bool
+    multiple_organ_failure: bool
+    has_recent_imaging: bool
+
+    @classmethod
+    def from_input(cls, inp: "PatientInput | PatientKey") -> "PatientKey":
+        if isinstance(inp, cls):
+            return inp
+        return cls(
+            age=inp.age,
+            severity=float(inp.severity),
+            duration_days=inp.duration_days,
+            has_chronic_disease=bool(inp.has_chronic_disease),
+            has_metastasis=bool(inp.has_metastasis),
+            recent_weight_loss=bool(inp.recent_weight_loss),
+            is_bedridden=bool(inp.is_bedridden),
+            refractory_pain=bool(inp.refractory_pain),
+            multiple_organ_failure=bool(inp.multiple_organ_failure),
+            has_recent_imaging=bool(inp.has_recent_imaging),
+        )
+
+
 # Estados posibles
 NO_ENFERMO = "NO ENFERMO"
 LEVE = "ENFERMEDAD LEVE"
@@ -23,17 +61,41 @@ AGUDA = "ENFERMEDAD AGUDA"
 CRONICA = "ENFERMEDAD CRÓNICA"
 TERMINAL = "ENFERMEDAD TERMINAL"
 
+INVALID_MESSAGE = "Entradas inválidas: age>=0, duration_days>=0, severity en [0,10]."
+
 
 def predict_state(inp: PatientInput) -> tuple[str, str]:
     """
     Simula la predicción del modelo usando reglas simples.
     Devuelve (estado, explicación).
 
+    Las reglas (y su orden) están en ruleset.RuleSet; los umbrales, en el
+    conjunto de reglas activo (rulesets/default.json o RULESET_FILE), así
+    que el resultado sigue las recargas en caliente. Lanza ValueError si
+    las entradas son inválidas (INVALID_MESSAGE): edad o duración negativas,
+    NaN o infinitas, o severidad fuera de [0,10] o NaN.
+
+    Retorna: (estado, explicación)
+    """
+    # Importación diferida: ruleset importa este módulo (y NumPy)
+    import ruleset
+
+    return ruleset.current().evaluate(inp)
+
+
+def reference_predict_state(inp: PatientInput) -> tuple[str, str]:
+    """
+    Las mismas reglas con los umbrales de rulesets/default.json escritos en
+    el código. No depende de ruleset.py: es la referencia independiente con
+    la que verify_rules y las pruebas comparan predict_state, la tabla
+    compilada, la versión por lotes y la caché.
+
     Lógica (orden importante):
-    - Si la duración > 30 días ⇒ CRÓNICA
-    - Si severidad ≥ 6 y duración ≤ 30 ⇒ AGUDA
+    - Severidad ≥ 8, ≥ 2 banderas rojas y curso largo, o ≥ 4 banderas ⇒ TERMINAL
+    - Duración > 30 días con enfermedad crónica, o > 60 días ⇒ CRÓNICA
+    - Si severidad ≥ 6 ⇒ AGUDA
     - Si severidad ∈ [3,5] y duración ≤ 7 ⇒ LEVE
-    - Si severidad ≤ 2 y duración ≤ 2 y edad < 65 ⇒ NO ENFERMO
+    - Si severidad ≤ 2 y duración ≤ 2 y edad < 65 sin comorbilidad ⇒ NO ENFERMO
     - En cualquier otro caso, por seguridad clínica mínima ⇒ LEVE
 
     Retorna: (estado, explicación)
@@ -42,11 +104,9 @@ def predict_state(inp: PatientInput) -> tuple[str, str]:
     sev = inp.severity
     dur = inp.duration_days
 
-    # Validaciones básicas
-    if age < 0 or dur < 0 or not (0 <= sev <= 10):
-        raise ValueError(
-            "Entradas inválidas: age>=0, duration_days>=0, severity en [0,10]."
-        )
+    # Validaciones básicas, en positivo para que NaN (y el infinito) sean inválidos
+    if not (0 <= age < math.inf and 0 <= dur < math.inf and 0 <= sev <= 10):
+        raise ValueError(INVALID_MESSAGE)
 
     # --- Reglas para ENFERMEDAD TERMINAL ---
     red_flags = sum(
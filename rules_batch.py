@@ -0,0 +1,59 @@
+# rules_batch.py
+from dataclasses import fields
+
+import numpy as np
+
+from rules import PatientInput
+
+# Campos de entrada, en el mismo orden que PatientInput
+FIELDS = tuple(f.name for f in fields(PatientInput))
+
+
+def columns(data) -> dict:
+    """
+    Extrae las diez columnas de un DataFrame o de un mapeo de arreglos:
+    numéricas como float64 (un vacío queda NaN) y banderas como bool.
+    """
+    missing = [name for name in FIELDS if name not in data]
+    if missing:
+        raise ValueError(f"Faltan columnas de entrada: {', '.join(missing)}.")
+
+    cols = {}
+    for name in FIELDS:
+        values = data[name]
+        numeric = name in ("age", "severity", "duration_days")
+        if hasattr(values, "to_numpy"):
+            # Columnas de pandas con nulos (Int64, boolean): un número vacío
+            # queda NaN (fila inválida) y una bandera vacía cuenta como ausente
+            values = values.to_numpy(
+                dtype=np.float64 if numeric else bool, na_value=np.nan if numeric else False
+            )
+        values = np.asarray(values)
+        if numeric:
+            cols[name] = values.astype(np.float64, copy=False)
+        else:
+            cols[name] = values.astype(bool, copy=False)
+
+    n = len(cols["age"])
+    if any(len(v) != n for v in cols.values()):
+        raise ValueError("Todas las columnas de entrada deben tener la misma longitud.")
+    return cols
+
+
+def predict_state_batch(data, on_invalid: str = "raise") -> tuple[np.ndarray, np.ndarray]:
+    """
+    Versión vectorizada de rules.predict_state con el conjunto de reglas
+    activo (ruleset.current().predict_batch).
+    Recibe un DataFrame de pandas o un mapeo {campo: arreglo} con los mismos
+    diez campos que PatientInput y devuelve (estados, explicaciones) como
+    arreglos de objetos de NumPy.
+
+    on_invalid:
+    - "raise" ⇒ lanza ValueError (mismo mensaje que predict_state) si alguna
+      fila es inválida.
+    - "mark" ⇒ las filas inválidas quedan con estado None y el mensaje de
+      error como explicación.
+    """
+    import ruleset
+
+    return ruleset.current().predict_batch(data, on_invalid=on_invalid)
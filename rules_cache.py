@@ -0,0 +1,96 @@
+# rules_cache.py
+import os
+import threading
+from collections import OrderedDict
+
+from rules import PatientInput, PatientKey
+
+# Capacidad de la caché por defecto (0 = sin caché)
+DEFAULT_CACHE_SIZE = int(os.environ.get("PREDICT_CACHE_SIZE", "0"))
+
+
+class PredictionCache:
+    """
+    Caché LRU acotada delante de predict_state.
+
+    La llave es la huella del conjunto de reglas (el dado o el activo de
+    ruleset.py) y el PatientKey normalizado de la entrada: al recargar las
+    reglas las entradas anteriores dejan de usarse y salen por LRU. El
+    valor es la tupla (estado, explicación). Las entradas inválidas no se
+    guardan: la excepción de predict_state se propaga igual que sin caché.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        if maxsize < 0:
+            raise ValueError("maxsize debe ser >= 0.")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def predict(self, inp: PatientInput | PatientKey, rules=None) -> tuple[str, str]:
+        if rules is None:
+            import ruleset
+
+            rules = ruleset.current()
+        if self.maxsize == 0:
+            return rules.predict(inp)
+
+        patient = PatientKey.from_input(inp)
+        key = (rules.fingerprint, patient)
+        with self._lock:
+            result = self._data.get(key)
+            if result is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        result = rules.predict(patient)
+
+        with self._lock:
+            self._data[key] = result
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+    def resize(self, maxsize: int) -> None:
+        """Cambia la capacidad; si se reduce, descarta las entradas más antiguas."""
+        if maxsize < 0:
+            raise ValueError("maxsize debe ser >= 0.")
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._data) > maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+# Caché compartida por el proceso (todas las sesiones de Streamlit)
+default_cache = PredictionCache(DEFAULT_CACHE_SIZE)
+
+
+def cached_predict_state(inp: PatientInput | PatientKey, rules=None) -> tuple[str, str]:
+    """
+    predict_state con rules (por defecto el conjunto activo) a través de la
+    caché del proceso (directo si PREDICT_CACHE_SIZE=0).
+    """
+    return default_cache.predict(inp, rules)
@@ -0,0 +1,24 @@
+# rules_table.py
+"""
+Reglas compiladas en una tabla de búsqueda.
+
+La tabla la arma ruleset.RuleSet a partir de los umbrales del conjunto de
+reglas activo: cada umbral corta edad, severidad y duración en tramos y
+cada celda (128 combinaciones de banderas × tramos) guarda el par
+(estado, explicación) internado. Este módulo expone la tabla del conjunto
+activo con el contrato de predict_state.
+"""
+from rules import PatientInput, PatientKey
+
+# FLAG_FIELDS: banderas en el orden de los bits del índice (lo usa utils.binlog)
+from ruleset import FLAG_FIELDS, RuleSet, current
+
+
+def get_table() -> RuleSet:
+    """Conjunto de reglas activo (su tabla compilada se usa en predict)."""
+    return current()
+
+
+def predict_state_table(inp: PatientInput | PatientKey) -> tuple[str, str]:
+    """predict_state resuelto como una búsqueda en la tabla compilada."""
+    return current().predict(inp)
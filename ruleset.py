@@ -0,0 +1,478 @@
+# ruleset.py
+"""
+Conjuntos de reglas versionados, cargados desde JSON.
+
+RuleSet._rules tiene la lógica y los textos de las explicaciones, y los
+umbrales viven en un archivo (rulesets/default.json, o el de RULESET_FILE)
+con una versión. rules.predict_state, rules_table y rules_batch usan el
+conjunto activo. Cambiar los umbrales no requiere redesplegar: el archivo
+se vuelve a leer cuando cambia. rules.reference_predict_state repite las
+reglas con los umbrales por defecto escritos en el código; es la
+referencia independiente de verify_rules.
+
+load_ruleset() valida el archivo (todas las llaves, tipos y rangos) y lo
+compila en una tabla de búsqueda: los umbrales
+parten edad, severidad y duración en tramos, se evalúan las reglas una vez
+por celda (tramos × 128 combinaciones de banderas) y cada predicción es un
+par de bisect por variable más un índice. predict_batch() hace lo mismo con
+NumPy para muchas filas.
+
+current() devuelve el conjunto activo y, como mucho cada RELOAD_SECONDS,
+revisa si el archivo cambió. La recarga se compila fuera de cualquier
+bloqueo y se publica con una sola asignación: las predicciones en curso
+terminan con el conjunto que ya tenían y nunca esperan. Si el archivo
+nuevo es inválido, se conserva el anterior y el error queda en
+last_error().
+
+Quien registra una predicción debe tomar la versión del mismo objeto que
+la produjo:
+    rules = ruleset.current()
+    state, explanation = rules.predict(patient)
+    log_prediction(state, explanation, patient, rule_version=rules.version)
+
+Validar un archivo:
+    python ruleset.py rulesets/default.json
+"""
+import hashlib
+import json
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+
+import numpy as np
+
+from rules import (
+    AGUDA,
+    CRONICA,
+    INVALID_MESSAGE,
+    LEVE,
+    NO_ENFERMO,
+    TERMINAL,
+    PatientInput,
+    PatientKey,
+)
+from rules_batch import columns
+
+DEFAULT_RULESET_FILE = Path(__file__).resolve().parent / "rulesets" / "default.json"
+RULESET_FILE = Path(os.environ.get("RULESET_FILE", DEFAULT_RULESET_FILE))
+# Cada cuánto se revisa si el archivo cambió (0 = en cada predicción)
+RELOAD_SECONDS = float(os.environ.get("RULESET_RELOAD_SECONDS", "2"))
+
+# Banderas rojas, en el orden en que se enumeran las razones
+RED_FLAGS = (
+    ("has_metastasis", "metástasis"),
+    ("multiple_organ_failure", "fallo multiorgánico"),
+    ("is_bedridden", "paciente encamado"),
+    ("refractory_pain", "dolor refractario"),
+    ("has_chronic_disease", "enfermedad crónica de base"),
+    ("recent_weight_loss", "pérdida de peso significativa"),
+)
+# Banderas en el orden de los bits del índice de la tabla compilada
+FLAG_FIELDS = tuple(name for name, _ in RED_FLAGS) + ("has_recent_imaging",)
+
+# Umbral ⇒ (variable, comparación que cumple la regla, máximo permitido)
+THRESHOLDS = {
+    "terminal_min_severity": ("severity", ">=", 10),
+    "terminal_min_red_flags": ("red_flags", ">=", len(RED_FLAGS)),
+    "terminal_long_course_days": ("duration_days", ">", None),
+    "terminal_long_course_days_chronic": ("duration_days", ">", None),
+    "terminal_red_flags_alone": ("red_flags", ">=", len(RED_FLAGS)),
+    "chronic_days_with_disease": ("duration_days", ">", None),
+    "chronic_days": ("duration_days", ">", None),
+    "acute_min_severity": ("severity", ">=", 10),
+    "mild_min_severity": ("severity", ">=", 10),
+    "mild_max_severity": ("severity", "<=", 10),
+    "mild_max_days": ("duration_days", "<=", None),
+    "healthy_max_severity": ("severity", "<=", 10),
+    "healthy_max_days": ("duration_days", "<=", None),
+    "healthy_max_age": ("age", "<", None),
+}
+_INTEGER_VARIABLES = ("red_flags", "duration_days", "age")
+_TERMINAL_IMAGING = (
+    " Existen imágenes diagnósticas recientes que deben revisarse en detalle por el médico."
+)
+
+
+def _fmt(value) -> str:
+    return f"{value:g}"
+
+
+def validate(data) -> dict:
+    """
+    Valida el contenido de un archivo de reglas y devuelve {"version",
+    "description", "thresholds"}. Lanza ValueError con todos los problemas.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("El conjunto de reglas debe ser un objeto JSON.")
+    problems = []
+    version = data.get("version")
+    if not isinstance(version, str) or not version.strip():
+        problems.append("'version' debe ser un texto no vacío.")
+    extra = sorted(set(data) - {"version", "description", "thresholds"})
+    if extra:
+        problems.append(f"Llaves desconocidas: {', '.join(extra)}.")
+    thresholds = data.get("thresholds")
+    if not isinstance(thresholds, dict):
+        raise ValueError(" ".join(problems + ["'thresholds' debe ser un objeto."]))
+
+    missing = [name for name in THRESHOLDS if name not in thresholds]
+    if missing:
+        problems.append(f"Faltan umbrales: {', '.join(missing)}.")
+    unknown = sorted(set(thresholds) - set(THRESHOLDS))
+    if unknown:
+        problems.append(f"Umbrales desconocidos: {', '.join(unknown)}.")
+    for name, value in thresholds.items():
+        if name not in THRESHOLDS:
+            continue
+        variable, _, maximum = THRESHOLDS[name]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            problems.append(f"'{name}' debe ser numérico.")
+        elif variable in _INTEGER_VARIABLES and value != int(value):
+            problems.append(f"'{name}' debe ser entero.")
+        elif value < 0 or (maximum is not None and value > maximum):
+            limit = "" if maximum is None else f" y <= {maximum}"
+            problems.append(f"'{name}' debe ser >= 0{limit}.")
+    if not problems and thresholds["mild_min_severity"] > thresholds["mild_max_severity"]:
+        problems.append("'mild_min_severity' no puede ser mayor que 'mild_max_severity'.")
+    if problems:
+        raise ValueError(" ".join(problems))
+
+    return {
+        "version": version.strip(),
+        "description": data.get("description", ""),
+        "thresholds": {name: thresholds[name] for name in THRESHOLDS},
+    }
+
+
+def _cuts(thresholds: dict, variable: str) -> tuple[list, list]:
+    """
+    Umbrales de una variable como dos listas ordenadas: ge (la regla mira
+    x >= c, o su negación x < c) y gt (x > c, o x <= c). El tramo de x es
+    bisect_right(ge, x) + bisect_left(gt, x): el número de cortes superados.
+    """
+    ge, gt = set(), set()
+    for name, (var, op, _) in THRESHOLDS.items():
+        if var == variable:
+            (ge if op in (">=", "<") else gt).add(thresholds[name])
+    return sorted(ge), sorted(gt)
+
+
+def _representatives(ge: list, gt: list) -> list:
+    """Un valor por tramo, en orden: supera exactamente los primeros i cortes."""
+    cuts = sorted([(c, 0) for c in ge] + [(c, 1) for c in gt])
+    if not cuts:
+        return [0]
+    values = [cuts[0][0] - 1]
+    for i, (c, strict) in enumerate(cuts):
+        if not strict:
+            values.append(c)
+        elif i + 1 < len(cuts):
+            values.append((c + cuts[i + 1][0]) / 2)
+        else:
+            values.append(c + 1)
+    return values
+
+
+class RuleSet:
+    """
+    Conjunto de reglas validado y compilado. evaluate() aplica las reglas
+    directamente (referencia legible); predict() y predict_batch() usan la
+    tabla compilada y dan el mismo resultado.
+    """
+
+    def __init__(self, version: str, thresholds: dict, description: str = "", source=None):
+        self.version = version
+        self.description = description
+        self.thresholds = dict(thresholds)
+        self.source = source
+        canonical = json.dumps(self.thresholds, sort_keys=True)
+        self.fingerprint = hashlib.sha1(f"{version}|{canonical}".encode()).hexdigest()[:16]
+        self._compile()
+
+    # --- Reglas ---
+
+    def _rules(self, age, sev, dur, flags: dict) -> tuple[str, str]:
+        """
+        Las reglas, sin validar las entradas. El orden importa: TERMINAL
+        (síntomas intensos, varias banderas rojas y curso largo, o muchas
+        banderas rojas), CRÓNICA, AGUDA, LEVE, NO ENFERMO y, por seguridad
+        clínica mínima, LEVE en cualquier otro caso.
+        """
+        t = self.thresholds
+        red_flags = sum(flags[name] for name, _ in RED_FLAGS)
+        long_course = dur > t["terminal_long_course_days"] or (
+            dur > t["terminal_long_course_days_chronic"] and flags["has_chronic_disease"]
+        )
+        if (
+            sev >= t["terminal_min_severity"]
+            and red_flags >= t["terminal_min_red_flags"]
+            and long_course
+        ):
+            razones = [label for name, label in RED_FLAGS if flags[name]]
+            explanation = (
+                "Síntomas muy intensos y curso prolongado con varios criterios de mal pronóstico "
+                f"({', '.join(razones)}). Se clasifica como ENFERMEDAD TERMINAL."
+            )
+            if flags["has_recent_imaging"]:
+                explanation += _TERMINAL_IMAGING
+            return TERMINAL, explanation
+        if red_flags >= t["terminal_red_flags_alone"]:
+            return (
+                TERMINAL,
+                "Múltiples criterios de mal pronóstico presentes; se clasifica como ENFERMEDAD TERMINAL.",
+            )
+        if dur > t["chronic_days_with_disease"] and flags["has_chronic_disease"]:
+            return (
+                CRONICA,
+                f"Síntomas >{_fmt(t['chronic_days_with_disease'])} días en paciente con "
+                "enfermedad crónica de base sugieren condición crónica.",
+            )
+        if dur > t["chronic_days"]:
+            return (
+                CRONICA,
+                f"Síntomas prolongados (>{_fmt(t['chronic_days'])} días) sugieren curso crónico.",
+            )
+        if sev >= t["acute_min_severity"]:
+            return AGUDA, "Alta severidad con duración corta-media sugiere cuadro agudo."
+        if (
+            t["mild_min_severity"] <= sev <= t["mild_max_severity"]
+            and dur <= t["mild_max_days"]
+        ):
+            return (
+                LEVE,
+                "Severidad moderada y pocos días: cuadro leve y autolimitado probable.",
+            )
+        if (
+            sev <= t["healthy_max_severity"]
+            and dur <= t["healthy_max_days"]
+            and age < t["healthy_max_age"]
+            and not flags["has_chronic_disease"]
+        ):
+            return (
+                NO_ENFERMO,
+                "Síntomas muy leves y breves en persona sin comorbilidad importante.",
+            )
+        return LEVE, "Caso fuera de reglas estrictas; se clasifica como leve por seguridad."
+
+    def evaluate(self, inp: PatientInput | PatientKey) -> tuple[str, str]:
+        """Aplica las reglas sin la tabla (más lento; sirve de referencia)."""
+        _validate(inp.age, inp.severity, inp.duration_days)
+        flags = {name: bool(getattr(inp, name)) for name in FLAG_FIELDS}
+        return self._rules(inp.age, inp.severity, inp.duration_days, flags)
+
+    # --- Tabla compilada ---
+
+    def _compile(self) -> None:
+        self._sev = _cuts(self.thresholds, "severity")
+        self._dur = _cuts(self.thresholds, "duration_days")
+        self._age = _cuts(self.thresholds, "age")
+        sev_reps = _representatives(*self._sev)
+        dur_reps = _representatives(*self._dur)
+        age_reps = _representatives(*self._age)
+        self._n_sev = len(sev_reps)
+        self._n_dur = len(dur_reps)
+        self._n_age = len(age_reps)
+
+        interned = {}
+        table = []
+        for code in range(1 << len(FLAG_FIELDS)):
+            flags = {name: bool(code >> i & 1) for i, name in enumerate(FLAG_FIELDS)}
+            for sev in sev_reps:
+                for dur in dur_reps:
+                    for age in age_reps:
+                        result = self._rules(age, sev, dur, flags)
+                        table.append(interned.setdefault(result, result))
+        self._table = tuple(table)
+        self._states = np.array([s for s, _ in table], dtype=object)
+        self._explanations = np.array([e for _, e in table], dtype=object)
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def predict(self, inp: PatientInput | PatientKey) -> tuple[str, str]:
+        """Mismo contrato que predict_state: valida y devuelve (estado, explicación)."""
+        age = inp.age
+        sev = inp.severity
+        dur = inp.duration_days
+        _validate(age, sev, dur)
+        code = (
+            (1 if inp.has_metastasis else 0)
+            + (2 if inp.multiple_organ_failure else 0)
+            + (4 if inp.is_bedridden else 0)
+            + (8 if inp.refractory_pain else 0)
+            + (16 if inp.has_chronic_disease else 0)
+            + (32 if inp.recent_weight_loss else 0)
+            + (64 if inp.has_recent_imaging else 0)
+        )
+        sev_ge, sev_gt = self._sev
+        dur_ge, dur_gt = self._dur
+        age_ge, age_gt = self._age
+        # Tramo = número de cortes superados
+        return self._table[
+            (
+                (code * self._n_sev + bisect_right(sev_ge, sev) + bisect_left(sev_gt, sev))
+                * self._n_dur
+                + bisect_right(dur_ge, dur)
+                + bisect_left(dur_gt, dur)
+            )
+            * self._n_age
+            + bisect_right(age_ge, age)
+            + bisect_left(age_gt, age)
+        ]
+
+    def predict_batch(self, data, on_invalid: str = "raise") -> tuple[np.ndarray, np.ndarray]:
+        """Versión vectorizada de predict, con el contrato de rules_batch.predict_state_batch."""
+        if on_invalid not in ("raise", "mark"):
+            raise ValueError("on_invalid debe ser 'raise' o 'mark'.")
+        c = columns(data)
+        age, sev, dur = c["age"], c["severity"], c["duration_days"]
+        # Igual que _validate: NaN (celda vacía) e infinito son inválidos
+        invalid = ~(
+            (age >= 0) & (age < np.inf) & (dur >= 0) & (dur < np.inf) & (sev >= 0) & (sev <= 10)
+        )
+        if invalid.any() and on_invalid == "raise":
+            raise ValueError(INVALID_MESSAGE)
+
+        code = np.zeros(len(age), dtype=np.int64)
+        for i, name in enumerate(FLAG_FIELDS):
+            code |= c[name].astype(np.int64) << i
+
+        def span(values, cuts):
+            ge, gt = cuts
+            return np.searchsorted(ge, values, "right") + np.searchsorted(gt, values, "left")
+
+        index = (
+            (code * self._n_sev + span(sev, self._sev)) * self._n_dur + span(dur, self._dur)
+        ) * self._n_age + span(age, self._age)
+        index[invalid] = 0
+        states = self._states[index]
+        explanations = self._explanations[index]
+        states[invalid] = None
+        explanations[invalid] = INVALID_MESSAGE
+        return states, explanations
+
+    def comparisons(self) -> dict:
+        """{variable: {(operador, umbral)}} de edad, severidad y duración (para verify_rules)."""
+        out = {"age": set(), "severity": set(), "duration_days": set()}
+        for name, (variable, op, _) in THRESHOLDS.items():
+            if variable in out:
+                out[variable].add((op, self.thresholds[name]))
+        return out
+
+
+def _validate(age, sev, dur) -> None:
+    # Escrito en positivo para que NaN (y el infinito) sean inválidos
+    if not (0 <= age < math.inf and 0 <= dur < math.inf and 0 <= sev <= 10):
+        raise ValueError(INVALID_MESSAGE)
+
+
+def parse_ruleset(text: str, source=None) -> RuleSet:
+    """Conjunto de reglas compilado a partir del texto JSON."""
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f"JSON inválido: {e}") from None
+    spec = validate(data)
+    return RuleSet(spec["version"], spec["thresholds"], spec["description"], source)
+
+
+def load_ruleset(path: Path) -> RuleSet:
+    """Lee, valida y compila un archivo de reglas. Lanza ValueError si es inválido."""
+    path = Path(path)
+    try:
+        return parse_ruleset(path.read_text(encoding="utf-8"), str(path))
+    except ValueError as e:
+        raise ValueError(f"{path}: {e}") from None
+
+
+# --- Conjunto activo y recarga en caliente ---
+
+_active = None
+_stamp = None  # (inodo, tamaño, mtime) del archivo cargado
+_checked = 0.0
+_last_error = None
+_reload_lock = threading.Lock()
+
+
+def _file_stamp(path: Path):
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def activate(rules: RuleSet) -> RuleSet:
+    """Publica rules como conjunto activo; devuelve el anterior."""
+    global _active
+    previous, _active = _active, rules
+    return previous
+
+
+def maybe_reload(force: bool = False) -> bool:
+    """
+    Vuelve a cargar RULESET_FILE si cambió desde la última carga. Solo un
+    hilo recarga a la vez; los demás siguen con el conjunto activo sin
+    esperar. Devuelve True si se publicó un conjunto nuevo.
+    """
+    global _stamp, _checked, _last_error
+    now = time.monotonic()
+    if not force and _active is not None and now - _checked < RELOAD_SECONDS:
+        return False
+    if not _reload_lock.acquire(blocking=_active is None):
+        return False
+    try:
+        _checked = now
+        path = Path(RULESET_FILE)
+        stamp = _file_stamp(path)
+        if _active is not None and (stamp is None or stamp == _stamp):
+            return False
+        try:
+            rules = load_ruleset(path)
+        except (OSError, ValueError) as e:
+            _stamp = stamp
+            _last_error = str(e)
+            if _active is None:
+                raise
+            return False
+        _stamp = stamp
+        _last_error = None
+        activate(rules)
+        return True
+    finally:
+        _reload_lock.release()
+
+
+def current() -> RuleSet:
+    """Conjunto de reglas activo (lo carga la primera vez)."""
+    maybe_reload()
+    return _active
+
+
+def last_error():
+    """Error de la última recarga fallida, o None."""
+    return _last_error
+
+
+def main(argv=None) -> int:
+    paths = argv if argv is not None else sys.argv[1:]
+    if not paths:
+        paths = [str(RULESET_FILE)]
+    failed = False
+    for path in paths:
+        try:
+            rules = load_ruleset(Path(path))
+        except (OSError, ValueError) as e:
+            print(e)
+            failed = True
+            continue
+        print(f"{path}: versión {rules.version}, {len(rules)} celdas ({rules.fingerprint}).")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+# score.py
+"""
+Clasificación masiva desde línea de comandos.
+
+Lee un archivo CSV o Parquet con las columnas de PatientInput en bloques
+de tamaño fijo, clasifica cada bloque con el conjunto de reglas activo
+(ruleset.py) en un pool de procesos y escribe estados y explicaciones en
+el archivo de salida.
+
+Uso:
+    python score.py pacientes.csv resultados.csv --chunk-size 50000 --workers 4
+    python score.py pacientes.parquet resultados.parquet --log
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+import ruleset
+from rules_batch import FIELDS
+
+DEFAULT_CHUNK_SIZE = 50_000
+# Tipos de las columnas de entrada en todos los bloques (con nulos): así el
+# esquema de salida no depende de si un bloque trae celdas vacías
+INPUT_DTYPES = {
+    "age": "Int64",
+    "severity": "float64",
+    "duration_days": "Int64",
+    **{name: "boolean" for name in FIELDS[3:]},
+}
+
+
+def _is_parquet(path: Path) -> bool:
+    return path.suffix.lower() in (".parquet", ".pq")
+
+
+def read_chunks(path: Path, chunk_size: int):
+    """
+    Itera el archivo de entrada en DataFrames de a lo sumo chunk_size filas,
+    con las columnas de PatientInput en los tipos de INPUT_DTYPES.
+    """
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            df = batch.to_pandas()
+            yield df.astype({name: dtype for name, dtype in INPUT_DTYPES.items() if name in df})
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype=INPUT_DTYPES)
+
+
+def score_chunk(df: pd.DataFrame, rules: ruleset.RuleSet | None = None) -> pd.DataFrame:
+    """
+    Clasifica un bloque con rules (por defecto el conjunto activo); las
+    filas inválidas, incluidas las de edad, severidad o duración vacías,
+    quedan con estado vacío.
+    """
+    rules = rules or ruleset.current()
+    states, explanations = rules.predict_batch(df, on_invalid="mark")
+    out = df.copy()
+    out["state"] = pd.array(states, dtype="string")
+    out["explanation"] = pd.array(explanations, dtype="string")
+    return out
+
+
+class _Writer:
+    """Escritor incremental de CSV o Parquet según la extensión de salida."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._parquet = _is_parquet(path)
+        self._handle = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self._parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._handle is None:
+                self._handle = pq.ParquetWriter(self.path, table.schema)
+            self._handle.write_table(table.cast(self._handle.schema))
+        else:
+            header = self._handle is None
+            if header:
+                self._handle = self.path.open("w", encoding="utf-8", newline="")
+            df.to_csv(self._handle, header=header, index=False)
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+
+
+def log_chunk(df: pd.DataFrame, rule_version: str | None = None) -> int:
+    """Agrega las filas válidas al log de predicciones con el formato de log_prediction."""
+    from utils.ui_data import append_records, build_record
+
+    timestamp = datetime.utcnow().isoformat()
+    # Las filas con estado son válidas: edad, severidad y duración no son nulas
+    valid = df[df["state"].notna()].fillna({name: False for name in FIELDS[3:]})
+    records = [
+        build_record(
+            row["state"],
+            row["explanation"],
+            {
+                "age": int(row["age"]),
+                "severity": float(row["severity"]),
+                "duration_days": int(row["duration_days"]),
+                **{name: bool(row[name]) for name in FIELDS[3:]},
+            },
+            timestamp,
+            rule_version,
+        )
+        for row in valid.to_dict("records")
+    ]
+    append_records(records)
+    return len(records)
+
+
+def _scored(chunks, workers: int, rules: ruleset.RuleSet):
+    """Clasifica los bloques en orden, con a lo sumo 2 * workers bloques en vuelo."""
+    if workers <= 1:
+        for df in chunks:
+            yield score_chunk(df, rules)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for df in chunks:
+            pending.append(pool.submit(score_chunk, df, rules))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def run(
+    input_path: Path,
+    output_path: Path,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int = 1,
+    log: bool = False,
+    progress=None,
+) -> dict:
+    """
+    Clasifica input_path y escribe el resultado en output_path.
+    Devuelve un resumen con filas procesadas, inválidas, registradas en el
+    log, segundos transcurridos y filas por segundo.
+    """
+    started = time.perf_counter()
+    rows = invalid = logged = 0
+    # Un solo conjunto de reglas para toda la corrida, aunque se recargue
+    rules = ruleset.current()
+    writer = _Writer(output_path)
+    try:
+        for df in _scored(read_chunks(input_path, chunk_size), workers, rules):
+            writer.write(df)
+            rows += len(df)
+            invalid += int(df["state"].isna().sum())
+            if log:
+                logged += log_chunk(df, rules.version)
+            if progress is not None:
+                elapsed = time.perf_counter() - started
+                progress(f"{rows} filas ({rows / elapsed:,.0f} filas/s)")
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": rows,
+        "invalid": invalid,
+        "logged": logged,
+        "rule_version": rules.version,
+        "seconds": elapsed,
+        "rows_per_second": rows / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Clasifica en bloque un archivo CSV/Parquet de pacientes."
+    )
+    parser.add_argument("input", type=Path, help="Archivo de entrada (.csv o .parquet)")
+    parser.add_argument("output", type=Path, help="Archivo de salida (.csv o .parquet)")
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Filas por bloque (limita la memoria usada)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Procesos para clasificar bloques en paralelo",
+    )
+    parser.add_argument(
+        "--log",
+        action="store_true",
+        help="Agregar los resultados válidos al log de predicciones",
+    )
+    parser.add_argument(
+        "--log-file",
+        type=Path,
+        default=None,
+        help="Log de predicciones a usar con --log (por defecto el de la app)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.log_file is not None:
+        import utils.ui_data as ui_data
+
+        ui_data.LOG_FILE = args.log_file
+
+    def progress(msg):
+        print(msg, file=sys.stderr)
+
+    summary = run(
+        args.input,
+        args.output,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        log=args.log,
+        progress=progress,
+    )
+    print(
+        f"{summary['rows']} filas clasificadas en {summary['seconds']:.2f} s "
+        f"({summary['rows_per_second']:,.0f} filas/s); "
+        f"{summary['invalid']} inválidas, {summary['logged']} registradas en el log "
+        f"(reglas versión {summary['rule_version']})."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+# service.py
+"""
+Servicio HTTP (ASGI) de predicción, sin interfaz.
+
+Endpoints:
+- GET  /health         ⇒ estado del servicio y de la cola de log.
+- POST /predict        ⇒ un paciente (objeto con los campos de PatientInput).
+- POST /predict/batch  ⇒ {"patients": [...]} ⇒ {"results": [...]}.
+- GET  /metrics        ⇒ métricas del proceso en formato de texto de Prometheus.
+
+Las predicciones se registran en el log de la app (utils.ui_data) desde una
+tarea de fondo que escribe por lotes, fuera del camino de la respuesta.
+Las reglas son las del conjunto activo (ruleset.py): cada respuesta y cada
+registro llevan su "rule_version". Con SHADOW_CANDIDATE, cada predicción se
+evalúa además con el candidato en sombra (shadow.py), sin esperarlo.
+
+Uso (dentro de la misma imagen Docker):
+    uvicorn service:app --host 0.0.0.0 --port 8080 --workers 4
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+import utils.ui_data as ui_data
+from utils import metrics
+import ruleset
+import shadow
+from rules import PatientInput
+
+# Máximo de pacientes por petición a /predict/batch
+MAX_BATCH_SIZE = 10_000
+# Registros que caben en la cola de log antes de descartar
+LOG_QUEUE_SIZE = 50_000
+# Registros por escritura al log
+LOG_WRITE_BATCH = 1_000
+# SERVICE_LOG_PREDICTIONS=0 desactiva el registro en el log
+LOG_PREDICTIONS = os.environ.get("SERVICE_LOG_PREDICTIONS", "1") != "0"
+# Segundos que stop() espera a que se vacíe la cola al apagar
+LOG_STOP_TIMEOUT = 10.0
+
+logger = logging.getLogger(__name__)
+
+_INT_FIELDS = ("age", "duration_days")
+_BOOL_FIELDS = ui_data.INPUT_FIELDS[3:]
+
+
+def parse_patient(data) -> PatientInput:
+    """
+    Valida un objeto JSON contra el esquema de PatientInput: los diez campos
+    son obligatorios, edad y duración enteros, severidad numérica y las
+    banderas booleanas. Lanza ValueError con el detalle del problema.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Se esperaba un objeto JSON con los datos del paciente.")
+
+    missing = [name for name in ui_data.INPUT_FIELDS if name not in data]
+    if missing:
+        raise ValueError(f"Faltan campos: {', '.join(missing)}.")
+    extra = sorted(set(data) - set(ui_data.INPUT_FIELDS))
+    if extra:
+        raise ValueError(f"Campos desconocidos: {', '.join(extra)}.")
+
+    for name in _INT_FIELDS:
+        if type(data[name]) is not int:
+            raise ValueError(f"'{name}' debe ser un entero.")
+    if type(data["severity"]) not in (int, float):
+        raise ValueError("'severity' debe ser numérico.")
+    for name in _BOOL_FIELDS:
+        if type(data[name]) is not bool:
+            raise ValueError(f"'{name}' debe ser booleano.")
+
+    return PatientInput(**{name: data[name] for name in ui_data.INPUT_FIELDS})
+
+
+class LogPump:
+    """Cola acotada de registros que una tarea de fondo escribe al log por lotes."""
+
+    def __init__(self, maxsize: int = LOG_QUEUE_SIZE):
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+        self.written = 0
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def submit(self, records) -> None:
+        for record in records:
+            try:
+                self.queue.put_nowait(record)
+            except asyncio.QueueFull:
+                # Nunca bloquear la respuesta por el log
+                self.dropped += 1
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < LOG_WRITE_BATCH and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await asyncio.to_thread(ui_data.append_records, batch)
+                self.written += len(batch)
+            except Exception:
+                # Cualquier falla del backend (p. ej. "database is locked" en
+                # SQLite) descarta el lote, pero la tarea sigue viva
+                self.dropped += len(batch)
+                logger.exception("No se pudieron escribir %d registros al log.", len(batch))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def stop(self, timeout: float = LOG_STOP_TIMEOUT) -> None:
+        """
+        Espera (a lo sumo timeout segundos) a que la cola se vacíe y detiene
+        la tarea de fondo; lo que quede en la cola se cuenta como descartado.
+        """
+        if not self._task.done():
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._task.cancel()
+        self.dropped += self.queue.qsize()
+
+
+def _records(patients, results, rule_version: str) -> list[dict]:
+    timestamp = datetime.utcnow().isoformat()
+    return [
+        ui_data.build_record(state, explanation, vars(patient), timestamp, rule_version)
+        for patient, (state, explanation) in zip(patients, results)
+        if state is not None
+    ]
+
+
+async def health(request: Request) -> JSONResponse:
+    pump = request.app.state.pump
+    evaluator = shadow.get_evaluator()
+    return JSONResponse(
+        {
+            "status": "ok",
+            "rule_version": ruleset.current().version,
+            "log_queue": pump.queue.qsize(),
+            "log_written": pump.written,
+            "log_dropped": pump.dropped,
+            "shadow": None if evaluator is None else evaluator.stats(),
+        }
+    )
+
+
+async def predict(request: Request) -> JSONResponse:
+    try:
+        body = await request.json()
+    except ValueError:
+        return JSONResponse({"error": "JSON inválido."}, status_code=400)
+    try:
+        patient = parse_patient(body)
+        rules = ruleset.current()
+        started = time.perf_counter()
+        with metrics.timed("predict_state"):
+            state, explanation = rules.predict(patient)
+        rule_seconds = time.perf_counter() - started
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=422)
+    metrics.record_prediction(state)
+    shadow.submit(patient, state, rules.version, rule_seconds)
+
+    if LOG_PREDICTIONS:
+        request.app.state.pump.submit(
+            _records([patient], [(state, explanation)], rules.version)
+        )
+    return JSONResponse(
+        {"state": state, "explanation": explanation, "rule_version": rules.version}
+    )
+
+
+async def predict_batch(request: Request) -> JSONResponse:
+    try:
+        body = await request.json()
+    except ValueError:
+        return JSONResponse({"error": "JSON inválido."}, status_code=400)
+    items = body.get("patients") if isinstance(body, dict) else None
+    if not isinstance(items, list):
+        return JSONResponse(
+            {"error": "Se esperaba {\"patients\": [...]}."}, status_code=422
+        )
+    if len(items) > MAX_BATCH_SIZE:
+        return JSONResponse(
+            {"error": f"Máximo {MAX_BATCH_SIZE} pacientes por petición."},
+            status_code=413,
+        )
+
+    rules = ruleset.current()
+    results = [None] * len(items)
+    valid, positions = [], []
+    for i, item in enumerate(items):
+        try:
+            valid.append(parse_patient(item))
+            positions.append(i)
+        except ValueError as e:
+            results[i] = {"error": str(e)}
+
+    if valid:
+        columns = {
+            name: [getattr(p, name) for p in valid] for name in ui_data.INPUT_FIELDS
+        }
+        started = time.perf_counter()
+        with metrics.timed("predict_batch"):
+            states, explanations = rules.predict_batch(columns, on_invalid="mark")
+        rule_seconds = (time.perf_counter() - started) / len(valid)
+        for i, patient, state, explanation in zip(positions, valid, states, explanations):
+            if state is None:
+                results[i] = {"error": explanation}
+            else:
+                results[i] = {"state": state, "explanation": explanation}
+                metrics.record_prediction(state)
+                shadow.submit(patient, state, rules.version, rule_seconds)
+        if LOG_PREDICTIONS:
+            request.app.state.pump.submit(
+                _records(valid, zip(states, explanations), rules.version)
+            )
+
+    return JSONResponse({"results": results, "rule_version": rules.version})
+
+
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    pump = request.app.state.pump
+    lines = [
+        "# HELP medapp_log_queue_size Registros en espera de escribirse al log.",
+        "# TYPE medapp_log_queue_size gauge",
+        f"medapp_log_queue_size {pump.queue.qsize()}",
+        "# HELP medapp_log_dropped_total Registros descartados por la cola de log.",
+        "# TYPE medapp_log_dropped_total counter",
+        f"medapp_log_dropped_total {pump.dropped}",
+    ]
+    return PlainTextResponse(
+        metrics.render_prometheus() + "\n".join(lines) + "\n",
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    # La cola de log vive en el event loop del servidor
+    app.state.pump = LogPump()
+    try:
+        yield
+    finally:
+        await app.state.pump.stop()
+
+
+app = Starlette(
+    routes=[
+        Route("/health", health, methods=["GET"]),
+        Route("/predict", predict, methods=["POST"]),
+        Route("/predict/batch", predict_batch, methods=["POST"]),
+        Route("/metrics", metrics_endpoint, methods=["GET"]),
+    ],
+    lifespan=lifespan,
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", "8080")))
@@ -0,0 +1,557 @@
+# shadow.py
+"""
+Evaluación en sombra de un clasificador candidato.
+
+Con SHADOW_CANDIDATE definido, cada predicción de la app y del servicio
+HTTP se encola (submit) y un hilo de fondo la vuelve a clasificar con el
+candidato. La respuesta al médico nunca espera al candidato: la cola es
+acotada (SHADOW_QUEUE_SIZE) y, si está llena, la muestra se descarta y se
+cuenta. SHADOW_SAMPLE_RATE (0–1) limita la fracción de predicciones que
+se evalúan.
+
+El candidato se indica como las versiones de rescore.py: "módulo:función",
+un archivo .py con predict_state, un conjunto de reglas .json o
+"git:REV[:ruta]". Se carga en el hilo de fondo, no en la primera
+respuesta. Puede devolver (estado, explicación) o solo el estado.
+
+SHADOW_MODE elige dónde corre el candidato:
+- "thread" (por defecto): en el hilo de fondo. Es barato, pero comparte el
+  GIL con la app: un candidato pesado en Python puro le quita CPU a las
+  respuestas aunque nunca las haga esperar en forma directa.
+- "process": en un proceso aparte (uno por evaluador), al que el hilo de
+  fondo le pasa los lotes; el hilo solo espera el resultado y no retiene el
+  GIL. Cuesta arrancar el proceso y serializar cada lote.
+
+Cada evaluación se agrega a SHADOW_LOG_FILE (JSON Lines) con las entradas,
+el resultado de las reglas (estado, versión y latencia) y el del candidato
+(estado y latencia, o el error).
+
+refresh() arma el reporte de acuerdo y deriva leyendo solo lo agregado al
+log en sombra desde la corrida anterior (el estado queda en
+<log>.report.json):
+- Acuerdo global y por día, matriz de confusión reglas × candidato y
+  errores del candidato.
+- Latencia (p50/p95/p99) de las reglas y del candidato con los buckets de
+  utils.metrics.
+- Deriva: PSI de cada día frente a los primeros REFERENCE_SIZE registros,
+  para el estado de las reglas, el del candidato, la severidad y la edad.
+Si cambia el candidato, el reporte vuelve a empezar.
+
+Uso:
+    SHADOW_CANDIDATE=modelo:predict streamlit run app.py
+    python shadow.py [--log-file predictions_shadow.jsonl] [--reset] [--json]
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import utils.ui_data as ui_data
+from rules import PatientInput
+from utils import metrics
+from utils.log_writer import encode_record, write_locked
+from utils.rollups import age_bin, age_bin_label, severity_bin
+
+CANDIDATE = os.environ.get("SHADOW_CANDIDATE", "")
+SAMPLE_RATE = float(os.environ.get("SHADOW_SAMPLE_RATE", "1"))
+QUEUE_SIZE = int(os.environ.get("SHADOW_QUEUE_SIZE", "1000"))
+SHADOW_LOG_FILE = Path(os.environ.get("SHADOW_LOG_FILE", "predictions_shadow.jsonl"))
+SHADOW_MODES = ("thread", "process")
+MODE = os.environ.get("SHADOW_MODE", "thread")
+BATCH_SIZE = 64
+# Registros con que se arma la distribución de referencia de la deriva
+REFERENCE_SIZE = 1000
+# PSI desde el cual se marca deriva (< 0.1 estable, 0.1–0.25 moderada)
+DRIFT_PSI = 0.25
+DIMENSIONS = ("rule_state", "candidate_state", "severity", "age")
+ERROR_STATE = "(error)"
+
+SHADOW_RESULTS = metrics.register(
+    metrics.Counter(
+        "medapp_shadow_results_total",
+        "Evaluaciones del candidato en sombra por resultado (agree, disagree, error, dropped).",
+    )
+)
+SHADOW_SECONDS = metrics.register(
+    metrics.Histogram("medapp_shadow_seconds", "Latencia del candidato en sombra por predicción.")
+)
+
+
+def build_shadow_record(
+    inputs: dict,
+    state: str,
+    rule_version: str | None = None,
+    rule_seconds: float | None = None,
+    timestamp: str | None = None,
+) -> dict:
+    """Registro del log en sombra con el resultado de las reglas (sin el candidato aún)."""
+    return {
+        "timestamp": timestamp or datetime.utcnow().isoformat(),
+        "inputs": inputs,
+        "rule": {"state": state, "version": rule_version, "seconds": rule_seconds},
+    }
+
+
+def _candidate_results(candidate, inputs: list[dict]) -> list[dict]:
+    """Estado y latencia (o error y latencia) del candidato para cada entrada."""
+    results = []
+    for values in inputs:
+        patient = PatientInput(**values)
+        t0 = time.perf_counter()
+        try:
+            result = candidate(patient)
+        except Exception as e:
+            results.append(
+                {"error": f"{type(e).__name__}: {e}", "seconds": time.perf_counter() - t0}
+            )
+            continue
+        seconds = time.perf_counter() - t0
+        state = result[0] if isinstance(result, tuple) else result
+        results.append({"state": state, "seconds": seconds})
+    return results
+
+
+_worker_candidate = None  # candidato cargado en el proceso de SHADOW_MODE="process"
+
+
+def _init_worker(descriptor: tuple) -> None:
+    global _worker_candidate
+    from rescore import load_rules
+
+    _worker_candidate = load_rules(descriptor)
+
+
+def _evaluate_in_worker(inputs: list[dict]) -> list[dict]:
+    return _candidate_results(_worker_candidate, inputs)
+
+
+class ShadowEvaluator:
+    """
+    Cola acotada y hilo de fondo que evalúan el candidato spec y agregan
+    los resultados a log_file. submit() nunca bloquea. Con mode="process"
+    el candidato corre en un proceso aparte (ver SHADOW_MODE).
+    """
+
+    def __init__(
+        self,
+        spec: str,
+        log_file: Path,
+        maxsize: int = QUEUE_SIZE,
+        sample_rate: float = SAMPLE_RATE,
+        batch_size: int = BATCH_SIZE,
+        mode: str = MODE,
+    ):
+        if mode not in SHADOW_MODES:
+            raise ValueError(f"Modo de evaluación en sombra inválido: {mode!r}.")
+        self.spec = spec
+        self.mode = mode
+        self.log_file = Path(log_file)
+        self.sample_rate = sample_rate
+        self.batch_size = max(1, batch_size)
+        self.counts = {"evaluated": 0, "dropped": 0, "errors": 0, "failed": 0}
+        self.last_error = None
+        self._candidate = None
+        self._pool = None
+        self._queue = queue.Queue(maxsize)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="shadow-evaluator", daemon=True)
+        self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def submit(self, record: dict) -> bool:
+        """Encola un registro de build_shadow_record; False si no se evaluará."""
+        if self._closed:
+            return False
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return False
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.counts["dropped"] += 1
+            SHADOW_RESULTS.inc(outcome="dropped")
+            return False
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        return {
+            "candidate": self.spec,
+            "mode": self.mode,
+            "queue_depth": self.depth(),
+            **self.counts,
+        }
+
+    def _results(self, inputs: list[dict]) -> list[dict]:
+        """Resultados del candidato; lo carga (o arranca su proceso) la primera vez."""
+        from rescore import load_rules, resolve_rules
+
+        if self.mode == "thread":
+            if self._candidate is None:
+                self._candidate = load_rules(resolve_rules(self.spec))
+            return _candidate_results(self._candidate, inputs)
+        if self._pool is None:
+            # spawn: el proceso del candidato no hereda los hilos de la app
+            self._pool = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(resolve_rules(self.spec),),
+            )
+        return self._pool.submit(_evaluate_in_worker, inputs).result()
+
+    def evaluate(self, records: list[dict]) -> None:
+        """Completa records con el resultado del candidato y los agrega al log en sombra."""
+        results = self._results([rec["inputs"] for rec in records])
+        for rec, result in zip(records, results):
+            rec["candidate"] = {"name": self.spec, **result}
+            if "error" in result:
+                self.counts["errors"] += 1
+                SHADOW_RESULTS.inc(outcome="error")
+                continue
+            SHADOW_SECONDS.observe(result["seconds"])
+            SHADOW_RESULTS.inc(
+                outcome="agree" if result["state"] == rec["rule"]["state"] else "disagree"
+            )
+        write_locked(self.log_file, b"".join(map(encode_record, records)))
+        self.counts["evaluated"] += len(records)
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch = []
+            item = self._queue.get()
+            while True:
+                if item is None:
+                    # Marca de cierre: se evalúa lo ya tomado y se termina
+                    stop = True
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if not batch:
+                continue
+            try:
+                self.evaluate(batch)
+                self.last_error = None
+            except Exception as e:
+                self.counts["failed"] += len(batch)
+                self.last_error = f"{type(e).__name__}: {e}"
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def join(self) -> None:
+        """Espera a que se evalúe todo lo encolado."""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Deja de aceptar registros, evalúa lo pendiente y detiene el hilo."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        if self._pool is not None:
+            self._pool.shutdown()
+
+
+_evaluator = None
+_evaluator_lock = threading.Lock()
+
+
+def get_evaluator() -> ShadowEvaluator | None:
+    """Evaluador del proceso para SHADOW_CANDIDATE, o None si no hay candidato."""
+    global _evaluator
+    if not CANDIDATE:
+        return None
+    with _evaluator_lock:
+        if (
+            _evaluator is None
+            or _evaluator.closed
+            or _evaluator.spec != CANDIDATE
+            or _evaluator.mode != MODE
+            or _evaluator.log_file != Path(SHADOW_LOG_FILE)
+        ):
+            if _evaluator is not None:
+                _evaluator.close()
+            _evaluator = ShadowEvaluator(CANDIDATE, SHADOW_LOG_FILE, mode=MODE)
+        return _evaluator
+
+
+def submit(
+    patient, state: str, rule_version: str | None = None, rule_seconds: float | None = None
+) -> bool:
+    """Encola la predicción de las reglas para el candidato; no hace nada sin SHADOW_CANDIDATE."""
+    if not CANDIDATE:
+        return False
+    inputs = {name: getattr(patient, name) for name in ui_data.INPUT_FIELDS}
+    return get_evaluator().submit(build_shadow_record(inputs, state, rule_version, rule_seconds))
+
+
+# --- Reporte de acuerdo y deriva ---
+
+
+def _quantile(counts: list, q: float):
+    """Límite superior del bucket de latencia donde cae el cuantil q (None sin datos)."""
+    total = sum(counts)
+    if not total:
+        return None
+    seen = 0
+    for bound, n in zip((*metrics.LATENCY_BUCKETS, math.inf), counts):
+        seen += n
+        if seen >= q * total:
+            return bound
+    return math.inf
+
+
+def psi(reference: dict, current: dict) -> float:
+    """Índice de estabilidad poblacional entre dos histogramas {bin: conteo}."""
+    keys = set(reference) | set(current)
+    if not keys or not sum(reference.values()) or not sum(current.values()):
+        return 0.0
+    # Suavizado de 0.5 por bin: un bin vacío no da un PSI infinito
+    ref_total = sum(reference.values()) + 0.5 * len(keys)
+    cur_total = sum(current.values()) + 0.5 * len(keys)
+    value = 0.0
+    for key in keys:
+        p = (reference.get(key, 0) + 0.5) / ref_total
+        q = (current.get(key, 0) + 0.5) / cur_total
+        value += (q - p) * math.log(q / p)
+    return value
+
+
+def _empty_dims() -> dict:
+    return {dim: {} for dim in DIMENSIONS}
+
+
+class ShadowReport:
+    """
+    Acumulador del reporte en sombra. Todo su estado es JSON (to_dict /
+    from_dict), así que se guarda entre corridas y se sigue sumando.
+    """
+
+    def __init__(self):
+        self.candidate = None
+        self.total = 0
+        self.errors = 0
+        self.agree = 0
+        self.confusion = {}  # estado reglas ⇒ {estado candidato ⇒ n}
+        self.latency = {
+            who: [0] * (len(metrics.LATENCY_BUCKETS) + 1) for who in ("rule", "candidate")
+        }
+        self.reference_size = 0
+        self.reference = _empty_dims()
+        self.days = {}  # día ⇒ {"count", "agree", "errors", "dims"}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ShadowReport":
+        report = cls()
+        report.__dict__.update(data)
+        return report
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+    def _observe_latency(self, who: str, seconds) -> None:
+        if seconds is None:
+            return
+        counts = self.latency[who]
+        for i, bound in enumerate(metrics.LATENCY_BUCKETS):
+            if seconds <= bound:
+                counts[i] += 1
+                return
+        counts[-1] += 1
+
+    def add(self, record: dict) -> None:
+        rule = record.get("rule")
+        candidate = record.get("candidate")
+        timestamp = record.get("timestamp")
+        if not rule or not candidate or not timestamp:
+            return
+        if candidate.get("name") != self.candidate:
+            # Otro candidato: su evaluación empieza de cero
+            self.__init__()
+            self.candidate = candidate.get("name")
+
+        inputs = record.get("inputs") or {}
+        failed = "error" in candidate
+        cand_state = ERROR_STATE if failed else candidate.get("state")
+        bins = {
+            "rule_state": rule.get("state"),
+            "candidate_state": cand_state,
+            "severity": str(severity_bin(inputs.get("severity", 0))),
+            "age": age_bin_label(age_bin(inputs.get("age", 0))),
+        }
+        day = self.days.get(timestamp[:10])
+        if day is None:
+            day = self.days[timestamp[:10]] = {
+                "count": 0, "agree": 0, "errors": 0, "dims": _empty_dims()
+            }
+        self.total += 1
+        day["count"] += 1
+        if failed:
+            self.errors += 1
+            day["errors"] += 1
+        else:
+            row = self.confusion.setdefault(rule.get("state"), {})
+            row[cand_state] = row.get(cand_state, 0) + 1
+            if cand_state == rule.get("state"):
+                self.agree += 1
+                day["agree"] += 1
+        for dim, key in bins.items():
+            day["dims"][dim][key] = day["dims"][dim].get(key, 0) + 1
+            if self.reference_size < REFERENCE_SIZE:
+                self.reference[dim][key] = self.reference[dim].get(key, 0) + 1
+        self.reference_size = min(REFERENCE_SIZE, self.reference_size + 1)
+        self._observe_latency("rule", rule.get("seconds"))
+        self._observe_latency("candidate", candidate.get("seconds"))
+
+    def summary(self) -> dict:
+        """Acuerdo, confusión, latencias y deriva por día (del más antiguo al más reciente)."""
+
+        def agreement(agree, count, errors):
+            return agree / (count - errors) if count > errors else None
+
+        days = []
+        for name in sorted(self.days):
+            day = self.days[name]
+            drift = {dim: psi(self.reference[dim], day["dims"][dim]) for dim in DIMENSIONS}
+            days.append(
+                {
+                    "day": name,
+                    "count": day["count"],
+                    "errors": day["errors"],
+                    "agreement": agreement(day["agree"], day["count"], day["errors"]),
+                    "psi": drift,
+                    "drift": [dim for dim, value in drift.items() if value >= DRIFT_PSI],
+                }
+            )
+        return {
+            "candidate": self.candidate,
+            "total": self.total,
+            "errors": self.errors,
+            "agreement": agreement(self.agree, self.total, self.errors),
+            "confusion": self.confusion,
+            "latency": {
+                who: {f"p{q}": _quantile(counts, q / 100) for q in (50, 95, 99)}
+                for who, counts in self.latency.items()
+            },
+            "reference_size": self.reference_size,
+            "days": days,
+        }
+
+
+def report_file(log_file: Path) -> Path:
+    return Path(log_file).with_name(Path(log_file).name + ".report.json")
+
+
+def refresh(log_file: Path | None = None, reset: bool = False) -> dict:
+    """
+    Suma al reporte lo agregado al log en sombra desde la corrida anterior
+    y devuelve ShadowReport.summary(). Con reset=True vuelve a empezar.
+    """
+    from utils.archive import _iter_new_lines, _resume_offset
+
+    log_file = Path(log_file or SHADOW_LOG_FILE)
+    target = report_file(log_file)
+    state = {"offset": 0, "inode": None, "signature": "", "report": None}
+    if not reset:
+        try:
+            state = json.loads(target.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            pass
+    report = ShadowReport.from_dict(state["report"]) if state["report"] else ShadowReport()
+    if not log_file.exists():
+        return report.summary()
+
+    with log_file.open("rb") as f:
+        signature = ui_data._log_signature(f)
+        offset = _resume_offset(f, state)
+        for offset, rec in _iter_new_lines(f, offset):
+            report.add(rec)
+        state = {
+            "offset": offset,
+            "inode": os.fstat(f.fileno()).st_ino,
+            "signature": signature[: 2 * min(offset, ui_data.STATS_SIGNATURE_BYTES)],
+            "report": report.to_dict(),
+        }
+    # Nombre único: varios hilos (sesiones de la app) pueden refrescar a la vez
+    fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as out:
+            json.dump(state, out, ensure_ascii=False)
+        os.replace(tmp, target)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return report.summary()
+
+
+def format_ms(seconds) -> str:
+    """Cuantil de latencia (límite de su bucket, en segundos) como texto."""
+    if seconds is None:
+        return "—"
+    return "> 10 s" if math.isinf(seconds) else f"≤ {seconds * 1000:g} ms"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Reporte de acuerdo y deriva del candidato evaluado en sombra."
+    )
+    parser.add_argument("--log-file", type=Path, default=None)
+    parser.add_argument("--reset", action="store_true", help="Recalcular desde el inicio del log")
+    parser.add_argument("--json", action="store_true", help="Imprimir el reporte como JSON")
+    args = parser.parse_args(argv)
+
+    summary = refresh(args.log_file, reset=args.reset)
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return 0
+    if not summary["total"]:
+        print("El log en sombra no tiene evaluaciones.")
+        return 0
+
+    agreement = summary["agreement"]
+    print(
+        f"Candidato {summary['candidate']}: {summary['total']} evaluaciones, "
+        f"acuerdo {'—' if agreement is None else f'{agreement:.1%}'}, "
+        f"{summary['errors']} errores."
+    )
+    for who, label in (("rule", "Reglas"), ("candidate", "Candidato")):
+        q = summary["latency"][who]
+        print(f"{label}: p50 {format_ms(q['p50'])}, p95 {format_ms(q['p95'])}, p99 {format_ms(q['p99'])}")
+    print("Confusión (reglas → candidato):")
+    for rule_state, row in sorted(summary["confusion"].items()):
+        cells = ", ".join(f"{state}: {n}" for state, n in sorted(row.items()))
+        print(f"  {rule_state} → {cells}")
+    print(f"Deriva frente a los primeros {summary['reference_size']} registros:")
+    for day in summary["days"]:
+        agreement = "—" if day["agreement"] is None else f"{day['agreement']:.1%}"
+        values = ", ".join(f"{dim} {value:.3f}" for dim, value in day["psi"].items())
+        flag = f" — DERIVA: {', '.join(day['drift'])}" if day["drift"] else ""
+        print(f"  {day['day']}: {day['count']} registros, acuerdo {agreement}; PSI {values}{flag}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
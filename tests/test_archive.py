@@ -0,0 +1,215 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import json
+
+import utils.ui_data as ui_data
+from rules import PatientInput, predict_state
+from utils.archive import ARCHIVE_SKIPPED, STATE_FILE_NAME, compact_log
+
+
+def _write_log(path, days, state="ENFERMEDAD LEVE", rule_version=None):
+    with path.open("a", encoding="utf-8") as f:
+        for day in days:
+            rec = {
+                "timestamp": f"2024-03-{day:02d}T12:00:00.000001",
+                "state": state,
+                "explanation": "x",
+                "inputs": {
+                    "age": day,
+                    "severity": 4.5,
+                    "duration_days": 3,
+                    "has_chronic_disease": False,
+                    "has_metastasis": False,
+                    "recent_weight_loss": False,
+                    "is_bedridden": False,
+                    "refractory_pain": False,
+                    "multiple_organ_failure": False,
+                    "has_recent_imaging": day % 2 == 0,
+                },
+            }
+            if rule_version is not None:
+                rec["rule_version"] = rule_version
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+
+## Test de compactación incremental:
+# Cada corrida solo compacta lo nuevo y crea una partición por fecha.
+def test_compact_log_incremental(tmp_path, monkeypatch):
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    monkeypatch.setattr(ui_data, "ARCHIVE_DIR", tmp_path / "archive")
+    _write_log(ui_data.LOG_FILE, [1, 1, 2])
+
+    assert compact_log(batch_size=2) == 3
+    assert compact_log() == 0
+    assert sorted(p.name for p in ui_data.ARCHIVE_DIR.glob("date=*")) == [
+        "date=2024-03-01",
+        "date=2024-03-02",
+    ]
+
+    _write_log(ui_data.LOG_FILE, [3], state="ENFERMEDAD AGUDA")
+    assert compact_log() == 1
+
+    df = ui_data.read_archive(include_pending=False)
+    assert len(df) == 4
+    assert df["age"].dtype == "uint32"
+    assert df["state"].dtype == "category"
+
+
+## Test de lectura con poda y proyección:
+# El rango de fechas, el filtro de estado y las columnas se aplican en la
+# lectura, y los registros aún no compactados se incluyen.
+def test_read_archive_filters(tmp_path, monkeypatch):
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    monkeypatch.setattr(ui_data, "ARCHIVE_DIR", tmp_path / "archive")
+    _write_log(ui_data.LOG_FILE, [1, 2, 3, 4])
+    compact_log()
+    _write_log(ui_data.LOG_FILE, [5], state="ENFERMEDAD AGUDA")
+
+    df = ui_data.read_archive(start="2024-03-02", end="2024-03-04", columns=["age"])
+    assert list(df.columns) == ["age"]
+    assert sorted(df["age"]) == [2, 3]
+
+    df = ui_data.read_archive(states=["ENFERMEDAD AGUDA"])
+    assert df["age"].tolist() == [5]
+
+    assert len(ui_data.read_archive(include_pending=False)) == 4
+
+
+## Test de la tabla filtrada y ordenada:
+# Edad y severidad se filtran en la lectura y el orden se aplica sobre
+# archivo y pendientes juntos.
+def test_sorted_archive_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    monkeypatch.setattr(ui_data, "ARCHIVE_DIR", tmp_path / "archive")
+    _write_log(ui_data.LOG_FILE, [1, 5, 3])
+    compact_log()
+    _write_log(ui_data.LOG_FILE, [4, 2], state="ENFERMEDAD AGUDA")
+
+    table = ui_data.sorted_archive_table(sort_by="age", descending=False)
+    assert table["age"].to_pylist() == [1, 2, 3, 4, 5]
+
+    table = ui_data.sorted_archive_table(age_range=(2, 4), sort_by="state")
+    assert table["state"].to_pylist() == ["ENFERMEDAD LEVE"] + ["ENFERMEDAD AGUDA"] * 2
+    assert table["age"].to_pylist() == [3, 4, 2]
+
+    assert ui_data.sorted_archive_table(severity_range=(5.0, 10.0)).num_rows == 0
+
+
+## Test de la versión de las reglas:
+# rule_version se guarda como categoría; los archivos escritos antes de la
+# columna se leen con la versión nula.
+def test_archive_rule_version(tmp_path, monkeypatch):
+    import pyarrow.parquet as pq
+
+    from utils.archive import to_table
+
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    monkeypatch.setattr(ui_data, "ARCHIVE_DIR", tmp_path / "archive")
+    _write_log(ui_data.LOG_FILE, [1])
+    legacy = to_table(json.loads(line) for line in ui_data.LOG_FILE.read_text("utf-8").splitlines())
+    folder = ui_data.ARCHIVE_DIR / "date=2024-03-01"
+    folder.mkdir(parents=True)
+    pq.write_table(legacy.drop_columns(["date", "rule_version"]), folder / "part-antiguo.parquet")
+    ui_data.LOG_FILE.unlink()
+
+    _write_log(ui_data.LOG_FILE, [2], rule_version="1")
+    _write_log(ui_data.LOG_FILE, [3], rule_version="2")
+    compact_log()
+
+    df = ui_data.read_archive(columns=["age", "rule_version"])
+    assert df["rule_version"].dtype == "category"
+    assert sorted(df["age"]) == [1, 2, 3]
+    table = ui_data.sorted_archive_table(sort_by="timestamp")
+    assert table["rule_version"].to_pylist() == ["2", "1", None]
+
+
+## Test de valores fuera del esquema:
+# Una duración que las reglas aceptan pero no cabe en uint16 se archiva; un
+# timestamp ilegible o una edad negativa se descartan y cuentan sin detener
+# la compactación.
+def test_compact_log_skips_bad_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    monkeypatch.setattr(ui_data, "ARCHIVE_DIR", tmp_path / "archive")
+    long_course = PatientInput(40, 4.0, 70_000, *[False] * 7)
+    state, explanation = predict_state(long_course)
+    ui_data.log_prediction(state, explanation, long_course)
+    _write_log(ui_data.LOG_FILE, [1])
+    with ui_data.LOG_FILE.open("a", encoding="utf-8") as f:
+        for timestamp, age in (("ayer", 30), ("2024-13-01T00:00:00", 30), ("2024-03-02T00:00:00", -1)):
+            rec = {"timestamp": timestamp, "state": state, "explanation": "x", "inputs": {"age": age}}
+            f.write(json.dumps(rec) + "\n")
+
+    before = ARCHIVE_SKIPPED.value()
+    assert compact_log() == 2
+    assert ARCHIVE_SKIPPED.value() - before == 3
+    state_file = json.loads((ui_data.ARCHIVE_DIR / STATE_FILE_NAME).read_text("utf-8"))
+    assert state_file["skipped"] == 3
+
+    df = ui_data.read_archive()
+    assert sorted(df["duration_days"]) == [3, 70_000]
+    assert compact_log() == 0
+
+
+## Test de partes tras rotar o truncar el log:
+# Un log nuevo (con otro inode o con el mismo, si se trunca en el lugar)
+# vuelve a empezar en el byte 0; sus partes no pisan las ya escritas.
+def test_compact_log_after_rotation_keeps_parts(tmp_path, monkeypatch):
+    import utils.rollups as rollups
+    import utils.rotation as rotation
+
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    monkeypatch.setattr(ui_data, "ARCHIVE_DIR", tmp_path / "archive")
+    monkeypatch.setattr(ui_data, "SEGMENTS_DIR", tmp_path / "segments")
+    monkeypatch.setattr(rollups, "ROLLUP_DB", tmp_path / "rollups.db")
+
+    _write_log(ui_data.LOG_FILE, [1, 2])
+    assert compact_log() == 2
+    assert rotation.rotate_log(force=True) is not None
+    _write_log(ui_data.LOG_FILE, [1, 2], state="ENFERMEDAD AGUDA")
+    assert compact_log() == 2
+
+    # Mismo inode y mismo offset inicial que el log anterior
+    inode = ui_data.LOG_FILE.stat().st_ino
+    ui_data.LOG_FILE.write_bytes(b"")
+    _write_log(ui_data.LOG_FILE, [1, 2], state="ENFERMEDAD GRAVE")
+    assert ui_data.LOG_FILE.stat().st_ino == inode
+    assert compact_log() == 2
+
+    df = ui_data.read_archive(include_pending=False)
+    assert len(df) == 6
+    assert len(list(ui_data.ARCHIVE_DIR.glob("date=2024-03-01/part-*.parquet"))) == 3
+
+
+## Test de corrida interrumpida:
+# Las partes escritas sin llegar al estado se descartan y el lote se vuelve a
+# compactar una sola vez.
+def test_compact_log_discards_unrecorded_parts(tmp_path, monkeypatch):
+    import utils.archive as archive
+
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    monkeypatch.setattr(ui_data, "ARCHIVE_DIR", tmp_path / "archive")
+    _write_log(ui_data.LOG_FILE, [1, 2])
+
+    write_state = archive._write_state
+    calls = []
+
+    def interrupted(archive_dir, state):
+        # Deja pasar el estado inicial; se interrumpe al terminar el lote
+        calls.append(state)
+        if len(calls) > 1:
+            raise KeyboardInterrupt
+        write_state(archive_dir, state)
+
+    with monkeypatch.context() as m:
+        m.setattr(archive, "_write_state", interrupted)
+        try:
+            compact_log()
+        except KeyboardInterrupt:
+            pass
+    assert len(list(ui_data.ARCHIVE_DIR.glob("date=*/part-*.parquet"))) == 2
+
+    assert compact_log() == 2
+    assert len(ui_data.read_archive(include_pending=False)) == 2
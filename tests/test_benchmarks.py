@@ -0,0 +1,64 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import json
+
+from benchmarks.run import compare
+from benchmarks.synthetic import patients, write_log
+from rules import predict_state
+
+
+## Test del generador sintético:
+# Los pacientes respetan los rangos del formulario de app.py y son válidos
+# para predict_state.
+def test_synthetic_patients_in_ui_ranges(tmp_path):
+    for p in patients(2000, seed=3):
+        assert 0 <= p.age <= 120
+        assert 0 <= p.severity <= 10 and round(p.severity * 10) == p.severity * 10
+        assert 0 <= p.duration_days <= 3650
+        predict_state(p)
+
+    path = write_log(tmp_path / "log.jsonl", 50, chunk=7)
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 50
+    assert json.loads(lines[-1])["timestamp"] == "2024-01-01T00:00:49"
+
+
+## Test del modo de umbral de regresión:
+# Solo se reportan las métricas que empeoran más que el umbral, según si
+# para cada una es mejor un valor más alto o más bajo.
+def test_compare_detects_regressions():
+    baseline = {
+        "metrics": {
+            "a.throughput": {"value": 100.0, "unit": "calls/s", "better": "higher"},
+            "a.p99_us": {"value": 10.0, "unit": "us", "better": "lower"},
+            "b.p50_us": {"value": 10.0, "unit": "us", "better": "lower"},
+        }
+    }
+    current = {
+        "metrics": {
+            "a.throughput": {"value": 80.0, "unit": "calls/s", "better": "higher"},
+            "a.p99_us": {"value": 10.5, "unit": "us", "better": "lower"},
+            "b.p50_us": {"value": 5.0, "unit": "us", "better": "lower"},
+        }
+    }
+    regressions = compare(current, baseline, threshold=0.10)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("a.throughput")
+
+
+## Test del arranque de app.py:
+# Las importaciones de nivel superior no incluyen dependencias pesadas y
+# el reporte de importación las ordena de la más lenta a la más rápida.
+def test_app_startup_imports_are_light():
+    from benchmarks.startup import app_imports, import_report
+
+    modules = app_imports()
+    assert "streamlit" in modules and "rules" in modules
+    assert not {"pandas", "pyarrow", "PIL", "numpy"} & {m.split(".")[0] for m in modules}
+
+    report = import_report(["json", "csv"])
+    assert {name for name, _ in report} >= {"json", "csv"}
+    assert [s for _, s in report] == sorted((s for _, s in report), reverse=True)
@@ -0,0 +1,143 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from rules import PatientKey, predict_state
+from utils import binlog
+import utils.ui_data as ui_data
+
+
+def _records(n):
+    records = []
+    for i in range(n):
+        key = PatientKey(
+            age=i % 90,
+            severity=round(i % 101 / 10, 1),
+            duration_days=i % 250,
+            has_chronic_disease=i % 2 == 0,
+            has_metastasis=i % 3 == 0,
+            recent_weight_loss=i % 5 == 0,
+            is_bedridden=i % 7 == 0,
+            refractory_pain=i % 11 == 0,
+            multiple_organ_failure=i % 13 == 0,
+            has_recent_imaging=i % 4 == 0,
+        )
+        state, explanation = predict_state(key)
+        records.append(
+            ui_data.build_record(
+                state,
+                explanation,
+                {name: getattr(key, name) for name in ui_data.INPUT_FIELDS},
+                (datetime(2024, 3, 1) + timedelta(seconds=i, microseconds=i)).isoformat(),
+            )
+        )
+    return records
+
+
+## Test de conversión ida y vuelta:
+# JSONL → binario → JSONL devuelve los mismos registros (la severidad con
+# paso 0.1 se conserva exacta) y el binario ocupa RECORD_DTYPE por registro.
+def test_roundtrip_jsonl(tmp_path):
+    records = _records(500)
+    src = tmp_path / "log.jsonl"
+    src.write_bytes(b"".join(map(binlog.encode_record, records)) + b"{corrupta\n")
+
+    assert binlog.jsonl_to_binary(src, tmp_path / "log.bin", chunk_size=64) == 500
+    size = (tmp_path / "log.bin").stat().st_size
+    assert size == binlog.HEADER_SIZE + 500 * binlog.RECORD_DTYPE.itemsize
+
+    assert binlog.binary_to_jsonl(tmp_path / "log.bin", tmp_path / "back.jsonl") == 500
+    with (tmp_path / "back.jsonl").open("r", encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == records
+
+
+## Test de lectura con mapeo en memoria:
+# Los conteos y filtros con NumPy coinciden con los registros originales, y
+# un registro a medio escribir al final se ignora y se descarta al agregar.
+def test_memmap_aggregation(tmp_path):
+    records = _records(300)
+    path = tmp_path / "log.bin"
+    binlog.append_records(path, records[:200])
+    with path.open("ab") as f:
+        f.write(b"\x01\x02\x03")
+    assert len(binlog.open_records(path)) == 200
+
+    binlog.append_records(path, records[200:])
+    mapped = binlog.open_records(path)
+    assert isinstance(mapped, np.memmap)
+    assert len(mapped) == 300
+
+    expected = {}
+    for rec in records:
+        expected[rec["state"]] = expected.get(rec["state"], 0) + 1
+    assert binlog.state_counts(path) == expected
+
+    metastasis = binlog.flag_values(mapped, "has_metastasis")
+    assert metastasis.sum() == sum(rec["inputs"]["has_metastasis"] for rec in records)
+    assert np.allclose(
+        binlog.severity_values(mapped), [rec["inputs"]["severity"] for rec in records]
+    )
+
+
+## Test de valores fuera de rango:
+def test_out_of_range_values(tmp_path):
+    record = _records(1)[0]
+    record["inputs"]["duration_days"] = 70_000
+    try:
+        binlog.append_records(tmp_path / "log.bin", [record])
+        assert False, "Se esperaba ValueError por duración fuera de rango."
+    except ValueError:
+        pass
+
+
+## Test de conversión con registros que no caben:
+# Una duración que las reglas aceptan pero no cabe en uint16 o un timestamp
+# ilegible se descartan y cuentan sin detener la conversión.
+def test_convert_skips_out_of_range(tmp_path):
+    records = _records(3)
+    records[1]["inputs"]["duration_days"] = 70_000
+    records[2]["timestamp"] = "ayer"
+    src = tmp_path / "log.jsonl"
+    src.write_bytes(b"".join(map(binlog.encode_record, records)))
+
+    before = binlog.BINLOG_SKIPPED.value()
+    assert binlog.jsonl_to_binary(src, tmp_path / "log.bin") == 1
+    assert binlog.BINLOG_SKIPPED.value() - before == 2
+    assert len(binlog.open_records(tmp_path / "log.bin")) == 1
+
+
+## Test de conversión interrumpida:
+# Si la conversión falla, el destino anterior queda intacto (o no se crea) y
+# no quedan temporales.
+def test_convert_failure_keeps_destination(tmp_path, monkeypatch):
+    src = tmp_path / "log.jsonl"
+    src.write_bytes(b"".join(map(binlog.encode_record, _records(10))))
+
+    def fail(records, vocab):
+        raise OSError("disco lleno")
+
+    with monkeypatch.context() as m:
+        m.setattr(binlog, "encode_records", fail)
+        try:
+            binlog.jsonl_to_binary(src, tmp_path / "log.bin")
+            assert False, "Se esperaba OSError."
+        except OSError:
+            pass
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["log.jsonl"]
+
+    assert binlog.jsonl_to_binary(src, tmp_path / "log.bin") == 10
+    before = (tmp_path / "log.bin").read_bytes()
+    with monkeypatch.context() as m:
+        m.setattr(binlog, "encode_records", fail)
+        try:
+            binlog.jsonl_to_binary(src, tmp_path / "log.bin")
+        except OSError:
+            pass
+    assert (tmp_path / "log.bin").read_bytes() == before
+    assert len(binlog.open_records(tmp_path / "log.bin")) == 10
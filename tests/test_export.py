@@ -0,0 +1,142 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import json
+import os
+import time
+
+import pandas as pd
+
+import utils.export as export
+import utils.ui_data as ui_data
+
+
+def _write_log(path, n):
+    with path.open("a", encoding="utf-8") as f:
+        for i in range(n):
+            rec = {
+                "timestamp": f"2024-01-01T00:00:{i:02d}",
+                "state": "ENFERMEDAD LEVE",
+                "explanation": "Caso leve, con comas y \"comillas\".",
+                "inputs": {
+                    "age": i,
+                    "severity": 4.5,
+                    "duration_days": 3,
+                    "has_chronic_disease": False,
+                    "has_metastasis": False,
+                    "recent_weight_loss": False,
+                    "is_bedridden": False,
+                    "refractory_pain": False,
+                    "multiple_organ_failure": False,
+                    "has_recent_imaging": True,
+                },
+            }
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        f.write("{corrupta\n")
+
+
+## Test de exportación CSV en bloques:
+# El CSV debe tener una fila por registro válido y columnas inputs.* aplanadas;
+# mientras el log no cambie, se reutiliza el mismo archivo.
+def test_export_csv_is_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    monkeypatch.setattr(export, "EXPORT_DIR", tmp_path / "exports")
+    _write_log(ui_data.LOG_FILE, 25)
+
+    path = export.export_predictions("csv", chunk_size=10)
+    df = pd.read_csv(path)
+    assert len(df) == 25
+    assert list(df.columns) == export.COLUMNS
+    assert df["inputs.age"].tolist() == list(range(25))
+    assert df["explanation"][0] == 'Caso leve, con comas y "comillas".'
+
+    mtime = path.stat().st_mtime_ns
+    assert export.export_predictions("csv") == path
+    assert path.stat().st_mtime_ns == mtime
+
+    _write_log(ui_data.LOG_FILE, 1)
+    new_path = export.export_predictions("csv")
+    assert new_path != path
+    # La anterior se conserva durante el periodo de gracia
+    assert path.exists()
+    assert len(pd.read_csv(new_path)) == 26
+    assert export.export_bytes("csv") == new_path.read_bytes()
+
+
+## Test del periodo de gracia:
+# Quien ya tenía abierta (o la ruta de) una exportación reemplazada puede
+# terminar de leerla; se borra cuando su sucesora supera el periodo.
+def test_export_replaced_after_grace(tmp_path, monkeypatch):
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    monkeypatch.setattr(export, "EXPORT_DIR", tmp_path / "exports")
+    _write_log(ui_data.LOG_FILE, 3)
+    first = export.export_predictions("csv")
+    reader = export.open_export("csv")
+
+    monkeypatch.setattr(export, "EXPORT_GRACE_SECONDS", 60)
+    _write_log(ui_data.LOG_FILE, 1)
+    second = export.export_predictions("csv")
+    assert first.exists()
+
+    # Una hora después: la sucesora de first ya superó el periodo
+    for path, age in ((first, 7200), (second, 3600)):
+        os.utime(path, (time.time() - age, time.time() - age))
+    _write_log(ui_data.LOG_FILE, 1)
+    third = export.export_predictions("csv")
+    assert not first.exists()
+    assert second.exists() and third.exists()
+    with reader:
+        assert len(pd.read_csv(reader)) == 3
+
+
+## Test de exportación Parquet:
+# Las columnas de entrada quedan tipadas (enteros, flotantes y booleanos).
+def test_export_parquet_typed_columns(tmp_path, monkeypatch):
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    monkeypatch.setattr(export, "EXPORT_DIR", tmp_path / "exports")
+    _write_log(ui_data.LOG_FILE, 5)
+
+    df = pd.read_parquet(export.export_predictions("parquet", chunk_size=2))
+    assert len(df) == 5
+    assert df["inputs.age"].dtype == "int64"
+    assert df["inputs.has_recent_imaging"].dtype == "bool"
+
+
+## Test sin log:
+# Si aún no hay predicciones, la exportación lanza FileNotFoundError.
+def test_export_without_log(tmp_path, monkeypatch):
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    try:
+        export.export_predictions("csv")
+        assert False, "Se esperaba FileNotFoundError sin log."
+    except FileNotFoundError:
+        pass
+
+
+## Test de exportaciones simultáneas:
+# Dos hilos del mismo proceso que exportan a la vez usan archivos temporales
+# distintos: ninguno pierde el suyo y no quedan temporales.
+def test_export_concurrent_threads(tmp_path, monkeypatch):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    monkeypatch.setattr(export, "EXPORT_DIR", tmp_path / "exports")
+    _write_log(ui_data.LOG_FILE, 5)
+
+    write_csv = export._write_csv
+    both_written = threading.Barrier(2, timeout=10)
+
+    def write_and_wait(path, records, chunk_size):
+        write_csv(path, records, chunk_size)
+        both_written.wait()
+
+    monkeypatch.setattr(export, "_write_csv", write_and_wait)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        paths = list(pool.map(lambda _: export.export_predictions("csv"), range(2)))
+
+    assert paths[0] == paths[1]
+    assert len(pd.read_csv(paths[0])) == 5
+    assert [p.name for p in export.EXPORT_DIR.iterdir()] == [paths[0].name]
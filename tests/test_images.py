@@ -0,0 +1,80 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import hashlib
+import io
+
+import pytest
+from PIL import Image
+
+import utils.images as images
+
+
+def _upload(size=(3000, 2000), fmt="PNG", mode="RGB"):
+    buf = io.BytesIO()
+    Image.new(mode, size, color=128 if mode == "L" else (200, 30, 30)).save(buf, fmt)
+    buf.seek(0)
+    return buf
+
+
+## Test del almacén direccionado por contenido:
+# El original se guarda bajo su sha256, una sola vez, y la vista previa
+# queda acotada a PREVIEW_MAX_SIZE.
+def test_store_upload_deduplicates_and_downscales(tmp_path, monkeypatch):
+    monkeypatch.setattr(images, "IMAGE_STORE_DIR", tmp_path / "store")
+    upload = _upload()
+    data = upload.getvalue()
+
+    digest = images.store_upload(upload)
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert images.original_path(digest).read_bytes() == data
+    with Image.open(images.preview_path(digest)) as preview:
+        assert max(preview.size) <= max(images.PREVIEW_MAX_SIZE)
+        assert preview.size[0] > preview.size[1]
+
+    assert images.store_upload(_upload()) == digest
+    files = sorted(p.name for p in (tmp_path / "store").rglob("*") if p.is_file())
+    assert files == [digest, f"{digest}.preview.jpg"]
+
+
+## Test de imágenes no decodificables y modos de color:
+# Un archivo que Pillow no reconoce se guarda igual, sin vista previa; las
+# imágenes en escala de grises o con alfa generan su vista previa JPEG.
+def test_preview_for_invalid_and_special_modes(tmp_path, monkeypatch):
+    monkeypatch.setattr(images, "IMAGE_STORE_DIR", tmp_path / "store")
+
+    digest = images.store_upload(io.BytesIO(b"no es una imagen"))
+    assert images.original_path(digest).exists()
+    assert not images.preview_path(digest).exists()
+
+    for mode in ("L", "RGBA"):
+        digest = images.store_upload(_upload((50, 80), mode=mode))
+        with Image.open(images.preview_path(digest)) as preview:
+            assert preview.size == (50, 80)
+    assert not list((tmp_path / "store").rglob("*.tmp"))
+
+
+## Test de vista previa fallida:
+# Si guardar la vista previa falla no queda el archivo temporal, tanto si
+# el error se absorbe (disco lleno) como si se propaga.
+def test_failed_preview_leaves_no_tmp(tmp_path, monkeypatch):
+    monkeypatch.setattr(images, "IMAGE_STORE_DIR", tmp_path / "store")
+    digest = images._spill(_upload((50, 80)))
+
+    def full_disk(self, fp, *args, **kwargs):
+        fp.write(b"\xff\xd8parcial")
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(Image.Image, "save", full_disk)
+    assert images.make_preview(digest) is None
+
+    def interrupted(self, fp, *args, **kwargs):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(Image.Image, "save", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        images.make_preview(digest)
+    assert not images.preview_path(digest).exists()
+    assert not list((tmp_path / "store").rglob("*.tmp"))
@@ -0,0 +1,152 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import json
+
+import utils.ui_data as ui_data
+from rules import PatientInput, predict_state
+from utils.log_store import SqliteLogStore
+
+
+def _patient(age, severity, duration_days, chronic=False):
+    return PatientInput(
+        age=age,
+        severity=severity,
+        duration_days=duration_days,
+        has_chronic_disease=chronic,
+        has_metastasis=False,
+        recent_weight_loss=False,
+        is_bedridden=False,
+        refractory_pain=False,
+        multiple_organ_failure=False,
+        has_recent_imaging=False,
+    )
+
+
+## Test del backend SQLite:
+# Con PREDICTIONS_LOG_BACKEND=sqlite, log_prediction escribe en la base y
+# load_stats / tail_predictions / predictions_dataframe leen de ella.
+def test_sqlite_backend_roundtrip(tmp_path, monkeypatch):
+    monkeypatch.setattr(ui_data, "LOG_BACKEND", "sqlite")
+    monkeypatch.setattr(ui_data, "DB_FILE", tmp_path / "predictions_log.db")
+
+    assert ui_data.load_stats()["total_by_state"] == {}
+
+    patients = [_patient(30, 1, 1), _patient(60, 5, 45, chronic=True), _patient(40, 7, 3)]
+    for patient in patients:
+        state, explanation = predict_state(patient)
+        ui_data.log_prediction(state, explanation, patient)
+
+    stats = ui_data.load_stats()
+    assert stats["total_by_state"] == {
+        "NO ENFERMO": 1,
+        "ENFERMEDAD CRÓNICA": 1,
+        "ENFERMEDAD AGUDA": 1,
+    }
+    assert [r["inputs"]["age"] for r in stats["last_five"]] == [30, 60, 40]
+    assert stats["last_five"][1]["inputs"]["has_chronic_disease"] is True
+    assert ui_data.tail_predictions(1)[0]["state"] == "ENFERMEDAD AGUDA"
+
+    df = ui_data.predictions_dataframe(state="ENFERMEDAD CRÓNICA")
+    assert len(df) == 1
+    assert df.iloc[0]["inputs"]["duration_days"] == 45
+
+    with ui_data.get_store().session() as conn:
+        (mode,) = conn.execute("PRAGMA journal_mode").fetchone()
+    assert mode == "wal"
+
+
+## Test del importador JSONL:
+# Las líneas válidas se importan una sola vez; las corruptas se ignoran.
+def test_import_jsonl_once(tmp_path):
+    src = tmp_path / "predictions_log.jsonl"
+    records = [
+        {
+            "timestamp": f"2024-01-0{i}T00:00:00",
+            "state": "ENFERMEDAD LEVE",
+            "explanation": "x",
+            "inputs": {"age": i, "severity": 4.0, "duration_days": 2},
+        }
+        for i in range(1, 4)
+    ]
+    src.write_text(
+        "".join(json.dumps(r) + "\n" for r in records) + "{corrupta\n", encoding="utf-8"
+    )
+
+    store = SqliteLogStore(tmp_path / "predictions_log.db")
+    assert store.import_jsonl(src) == 3
+    assert store.import_jsonl(src) == 0
+    assert store.count() == 3
+    assert store.count(start="2024-01-02", end="2024-01-03") == 1
+    assert [r["timestamp"] for r in store.query(limit=2)] == [
+        "2024-01-03T00:00:00",
+        "2024-01-02T00:00:00",
+    ]
+
+
+## Test de la versión de las reglas en SQLite:
+# rule_version se guarda y se lee de vuelta; una base creada antes de la
+# columna se migra al abrirla y sus filas viejas quedan sin versión.
+def test_rule_version_column_and_migration(tmp_path):
+    import sqlite3
+
+    from utils.log_store import _SCHEMA
+
+    db = tmp_path / "predictions_log.db"
+    conn = sqlite3.connect(db)
+    conn.executescript(_SCHEMA.replace(",\n    rule_version TEXT", ""))
+    conn.execute(
+        "INSERT INTO predictions (timestamp, state, explanation) VALUES (?, ?, ?)",
+        ("2024-01-01T00:00:00", "NO ENFERMO", "x"),
+    )
+    conn.commit()
+    conn.close()
+
+    store = SqliteLogStore(db)
+    patient = _patient(40, 7, 3)
+    state, explanation = predict_state(patient)
+    record = ui_data.build_record(
+        state, explanation, vars(patient), "2024-01-02T00:00:00", rule_version="2"
+    )
+    assert store.append([record]) == 1
+
+    new, old = store.query()
+    assert "rule_version" not in old
+    assert new["rule_version"] == "2"
+    assert new["inputs"]["severity"] == 7.0
+
+
+## Test de esquema y conexiones:
+# El esquema y la migración se aplican una sola vez por base (otra vez si la
+# base se borra), y stats() usa una única conexión.
+def test_schema_prepared_once_and_stats_single_connection(tmp_path, monkeypatch):
+    import utils.log_store as log_store
+
+    migrations = []
+    migrate = log_store._migrate
+    monkeypatch.setattr(log_store, "_migrate", lambda conn: migrations.append(migrate(conn)))
+
+    db = tmp_path / "predictions_log.db"
+    for _ in range(3):
+        SqliteLogStore(db).connect().close()
+    assert len(migrations) == 1
+
+    db.unlink()
+    (tmp_path / "predictions_log.db-wal").unlink(missing_ok=True)
+    (tmp_path / "predictions_log.db-shm").unlink(missing_ok=True)
+    store = SqliteLogStore(db)
+    patient = _patient(40, 7, 3)
+    state, explanation = predict_state(patient)
+    store.append([ui_data.build_record(state, explanation, vars(patient), "2024-01-01T00:00:00")])
+    assert len(migrations) == 2
+
+    connections = []
+    connect = store.connect
+    monkeypatch.setattr(store, "connect", lambda: connections.append(1) or connect())
+    stats = store.stats()
+    assert len(connections) == 1
+    assert stats["total_by_state"] == {state: 1}
+    assert stats["last_timestamp"] == "2024-01-01T00:00:00"
+    assert [r["inputs"]["age"] for r in stats["last_five"]] == [40]
@@ -0,0 +1,218 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import json
+import multiprocessing
+import threading
+import time
+
+from utils.log_writer import AsyncLogWriter, BufferedLogWriter, write_locked, encode_record
+
+
+def _record(i, writer=0):
+    # Registros grandes para forzar escrituras de varios bloques
+    return {"writer": writer, "i": i, "explanation": "ñ" * 5000}
+
+
+def _read(path):
+    with path.open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+## Test de commit agrupado por tamaño:
+# Al llenarse el buffer se escribe el grupo completo; el resto espera.
+def test_flush_when_buffer_full(tmp_path):
+    path = tmp_path / "log.jsonl"
+    writer = BufferedLogWriter(path, max_records=3, max_delay=60)
+
+    for i in range(4):
+        writer.write(_record(i))
+    assert [r["i"] for r in _read(path)] == [0, 1, 2]
+    assert writer.pending() == 1
+
+    writer.close()
+    assert [r["i"] for r in _read(path)] == [0, 1, 2, 3]
+
+
+## Test de commit agrupado por tiempo:
+# Un registro no espera en el buffer más de max_delay segundos.
+def test_flush_after_delay(tmp_path):
+    path = tmp_path / "log.jsonl"
+    writer = BufferedLogWriter(path, max_records=100, max_delay=0.05, fsync="never")
+    writer.write(_record(0))
+
+    # El archivo puede existir antes de que termine la escritura: se espera
+    # la línea completa, no solo el archivo
+    expected = encode_record(_record(0))
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        if path.exists() and path.read_bytes() == expected:
+            break
+        time.sleep(0.01)
+    assert [r["i"] for r in _read(path)] == [0]
+    writer.close()
+
+
+def _write_many(path, writer_id, n):
+    for i in range(n):
+        write_locked(path, encode_record(_record(i, writer_id)))
+
+
+## Test de escritores concurrentes:
+# Con varios procesos escribiendo al mismo archivo, ninguna línea se intercala.
+def test_concurrent_processes_do_not_interleave(tmp_path):
+    path = tmp_path / "log.jsonl"
+    procs = [
+        multiprocessing.Process(target=_write_many, args=(path, w, 50))
+        for w in range(4)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+    records = _read(path)
+    assert len(records) == 200
+    for w in range(4):
+        assert [r["i"] for r in records if r["writer"] == w] == list(range(50))
+
+
+## Test de política de fsync inválida:
+def test_invalid_fsync_policy(tmp_path):
+    try:
+        BufferedLogWriter(tmp_path / "log.jsonl", fsync="siempre")
+        assert False, "Se esperaba ValueError por política de fsync inválida."
+    except ValueError:
+        pass
+
+
+class _GatedSink:
+    """Sink que no escribe hasta que se abre la compuerta (simula disco lento)."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.records = []
+
+    def __call__(self, batch):
+        self.gate.wait()
+        self.records.extend(batch)
+
+
+## Test de escritor asíncrono:
+# close() escribe todo lo encolado, en orden.
+def test_async_writer_flushes_on_close(tmp_path):
+    path = tmp_path / "log.jsonl"
+    writer = AsyncLogWriter(
+        lambda batch: write_locked(path, b"".join(map(encode_record, batch))),
+        maxsize=10,
+        on_full="block",
+        batch_size=4,
+    )
+    for i in range(50):
+        assert writer.submit(_record(i))
+    writer.close()
+    assert [r["i"] for r in _read(path)] == list(range(50))
+    assert writer.stats()["written"] == 50
+    assert writer.stats()["queue_depth"] == 0
+
+
+## Test de cola llena con política "drop":
+# Lo que no cabe se descarta y se cuenta; submit no se bloquea.
+def test_async_writer_drops_when_full(tmp_path):
+    sink = _GatedSink()
+    writer = AsyncLogWriter(sink, maxsize=2, on_full="drop", batch_size=1)
+    results = [writer.submit({"i": i}) for i in range(10)]
+    sink.gate.set()
+    writer.close()
+
+    assert results.count(False) == writer.stats()["dropped"] > 0
+    assert len(sink.records) + writer.stats()["dropped"] == 10
+
+
+## Test de cola llena con política "spill":
+# Lo que no cabe va a disco y termina en el log; no se pierde nada.
+def test_async_writer_spills_when_full(tmp_path):
+    sink = _GatedSink()
+    spill = tmp_path / "log.jsonl.spill"
+    writer = AsyncLogWriter(sink, maxsize=2, on_full="spill", spill_path=spill, batch_size=1)
+    for i in range(10):
+        assert writer.submit({"i": i})
+    assert spill.exists()
+    assert writer.stats()["spilled"] > 0
+
+    sink.gate.set()
+    writer.close()
+    assert sorted(r["i"] for r in sink.records) == list(range(10))
+    assert not spill.exists()
+
+
+## Test de sink con error:
+# Con política "spill" el lote fallido se guarda y se reintenta al cerrar.
+def test_async_writer_spills_failed_batch(tmp_path):
+    calls = []
+
+    def flaky(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise OSError("disco lleno")
+
+    spill = tmp_path / "log.jsonl.spill"
+    writer = AsyncLogWriter(flaky, spill_path=spill)
+    writer.submit({"i": 0})
+    writer.close()
+    assert calls == [1, 1]
+    assert writer.stats()["written"] == 1
+
+
+## Test de sink que falla un rato y se recupera:
+# Lo derramado no se borra mientras el sink falla: se reintenta con espera
+# y termina escrito en el log sin contarse como fallido.
+def test_async_writer_spill_survives_failing_sink(tmp_path):
+    written = []
+    recovers_at = time.monotonic() + 0.3
+
+    def flaky(batch):
+        if time.monotonic() < recovers_at:
+            raise OSError("disco lleno")
+        written.extend(batch)
+
+    spill = tmp_path / "log.jsonl.spill"
+    writer = AsyncLogWriter(flaky, spill_path=spill, batch_size=2)
+    for i in range(5):
+        writer.submit({"i": i})
+    deadline = time.monotonic() + 5
+    while len(written) < 5 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    stats = writer.stats()
+    writer.close()
+    assert sorted(r["i"] for r in written) == list(range(5))
+    assert stats["failed"] == 0 and stats["written"] == 5
+    assert not spill.exists()
+    assert not spill.with_name(spill.name + ".draining").exists()
+
+
+## Test de sink caído al cerrar:
+# Si el sink sigue fallando al cerrar, el derrame queda en disco.
+def test_async_writer_keeps_spill_when_sink_down(tmp_path):
+    def broken(batch):
+        raise OSError("disco lleno")
+
+    spill = tmp_path / "log.jsonl.spill"
+    writer = AsyncLogWriter(broken, spill_path=spill)
+    for i in range(3):
+        writer.submit({"i": i})
+    writer.close()
+    assert writer.stats()["failed"] == 0
+    assert [json.loads(line)["i"] for line in spill.read_text().splitlines()] == [0, 1, 2]
+
+
+## Test de política de cola llena inválida:
+def test_invalid_queue_policy(tmp_path):
+    for kwargs in ({"on_full": "esperar"}, {"on_full": "spill"}):
+        try:
+            AsyncLogWriter(lambda batch: None, **kwargs)
+            assert False, "Se esperaba ValueError."
+        except ValueError:
+            pass
@@ -0,0 +1,99 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import os
+import threading
+import time
+
+import pytest
+
+from utils import metrics
+
+
+## Test de contadores e histogramas:
+# Las series se separan por etiquetas y el histograma se exporta con
+# buckets acumulados, +Inf, suma y conteo.
+def test_counter_and_histogram_render():
+    counter = metrics.Counter("test_total", "Contador de prueba.")
+    counter.inc(state="LEVE")
+    counter.inc(2, state="LEVE")
+    counter.inc(state="AGUDA")
+    assert counter.value(state="LEVE") == 3
+    assert 'test_total{state="AGUDA"} 1' in counter.render()
+
+    hist = metrics.Histogram("test_seconds", "Histograma de prueba.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        hist.observe(value, stage="x")
+    lines = hist.render()
+    assert 'test_seconds_bucket{stage="x",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="x",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{stage="x",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{stage="x"} 3' in lines
+    summary = hist.summary()[(("stage", "x"),)]
+    assert summary["count"] == 3 and summary["avg"] == pytest.approx(5.55 / 3)
+
+
+## Test de timed:
+# Mide la etapa aunque falle, cuenta el error y propaga la excepción.
+def test_timed_counts_errors():
+    stage = "test_timed_stage"
+    with pytest.raises(RuntimeError):
+        with metrics.timed(stage):
+            raise RuntimeError("falla")
+    with metrics.timed(stage):
+        pass
+
+    key = (("stage", stage),)
+    assert metrics.STAGE_SECONDS.summary()[key]["count"] == 2
+    assert metrics.STAGE_ERRORS.value(stage=stage) == 1
+    text = metrics.render_prometheus()
+    assert "# TYPE medapp_stage_seconds histogram" in text
+    assert f'medapp_stage_errors_total{{stage="{stage}"}} 1' in text
+
+
+## Test del perfilador por muestreo:
+# MEDAPP_PROFILE solo decide si arranca con la primera llamada del proceso;
+# después se enciende y apaga con start_profiler / stop_profiler, y los
+# reruns (nuevas llamadas a maybe_start_profiler) no lo vuelven a encender.
+def test_profiler_start_stop(monkeypatch):
+    monkeypatch.setattr(metrics, "_profiler", None)
+    monkeypatch.setattr(metrics, "_profile_env_checked", False)
+    monkeypatch.delenv(metrics.PROFILE_ENV, raising=False)
+    assert metrics.maybe_start_profiler() is None
+    assert not metrics.profiler_running()
+
+    monkeypatch.setattr(metrics, "_profile_env_checked", False)
+    monkeypatch.setenv(metrics.PROFILE_ENV, "1")
+    monkeypatch.setenv(metrics.PROFILE_INTERVAL_ENV, "1")
+    stop = threading.Event()
+    busy = threading.Thread(target=stop.wait, name="busy")
+    busy.start()
+    try:
+        profiler = metrics.maybe_start_profiler()
+        assert metrics.start_profiler() is profiler
+        deadline = time.monotonic() + 5
+        while profiler.total == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert profiler.running and profiler.total > 0
+        assert any("test_metrics.py" in stack or "threading.py" in stack
+                   for stack, _ in profiler.top(50))
+
+        metrics.stop_profiler()
+        profiler._thread.join(timeout=5)
+        assert not metrics.profiler_running()
+        assert metrics.get_profiler() is profiler and profiler.total > 0
+        assert os.environ[metrics.PROFILE_ENV] == "1"
+        # Un rerun con MEDAPP_PROFILE=1 no lo vuelve a encender
+        assert metrics.maybe_start_profiler() is profiler
+        assert not metrics.profiler_running()
+
+        # Volver a encenderlo crea un perfilador nuevo
+        again = metrics.start_profiler(interval=0.001)
+        assert again is not profiler and metrics.profiler_running()
+        metrics.stop_profiler()
+        again._thread.join(timeout=5)
+    finally:
+        stop.set()
+        busy.join()
@@ -0,0 +1,142 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import json
+import threading
+import time
+
+import pandas as pd
+
+import utils.report_cache as report_cache
+import utils.ui_data as ui_data
+from utils.report_cache import ReportCache
+
+
+def _append(path, n, start=0):
+    with path.open("a", encoding="utf-8") as f:
+        for i in range(start, start + n):
+            rec = {
+                "timestamp": f"2024-01-01T00:{i // 60:02d}:{i % 60:02d}",
+                "state": "ENFERMEDAD LEVE" if i % 2 else "ENFERMEDAD AGUDA",
+                "explanation": "x",
+                "inputs": {"age": i, "severity": 4.0, "duration_days": 3},
+            }
+            f.write(json.dumps(rec) + "\n")
+
+
+## Test de invalidación por identidad del log:
+# Mientras el log no cambia los reruns reutilizan el resultado; al agregar
+# una línea la llave cambia y se recalcula.
+def test_report_cache_follows_log_identity(tmp_path, monkeypatch):
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    monkeypatch.setattr(ui_data, "ARCHIVE_DIR", tmp_path / "archive")
+    monkeypatch.setattr(report_cache, "default_cache", ReportCache(2**20))
+    _append(ui_data.LOG_FILE, 10)
+
+    first = report_cache.cached_stats()
+    assert report_cache.cached_stats() is first
+    table = report_cache.cached_sorted_table()
+    assert report_cache.cached_sorted_table() is table
+    timestamps = table["timestamp"].to_pylist()
+    assert timestamps == sorted(timestamps, reverse=True)
+
+    _append(ui_data.LOG_FILE, 1, start=10)
+    second = report_cache.cached_stats()
+    assert second is not first
+    assert sum(second["total_by_state"].values()) == 11
+    stats = report_cache.default_cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 3
+    # La entrada de stats del log anterior se descarta
+    assert stats["evictions"] == 1
+
+
+## Test de tendencias con rango móvil:
+# Un start que avanza dentro del mismo tramo reutiliza el resultado.
+def test_cached_trends_rounds_start(tmp_path, monkeypatch):
+    from utils import rollups
+
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    monkeypatch.setattr(rollups, "ROLLUP_DB", tmp_path / "rollups.db")
+    monkeypatch.setattr(report_cache, "default_cache", ReportCache(2**20))
+    _append(ui_data.LOG_FILE, 10)
+
+    first = report_cache.cached_trends("hour", start="2024-01-01T00:00:05.123456")
+    assert report_cache.cached_trends("hour", start="2024-01-01T00:59:59") is first
+    assert first["trend"]["count"].sum() == 10
+    later = report_cache.cached_trends("hour", start="2024-01-01T01:00:00")
+    assert later is not first and later["trend"].empty
+
+
+## Test del presupuesto de memoria:
+# Se descartan las entradas usadas hace más tiempo y no se guardan
+# resultados mayores que el presupuesto.
+def test_report_cache_memory_budget():
+    frame = pd.DataFrame({"a": range(1000)})
+    size = report_cache.estimate_size(frame)
+    cache = ReportCache(max_bytes=int(size * 2.5))
+
+    for args in [(1,), (2,), (1,), (3,)]:
+        cache.get_or_compute("table", "log", args, lambda: frame.copy())
+
+    stats = cache.stats()
+    assert stats["size"] == 2 and stats["evictions"] == 1
+    assert stats["bytes"] <= cache.max_bytes
+    # (2,) era la menos usada recientemente
+    calls = []
+    cache.get_or_compute("table", "log", (1,), lambda: calls.append(1))
+    cache.get_or_compute("table", "log", (2,), lambda: calls.append(2))
+    assert calls == [2]
+
+    big = ReportCache(max_bytes=10)
+    assert big.get_or_compute("x", "log", (), lambda: frame) is frame
+    assert big.stats()["size"] == 0
+
+
+## Test de cálculo único entre sesiones:
+# Varias sesiones que piden lo mismo a la vez esperan un solo cálculo.
+def test_report_cache_single_flight():
+    cache = ReportCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return {"ok": True}
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(cache.get_or_compute("s", "log", (), compute))
+        )
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+
+
+## Test de paginación:
+# Cada página trae solo sus filas; cambiar de página reutiliza la tabla
+# ordenada en la caché.
+def test_prediction_page(tmp_path, monkeypatch):
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    monkeypatch.setattr(ui_data, "ARCHIVE_DIR", tmp_path / "archive")
+    monkeypatch.setattr(report_cache, "default_cache", ReportCache(2**20))
+    _append(ui_data.LOG_FILE, 25)
+
+    page, total = report_cache.prediction_page(0, 10, sort_by="age", descending=False)
+    assert total == 25 and page["age"].tolist() == list(range(10))
+    last, _ = report_cache.prediction_page(2, 10, sort_by="age", descending=False)
+    assert last["age"].tolist() == list(range(20, 25))
+
+    page, total = report_cache.prediction_page(
+        0, 10, states=["ENFERMEDAD AGUDA"], age_range=(0, 9)
+    )
+    assert total == 5 and set(page["state"]) == {"ENFERMEDAD AGUDA"}
+    assert report_cache.default_cache.stats()["misses"] == 2
@@ -0,0 +1,106 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import json
+import random
+
+import rescore
+import utils.ui_data as ui_data
+from benchmarks.synthetic import random_patient
+from rules import PatientKey, predict_state
+from utils.log_writer import encode_record
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _write_log(path, n, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(n):
+        patient = random_patient(rng)
+        state, explanation = predict_state(patient)
+        lines.append(
+            encode_record(
+                ui_data.build_record(
+                    state,
+                    explanation,
+                    {name: getattr(patient, name) for name in ui_data.INPUT_FIELDS},
+                    f"2024-03-01T00:00:{i % 60:02d}.{i:06d}",
+                )
+            )
+        )
+    path.write_bytes(b"".join(lines) + b"{corrupta\n")
+
+
+def _stricter_rules(tmp_path):
+    # Versión "nueva": el umbral de cuadro agudo baja de 6 a 5
+    data = json.loads((ROOT / "rulesets" / "default.json").read_text(encoding="utf-8"))
+    assert data["thresholds"]["acute_min_severity"] == 6
+    data["thresholds"]["acute_min_severity"] = 5
+    path = tmp_path / "rules_new.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return rescore.load_rules(rescore.resolve_rules(str(path))), str(path)
+
+
+## Test de matriz de transición:
+# Con fragmentos pequeños (muchos cortes a mitad de línea) el resultado es
+# el mismo que recalcular registro por registro, con 1 y con 2 procesos.
+def test_transitions_match_reference(tmp_path, monkeypatch):
+    ui_data.LOG_FILE = tmp_path / "predictions_log.jsonl"
+    monkeypatch.setattr(ui_data, "SEGMENTS_DIR", tmp_path / "segments")
+    _write_log(ui_data.LOG_FILE, 3000)
+    monkeypatch.setattr(rescore, "MIN_SHARD_BYTES", 10_000)
+    monkeypatch.setattr(rescore, "SHARD_BYTES", 10_000)
+    new_rules, new_spec = _stricter_rules(tmp_path)
+
+    expected = {}
+    for rec in ui_data.iter_records():
+        patient = PatientKey(**rec["inputs"])
+        pair = (predict_state(patient)[0], new_rules(patient)[0])
+        expected[pair] = expected.get(pair, 0) + 1
+
+    for workers in (1, 2):
+        summary = rescore.rescore("rules:predict_state", new_spec, workers=workers, sample_size=5)
+        assert summary["rows"] == 3000
+        assert summary["invalid"] == 0
+        assert summary["stored_mismatch"] == 0
+        assert summary["transitions"] == expected
+        assert summary["changed"] == sum(n for (a, b), n in expected.items() if a != b) > 0
+        assert len(summary["sample"]) == 5
+        assert all(s["old_state"] != s["new_state"] for s in summary["sample"])
+        if workers == 1:
+            first_sample = summary["sample"]
+        else:
+            # La muestra no depende de cómo se reparte el trabajo
+            assert summary["sample"] == first_sample
+
+    matrix = rescore.transition_matrix(summary["transitions"])
+    assert int(matrix.values.sum()) == 3000
+
+
+## Test de versiones de las reglas:
+# "git:REV" carga el conjunto de reglas de un commit; "módulo:función" importa.
+def test_resolve_rules_from_git():
+    current = rescore.load_rules(rescore.resolve_rules("git:HEAD"))
+    reference = rescore.load_rules(rescore.resolve_rules("rules:predict_state"))
+    patient = PatientKey(40, 7.0, 3, False, False, False, False, False, False, False)
+    assert current(patient) == reference(patient)
+
+
+## Test de conjuntos de reglas como versión:
+# Un .json de ruleset.py sirve como --old/--new, también desde git.
+def test_resolve_rules_from_ruleset(tmp_path):
+    import ruleset
+
+    data = json.loads(ruleset.DEFAULT_RULESET_FILE.read_text(encoding="utf-8"))
+    data["thresholds"]["healthy_max_age"] = 70
+    path = tmp_path / "v2.json"
+    path.write_text(json.dumps(data), encoding="utf-8")
+
+    modified = rescore.load_rules(rescore.resolve_rules(str(path)))
+    default = rescore.load_rules(rescore.resolve_rules(str(ruleset.DEFAULT_RULESET_FILE)))
+    patient = PatientKey(67, 1.0, 1, False, False, False, False, False, False, False)
+    assert default(patient)[0] == "ENFERMEDAD LEVE"
+    assert modified(patient)[0] == "NO ENFERMO"
@@ -0,0 +1,81 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import json
+
+import utils.rollups as rollups
+import utils.ui_data as ui_data
+
+
+def _write_log(path, rows):
+    with path.open("a", encoding="utf-8") as f:
+        for timestamp, state, age, severity in rows:
+            rec = {
+                "timestamp": timestamp,
+                "state": state,
+                "explanation": "x",
+                "inputs": {"age": age, "severity": severity, "duration_days": 3},
+            }
+            f.write(json.dumps(rec) + "\n")
+
+
+## Test de refresco incremental:
+# Cada refresco suma solo las líneas nuevas a los tramos por hora y por
+# día, con promedios e histogramas de severidad y edad.
+def test_refresh_is_incremental(tmp_path, monkeypatch):
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    db = tmp_path / "rollups.db"
+    _write_log(
+        ui_data.LOG_FILE,
+        [
+            ("2024-03-01T10:15:00", "ENFERMEDAD LEVE", 30, 4.0),
+            ("2024-03-01T10:45:00", "ENFERMEDAD LEVE", 50, 5.0),
+            ("2024-03-01T11:05:00", "ENFERMEDAD AGUDA", 105, 10.0),
+        ],
+    )
+    assert rollups.refresh(db) == 3
+    assert rollups.refresh(db) == 0
+
+    _write_log(ui_data.LOG_FILE, [("2024-03-02T09:00:00", "ENFERMEDAD LEVE", 20, 3.5)])
+    with ui_data.LOG_FILE.open("a") as f:
+        f.write('{"timestamp": "2024-03-02T09:30')  # línea en escritura
+    assert rollups.refresh(db) == 1
+
+    hours = rollups.trend("hour", db=db)
+    assert hours[["bucket", "state", "count"]].values.tolist() == [
+        ["2024-03-01T10", "ENFERMEDAD LEVE", 2],
+        ["2024-03-01T11", "ENFERMEDAD AGUDA", 1],
+        ["2024-03-02T09", "ENFERMEDAD LEVE", 1],
+    ]
+    assert hours["severity_avg"].tolist()[0] == 4.5
+
+    days = rollups.trend("day", start="2024-03-01", end="2024-03-02", db=db)
+    assert days["count"].sum() == 3
+    ages = rollups.distribution("age", "day", db=db)
+    assert ages[ages["bucket"] == "2024-03-01"][["bin", "count"]].values.tolist() == [
+        [3, 1],
+        [5, 1],
+        [10, 1],
+    ]
+    assert rollups.age_bin_label(10) == "100+"
+
+
+## Test de backfill:
+# Reconstruye desde cero sumando logs rotados y el log actual, y los
+# refrescos siguientes continúan desde el final del log actual.
+def test_backfill_with_rotated_logs(tmp_path, monkeypatch):
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    db = tmp_path / "rollups.db"
+    rotated = tmp_path / "predictions_log.1.jsonl"
+    _write_log(rotated, [("2024-02-01T00:00:00", "NO ENFERMO", 10, 1.0)] * 2)
+    _write_log(ui_data.LOG_FILE, [("2024-03-01T00:00:00", "ENFERMEDAD LEVE", 40, 4.0)])
+
+    rollups.refresh(db)
+    assert rollups.backfill([rotated, ui_data.LOG_FILE], db) == 3
+    assert rollups.refresh(db) == 0
+    assert rollups.trend("day", db=db)["count"].tolist() == [2, 1]
+
+    severity = rollups.distribution("severity", "day", db=db)
+    assert severity["count"].sum() == 3
@@ -0,0 +1,126 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+
+import utils.rollups as rollups
+import utils.rotation as rotation
+import utils.ui_data as ui_data
+
+
+def _write_log(path, days, state="ENFERMEDAD LEVE"):
+    with path.open("a", encoding="utf-8") as f:
+        for i, day in enumerate(days):
+            rec = {
+                "timestamp": f"2024-03-{day:02d}T12:00:{i:02d}",
+                "state": state,
+                "explanation": "x",
+                "inputs": {"age": day, "severity": 4.5, "duration_days": 3},
+            }
+            f.write(json.dumps(rec) + "\n")
+
+
+def _setup(tmp_path, monkeypatch):
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    monkeypatch.setattr(ui_data, "ARCHIVE_DIR", tmp_path / "archive")
+    monkeypatch.setattr(ui_data, "SEGMENTS_DIR", tmp_path / "segments")
+    monkeypatch.setattr(rollups, "ROLLUP_DB", tmp_path / "rollups.db")
+
+
+## Test de rotación y manifiesto:
+# El segmento comprimido conserva las líneas; load_stats, tail_predictions y
+# la lectura del archivo siguen viendo los registros rotados.
+def test_rotate_log_keeps_readers_complete(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    _write_log(ui_data.LOG_FILE, [1, 2, 3])
+    original = ui_data.LOG_FILE.read_bytes()
+    assert ui_data.load_stats()["total_by_state"] == {"ENFERMEDAD LEVE": 3}
+
+    segment = rotation.rotate_log(force=True)
+    assert not ui_data.LOG_FILE.exists()
+    assert segment["records"] == 3 and segment["start"] == "2024-03-01T12:00:00"
+    with gzip.open(ui_data.SEGMENTS_DIR / segment["file"], "rb") as f:
+        assert f.read() == original
+    assert [s["file"] for s in ui_data.read_manifest()] == [segment["file"]]
+    assert ui_data.log_identity() is not None
+
+    _write_log(ui_data.LOG_FILE, [4], state="ENFERMEDAD AGUDA")
+    stats = ui_data.load_stats()
+    assert stats["total_by_state"] == {"ENFERMEDAD LEVE": 3, "ENFERMEDAD AGUDA": 1}
+    assert stats["last_timestamp"] == "2024-03-04T12:00:00"
+    assert [r["inputs"]["age"] for r in stats["last_five"]] == [1, 2, 3, 4]
+    assert [r["inputs"]["age"] for r in ui_data.tail_predictions(2)] == [3, 4]
+
+    # Archivo Parquet y rollups se pusieron al día antes de rotar
+    assert sorted(ui_data.read_archive()["age"]) == [1, 2, 3, 4]
+    assert rollups.trend("day")["count"].sum() == 3
+
+    ages = [r["inputs"]["age"] for r in ui_data.iter_records()]
+    assert ages == [1, 2, 3, 4]
+    # El rango salta segmentos completos según el manifiesto
+    assert [r["inputs"]["age"] for r in ui_data.iter_records(start="2024-03-04")] == [4]
+
+    # El backfill de rollups lee los segmentos comprimidos del manifiesto
+    assert rollups.backfill() == 4
+
+
+## Test de límites y retención:
+# Se rota por tamaño o antigüedad del primer registro, y la retención borra
+# los segmentos más antiguos del disco y del manifiesto.
+def test_rotation_limits_and_retention(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    monkeypatch.setattr(rotation, "ROTATE_MAX_BYTES", 10**9)
+    monkeypatch.setattr(rotation, "ROTATE_MAX_AGE_HOURS", 24)
+    monkeypatch.setattr(rotation, "RETENTION_SEGMENTS", 2)
+
+    _write_log(ui_data.LOG_FILE, [1])
+    assert not rotation.should_rotate(now=datetime(2024, 3, 1, 18))
+    assert rotation.should_rotate(now=datetime(2024, 3, 3))
+    monkeypatch.setattr(rotation, "ROTATE_MAX_BYTES", 10)
+    assert rotation.should_rotate(now=datetime(2024, 3, 1, 18))
+    assert rotation.rotate_log() is not None
+    assert rotation.rotate_log() is None  # log vacío
+
+    for day in (2, 3):
+        _write_log(ui_data.LOG_FILE, [day])
+        rotation.rotate_log()
+    segments = ui_data.read_manifest()
+    assert [s["start"][:10] for s in segments] == ["2024-03-02", "2024-03-03"]
+    assert sorted(p.name for p in ui_data.SEGMENTS_DIR.glob("*.gz")) == sorted(
+        s["file"] for s in segments
+    )
+
+    monkeypatch.setattr(rotation, "RETENTION_DAYS", 1)
+    assert rotation.enforce_retention(now=datetime(2024, 3, 4, 6)) == 1
+    assert ui_data.load_stats()["total_by_state"] == {"ENFERMEDAD LEVE": 1}
+
+
+## Test de rotación fallida:
+# Si falla al registrar el segmento no quedan archivos huérfanos, el log
+# activo queda intacto y maybe_rotate deja el error en el log del proceso.
+def test_failed_rotation_cleans_up(tmp_path, monkeypatch, caplog):
+    _setup(tmp_path, monkeypatch)
+    _write_log(ui_data.LOG_FILE, [1, 2])
+    original = ui_data.LOG_FILE.read_bytes()
+
+    def full_disk(segments):
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(rotation, "_write_manifest", full_disk)
+    with pytest.raises(OSError, match="disco lleno"):
+        rotation.rotate_log(force=True)
+    assert list(ui_data.SEGMENTS_DIR.iterdir()) == []
+    assert ui_data.LOG_FILE.read_bytes() == original
+
+    monkeypatch.setattr(rotation, "ROTATE_MAX_BYTES", 10)
+    rotation.maybe_rotate()
+    assert rotation._rotating.acquire(timeout=5)
+    rotation._rotating.release()
+    assert "No se pudo rotar" in caplog.text
+    assert list(ui_data.SEGMENTS_DIR.iterdir()) == []
@@ -3,7 +3,12 @@ from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
-from rules import PatientInput, predict_state, TERMINAL, CRONICA
+import math
+
+import numpy as np
+
+from rules import PatientInput, predict_state, reference_predict_state, TERMINAL, CRONICA
+from rules_batch import FIELDS, predict_state_batch
 
 
 ## Test para condición terminal:
@@ -73,3 +78,36 @@ def test_invalid_inputs():
             str(e)
             == "Entradas inválidas: age>=0, duration_days>=0, severity en [0,10]."
         )
+
+
+## Test de NaN e infinito:
+# Una celda vacía (NaN) o un valor infinito en edad, duración o severidad es
+# una entrada inválida: predict_state y la referencia lanzan ValueError, y la
+# versión por lotes la marca como inválida.
+def test_nan_and_inf_are_invalid():
+    cases = [
+        {"age": math.nan},
+        {"age": math.inf},
+        {"duration_days": math.nan},
+        {"duration_days": math.inf},
+        {"severity": math.nan},
+        {"severity": math.inf},
+    ]
+    for change in cases:
+        values = {"age": 40, "severity": 4.0, "duration_days": 3, **change}
+        patient = PatientInput(**values, **{name: False for name in FIELDS[3:]})
+        for fn in (predict_state, reference_predict_state):
+            try:
+                fn(patient)
+                assert False, f"Se esperaba ValueError con {change}."
+            except ValueError:
+                pass
+
+    data = {name: np.zeros(len(cases) + 1, dtype=bool) for name in FIELDS[3:]}
+    for name in ("age", "severity", "duration_days"):
+        data[name] = np.array([40.0, 4.0, 3.0][FIELDS.index(name)]).repeat(len(cases) + 1)
+    for i, change in enumerate(cases):
+        for name, value in change.items():
+            data[name][i] = value
+    states, _ = predict_state_batch(data, on_invalid="mark")
+    assert [s is None for s in states] == [True] * len(cases) + [False]
@@ -0,0 +1,75 @@
+import sys
+from itertools import product
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import pandas as pd
+
+from rules import PatientInput, reference_predict_state
+from rules_batch import FIELDS, predict_state_batch
+
+# Valores alrededor de cada umbral de rules.py
+AGES = [0, 64, 65, 120]
+SEVERITIES = [round(0.1 * i, 1) for i in range(101)]
+DURATIONS = [0, 2, 3, 7, 8, 30, 31, 60, 61, 90, 91, 180, 181, 3650]
+
+
+def _grid() -> pd.DataFrame:
+    rows = []
+    for age, sev, dur, flags in product(
+        AGES, SEVERITIES, DURATIONS, product([False, True], repeat=7)
+    ):
+        rows.append((age, sev, dur, *flags))
+    return pd.DataFrame(rows, columns=list(FIELDS))
+
+
+## Test de paridad con la referencia:
+# Sobre toda la malla de umbrales (edad, severidad en pasos de 0.1,
+# duración y las 7 banderas), el clasificador por lotes debe devolver
+# exactamente el mismo estado y la misma explicación que la función escalar
+# de referencia (rules.reference_predict_state).
+def test_batch_matches_scalar_on_grid():
+    df = _grid()
+    states, explanations = predict_state_batch(df)
+
+    for i, row in enumerate(df.itertuples(index=False)):
+        expected = reference_predict_state(PatientInput(*row))
+        assert (states[i], explanations[i]) == expected, row
+
+
+## Test de entradas como arreglos de NumPy:
+# Un mapeo {campo: arreglo} debe aceptarse igual que un DataFrame.
+def test_batch_accepts_numpy_columns():
+    data = {name: np.zeros(3, dtype=bool) for name in FIELDS}
+    data["age"] = np.array([30, 70, 10])
+    data["severity"] = np.array([1.0, 9.0, 4.0])
+    data["duration_days"] = np.array([1, 200, 5])
+    data["has_metastasis"] = np.array([False, True, False])
+    data["multiple_organ_failure"] = np.array([False, True, False])
+
+    states, _ = predict_state_batch(data)
+    assert list(states) == ["NO ENFERMO", "ENFERMEDAD TERMINAL", "ENFERMEDAD LEVE"]
+
+
+## Test para entradas inválidas:
+# Por defecto se lanza ValueError con el mismo mensaje que predict_state;
+# con on_invalid="mark" la fila inválida queda sin estado.
+def test_batch_invalid_inputs():
+    df = _grid().head(2).copy()
+    df.loc[1, "severity"] = 11
+
+    try:
+        predict_state_batch(df)
+        assert False, "Se esperaba una excepción ValueError por entradas inválidas."
+    except ValueError as e:
+        assert (
+            str(e)
+            == "Entradas inválidas: age>=0, duration_days>=0, severity en [0,10]."
+        )
+
+    states, explanations = predict_state_batch(df, on_invalid="mark")
+    assert states[0] is not None
+    assert states[1] is None
+    assert explanations[1].startswith("Entradas inválidas")
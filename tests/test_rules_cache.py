@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from rules import PatientInput, PatientKey, predict_state
+from rules_cache import PredictionCache
+
+
+def _patient(age=40, severity=5.0, duration_days=3, **flags):
+    values = dict(
+        has_chronic_disease=False,
+        has_metastasis=False,
+        recent_weight_loss=False,
+        is_bedridden=False,
+        refractory_pain=False,
+        multiple_organ_failure=False,
+        has_recent_imaging=False,
+    )
+    values.update(flags)
+    return PatientInput(age=age, severity=severity, duration_days=duration_days, **values)
+
+
+## Test de PatientKey:
+# Dos entradas equivalentes producen la misma llave hashable.
+def test_patient_key_is_hashable():
+    a = PatientKey.from_input(_patient(severity=5))
+    b = PatientKey.from_input(_patient(severity=5.0))
+    assert a == b and hash(a) == hash(b)
+    assert not hasattr(a, "__dict__")
+    assert predict_state(a) == predict_state(_patient())
+
+
+## Test de la caché LRU:
+# Se cuentan aciertos, fallos y desalojos, y los resultados son los de predict_state.
+def test_cache_counters_and_eviction():
+    cache = PredictionCache(maxsize=2)
+    p1, p2, p3 = _patient(age=1), _patient(age=2), _patient(age=90, severity=1, duration_days=1)
+
+    assert cache.predict(p1) == predict_state(p1)
+    assert cache.predict(p1) == predict_state(p1)
+    cache.predict(p2)
+    cache.predict(p3)  # desaloja p1
+
+    assert cache.stats() == {"hits": 1, "misses": 3, "evictions": 1, "size": 2, "maxsize": 2}
+    cache.predict(p1)
+    assert cache.stats()["misses"] == 4
+
+
+## Test de entradas inválidas con caché:
+# La excepción se propaga y no se guarda nada en la caché.
+def test_cache_does_not_store_invalid_inputs():
+    cache = PredictionCache(maxsize=8)
+    try:
+        cache.predict(_patient(age=-1))
+        assert False, "Se esperaba una excepción ValueError por entradas inválidas."
+    except ValueError:
+        pass
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,45 @@
+import sys
+from itertools import product
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from rules import PatientInput, reference_predict_state
+from rules_table import get_table, predict_state_table
+
+AGES = [0, 64, 65, 120]
+SEVERITIES = [round(0.1 * i, 1) for i in range(101)]
+DURATIONS = [0, 2, 3, 7, 8, 30, 31, 60, 61, 90, 91, 180, 181, 3650]
+
+
+## Test de paridad con la referencia:
+# La tabla compilada debe devolver exactamente el mismo estado y la misma
+# explicación que las reglas escritas directamente en toda la malla.
+def test_table_matches_scalar_on_grid():
+    table = get_table()
+    for age, sev, dur, flags in product(
+        AGES, SEVERITIES, DURATIONS, product([False, True], repeat=7)
+    ):
+        patient = PatientInput(age, sev, dur, *flags)
+        assert table.predict(patient) == reference_predict_state(patient), patient
+
+
+## Test de explicaciones internadas:
+# Celdas con el mismo resultado comparten el mismo objeto de texto.
+def test_table_interns_explanations():
+    assert len(get_table()) == 128 * 6 * 7 * 2
+    a = predict_state_table(PatientInput(30, 7, 1, *[False] * 7))
+    b = predict_state_table(PatientInput(40, 9, 20, *[False] * 7))
+    assert a[1] is b[1]
+
+
+## Test para entradas inválidas:
+def test_table_invalid_inputs():
+    try:
+        predict_state_table(PatientInput(10, 10.5, 1, *[False] * 7))
+        assert False, "Se esperaba una excepción ValueError por entradas inválidas."
+    except ValueError as e:
+        assert (
+            str(e)
+            == "Entradas inválidas: age>=0, duration_days>=0, severity en [0,10]."
+        )
@@ -0,0 +1,134 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import json
+
+import pytest
+
+import ruleset
+import utils.ui_data as ui_data
+from rules import AGUDA, CRONICA, LEVE, NO_ENFERMO, PatientInput, predict_state, reference_predict_state
+from verify_rules import verify
+
+
+def _default() -> dict:
+    return json.loads(ruleset.DEFAULT_RULESET_FILE.read_text(encoding="utf-8"))
+
+
+def _patient(age, severity, duration_days, chronic=False):
+    return PatientInput(
+        age=age,
+        severity=severity,
+        duration_days=duration_days,
+        has_chronic_disease=chronic,
+        has_metastasis=False,
+        recent_weight_loss=False,
+        is_bedridden=False,
+        refractory_pain=False,
+        multiple_organ_failure=False,
+        has_recent_imaging=False,
+    )
+
+
+## Test de validación:
+# Un archivo inválido se rechaza con todos sus problemas a la vez.
+def test_validate_reports_all_problems():
+    data = _default()
+    data["version"] = ""
+    data["thresholds"]["acute_min_severity"] = 11
+    data["thresholds"]["chronic_days"] = 60.5
+    data["thresholds"]["sorpresa"] = 1
+    del data["thresholds"]["mild_max_days"]
+    with pytest.raises(ValueError) as e:
+        ruleset.validate(data)
+    message = str(e.value)
+    for fragment in ("'version'", "acute_min_severity", "chronic_days", "sorpresa", "mild_max_days"):
+        assert fragment in message
+
+    with pytest.raises(ValueError, match="JSON inválido"):
+        ruleset.parse_ruleset("{version: 1")
+
+
+## Test del conjunto por defecto:
+# Las reglas, la tabla compilada y la versión por lotes de
+# rulesets/default.json coinciden con la referencia independiente
+# (rules.reference_predict_state) en todo el dominio.
+def test_default_ruleset_matches_predict_state():
+    rules = ruleset.load_ruleset(ruleset.DEFAULT_RULESET_FILE)
+    assert rules.version == "1"
+    for fn, batch in ((rules.evaluate, False), (rules.predict, False), (rules.predict_batch, True)):
+        report = verify(
+            fn, reference=reference_predict_state, batch=batch, comparisons=rules.comparisons()
+        )
+        assert report["ok"], report["mismatches"]
+
+
+## Test de umbrales modificados:
+# Otros umbrales cambian los resultados (y los textos que los citan); la
+# tabla compilada sigue coincidiendo con las reglas aplicadas directamente.
+def test_modified_thresholds():
+    data = _default()
+    data["version"] = "2"
+    data["thresholds"]["healthy_max_age"] = 70
+    data["thresholds"]["chronic_days"] = 45
+    rules = ruleset.parse_ruleset(json.dumps(data))
+
+    assert predict_state(_patient(67, 1, 1))[0] == LEVE
+    assert rules.predict(_patient(67, 1, 1))[0] == NO_ENFERMO
+    assert predict_state(_patient(40, 7, 50))[0] == AGUDA
+    state, explanation = rules.predict(_patient(40, 7, 50))
+    assert state == CRONICA and ">45 días" in explanation
+
+    comparisons = rules.comparisons()
+    assert verify(rules.predict, reference=rules.evaluate, comparisons=comparisons)["ok"]
+    assert verify(
+        rules.predict_batch, reference=rules.evaluate, batch=True, comparisons=comparisons
+    )["ok"]
+    assert rules.fingerprint != ruleset.load_ruleset(ruleset.DEFAULT_RULESET_FILE).fingerprint
+
+
+## Test de recarga en caliente:
+# Al cambiar el archivo se publica la versión nueva; si el archivo nuevo es
+# inválido se conserva la anterior y el error queda en last_error().
+def test_hot_reload(tmp_path, monkeypatch):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(_default()), encoding="utf-8")
+    monkeypatch.setattr(ruleset, "RULESET_FILE", path)
+    monkeypatch.setattr(ruleset, "RELOAD_SECONDS", 0)
+    monkeypatch.setattr(ruleset, "_active", None)
+    monkeypatch.setattr(ruleset, "_stamp", None)
+    monkeypatch.setattr(ruleset, "_last_error", None)
+
+    first = ruleset.current()
+    assert first.version == "1" and ruleset.current() is first
+
+    data = _default()
+    data["version"] = "2-prueba"
+    data["thresholds"]["healthy_max_age"] = 70
+    path.write_text(json.dumps(data), encoding="utf-8")
+    second = ruleset.current()
+    assert second.version == "2-prueba"
+    assert second.predict(_patient(67, 1, 1))[0] == NO_ENFERMO
+    # Quien ya tenía el conjunto anterior termina con él
+    assert first.predict(_patient(67, 1, 1))[0] == LEVE
+
+    path.write_text('{"version": "3", "thresholds": {}}', encoding="utf-8")
+    assert ruleset.current() is second
+    assert "Faltan umbrales" in ruleset.last_error()
+
+
+## Test de la versión en el log:
+# log_prediction guarda la versión de las reglas que produjo el resultado.
+def test_rule_version_is_logged(tmp_path, monkeypatch):
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    rules = ruleset.current()
+    patient = _patient(40, 7, 3)
+    state, explanation = rules.predict(patient)
+    ui_data.log_prediction(state, explanation, patient, rule_version=rules.version)
+    ui_data.log_prediction(state, explanation, patient)
+
+    with_version, without = ui_data.tail_predictions(2)
+    assert with_version["rule_version"] == rules.version
+    assert "rule_version" not in without
@@ -0,0 +1,93 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import json
+
+import pandas as pd
+
+import ruleset
+import score
+import utils.ui_data as ui_data
+from rules import PatientInput, predict_state
+
+ROWS = [
+    (30, 1.0, 1, False, False, False, False, False, False, False),
+    (80, 9.0, 200, True, True, True, False, False, True, True),
+    (45, 4.5, 5, False, False, False, False, False, False, False),
+    (50, 11.0, 3, False, False, False, False, False, False, False),  # inválida
+    (60, 5.0, 45, True, False, False, False, False, False, False),
+]
+COLUMNS = list(ui_data.INPUT_FIELDS)
+
+
+## Test de clasificación masiva CSV:
+# El archivo se procesa en bloques; cada fila válida debe tener el mismo
+# resultado que predict_state y la inválida debe quedar sin estado.
+def test_score_csv_in_chunks(tmp_path):
+    src = tmp_path / "in.csv"
+    dst = tmp_path / "out.csv"
+    pd.DataFrame(ROWS, columns=COLUMNS).to_csv(src, index=False)
+
+    summary = score.run(src, dst, chunk_size=2)
+
+    out = pd.read_csv(dst)
+    assert summary["rows"] == len(ROWS)
+    assert summary["invalid"] == 1
+    assert len(out) == len(ROWS)
+    for row, (state, explanation) in zip(
+        ROWS, zip(out["state"], out["explanation"])
+    ):
+        if row[1] > 10:
+            assert pd.isna(state)
+            continue
+        assert (state, explanation) == predict_state(PatientInput(*row))
+
+
+## Test de clasificación masiva Parquet con registro en el log:
+# Con --log, las filas válidas se agregan al log con el mismo formato
+# de registro que log_prediction, incluida la versión de las reglas.
+def test_score_parquet_with_log(tmp_path):
+    src = tmp_path / "in.parquet"
+    dst = tmp_path / "out.parquet"
+    log_file = tmp_path / "predictions_log.jsonl"
+    pd.DataFrame(ROWS, columns=COLUMNS).to_parquet(src, index=False)
+
+    assert score.main([str(src), str(dst), "--chunk-size", "2", "--workers", "1",
+                       "--log", "--log-file", str(log_file)]) == 0
+
+    assert len(pd.read_parquet(dst)) == len(ROWS)
+    records = [json.loads(line) for line in log_file.read_text("utf-8").splitlines()]
+    assert len(records) == len(ROWS) - 1
+    assert set(records[0]) == {"timestamp", "state", "explanation", "inputs", "rule_version"}
+    assert records[0]["rule_version"] == ruleset.current().version
+    assert records[0]["inputs"] == dict(zip(COLUMNS, ROWS[0]))
+
+
+## Test de celdas vacías:
+# Una edad vacía deja la fila inválida (no llega al log) y una bandera vacía
+# cuenta como ausente; los bloques con y sin vacíos se escriben con el mismo
+# esquema Parquet.
+def test_score_empty_cells(tmp_path):
+    src = tmp_path / "in.csv"
+    dst = tmp_path / "out.parquet"
+    log_file = tmp_path / "predictions_log.jsonl"
+    lines = [",".join(COLUMNS)] + [",".join(str(v) for v in row) for row in ROWS[:2]]
+    lines += [
+        ",4.0,3,False,False,False,False,False,False,False",
+        "40,4.0,,False,False,False,False,False,False,False",
+        "40,4.0,3,,False,False,False,False,False,False",
+    ]
+    src.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    assert score.main([str(src), str(dst), "--chunk-size", "2", "--workers", "1",
+                       "--log", "--log-file", str(log_file)]) == 0
+
+    out = pd.read_parquet(dst)
+    assert len(out) == 5
+    assert out["state"].isna().tolist() == [False, False, True, True, False]
+    records = [json.loads(line) for line in log_file.read_text("utf-8").splitlines()]
+    assert len(records) == 3
+    assert records[-1]["inputs"]["has_chronic_disease"] is False
+    assert records[-1]["state"] == predict_state(PatientInput(40, 4.0, 3, *[False] * 7))[0]
@@ -0,0 +1,165 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import asyncio
+import json
+
+import service
+import utils.ui_data as ui_data
+from rules import PatientInput, predict_state
+
+PATIENT = {
+    "age": 80,
+    "severity": 9.0,
+    "duration_days": 200,
+    "has_chronic_disease": True,
+    "has_metastasis": True,
+    "recent_weight_loss": True,
+    "is_bedridden": False,
+    "refractory_pain": False,
+    "multiple_organ_failure": True,
+    "has_recent_imaging": True,
+}
+
+
+async def _call(app, method, path, body=None):
+    """Ejecuta una petición contra la app ASGI y devuelve (status, json)."""
+    payload = b"" if body is None else json.dumps(body).encode("utf-8")
+    messages = [{"type": "http.request", "body": payload, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json")],
+        "client": ("test", 0),
+        "server": ("test", 80),
+        "scheme": "http",
+        "app": app,
+    }
+    await app(scope, receive, send)
+    status = next(m["status"] for m in sent if m["type"] == "http.response.start")
+    data = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    return status, json.loads(data)
+
+
+def _run(coro_fn):
+    async def main():
+        async with service.lifespan(service.app):
+            return await coro_fn()
+
+    return asyncio.run(main())
+
+
+## Test del endpoint de un paciente:
+# Devuelve el mismo resultado que predict_state y registra la predicción
+# en el log desde la tarea de fondo.
+def test_predict_endpoint_logs_in_background(tmp_path, monkeypatch):
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+
+    async def scenario():
+        health = await _call(service.app, "GET", "/health")
+        result = await _call(service.app, "POST", "/predict", PATIENT)
+        return health, result
+
+    (h_status, h_body), (status, body) = _run(scenario)
+
+    assert h_status == 200 and h_body["status"] == "ok"
+    assert status == 200
+    expected = predict_state(PatientInput(**PATIENT))
+    assert (body["state"], body["explanation"]) == expected
+
+    # Al cerrar el servicio la cola de log se vacía
+    lines = ui_data.LOG_FILE.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["inputs"] == PATIENT
+
+
+## Test de validación de esquema y del endpoint por lotes:
+# Cada elemento se valida por separado; los inválidos devuelven su error.
+def test_batch_endpoint_validation(tmp_path, monkeypatch):
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+    bad_type = {**PATIENT, "age": "80"}
+    out_of_range = {**PATIENT, "severity": 12}
+
+    async def scenario():
+        single = await _call(service.app, "POST", "/predict", bad_type)
+        batch = await _call(
+            service.app,
+            "POST",
+            "/predict/batch",
+            {"patients": [PATIENT, bad_type, out_of_range]},
+        )
+        return single, batch
+
+    (s_status, s_body), (status, body) = _run(scenario)
+
+    assert s_status == 422 and "age" in s_body["error"]
+    assert status == 200
+    results = body["results"]
+    assert results[0]["state"] == "ENFERMEDAD TERMINAL"
+    assert "age" in results[1]["error"]
+    assert results[2]["error"].startswith("Entradas inválidas")
+    assert len(ui_data.LOG_FILE.read_text(encoding="utf-8").splitlines()) == 1
+
+
+## Test del endpoint de métricas:
+# Expone en formato Prometheus las predicciones servidas y la cola de log.
+def test_metrics_endpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(ui_data, "LOG_FILE", tmp_path / "predictions_log.jsonl")
+
+    class FakeRequest:
+        app = service.app
+
+    async def scenario():
+        await _call(service.app, "POST", "/predict", PATIENT)
+        return await service.metrics_endpoint(FakeRequest())
+
+    response = _run(scenario)
+    text = response.body.decode("utf-8")
+    assert 'medapp_predictions_total{state="ENFERMEDAD TERMINAL"}' in text
+    assert 'medapp_stage_seconds_count{stage="predict_state"}' in text
+    assert "medapp_log_queue_size" in text
+
+
+## Test de falla del backend del log:
+# Un error que no es OSError (p. ej. SQLite bloqueado) descarta el lote y
+# se cuenta, pero la tarea sigue escribiendo y el apagado no se cuelga.
+def test_log_pump_survives_backend_errors(tmp_path, monkeypatch):
+    import sqlite3
+
+    written = []
+
+    def flaky(records):
+        if not written:
+            written.append(None)
+            raise sqlite3.OperationalError("database is locked")
+        written.extend(records)
+
+    monkeypatch.setattr(ui_data, "append_records", flaky)
+
+    async def scenario():
+        pump = service.LogPump()
+        pump.submit([{"i": 0}])
+        await asyncio.sleep(0.05)
+        pump.submit([{"i": 1}, {"i": 2}])
+        await asyncio.wait_for(pump.stop(), 2)
+        return pump
+
+    pump = asyncio.run(scenario())
+    assert pump.dropped == 1
+    assert pump.written == 2
+    assert written[1:] == [{"i": 1}, {"i": 2}]
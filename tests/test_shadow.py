@@ -0,0 +1,195 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import json
+import time
+
+import pytest
+
+import shadow
+from rules import PatientInput, predict_state
+
+# Candidato de prueba: lento, falla con edad 99 y clasifica como agudo
+# toda severidad >= 5 (las reglas usan >= 6)
+CANDIDATE_SOURCE = '''
+import time
+
+import pytest
+
+from rules import AGUDA, predict_state
+
+
+def predict_state(inp, _reference=predict_state):
+    time.sleep(0.002)
+    if inp.age == 99:
+        raise RuntimeError("modelo sin datos para esta edad")
+    if inp.severity >= 5 and inp.duration_days <= 7:
+        return AGUDA
+    return _reference(inp)
+'''
+
+
+def _patient(age, severity, duration_days):
+    return PatientInput(age, severity, duration_days, False, False, False, False, False, False, False)
+
+
+def _records(log_file: Path) -> list[dict]:
+    return [json.loads(line) for line in log_file.read_text("utf-8").splitlines()]
+
+
+## Test del evaluador en sombra:
+# submit() vuelve sin esperar al candidato; el hilo de fondo registra el
+# resultado de las reglas junto al del candidato, su latencia y sus errores.
+def test_evaluator_logs_candidate_next_to_rules(tmp_path):
+    candidate = tmp_path / "candidato.py"
+    candidate.write_text(CANDIDATE_SOURCE, encoding="utf-8")
+    log_file = tmp_path / "shadow.jsonl"
+    evaluator = shadow.ShadowEvaluator(str(candidate), log_file, maxsize=100)
+
+    patients = [_patient(30, 1.0, 1), _patient(40, 5.0, 3), _patient(99, 1.0, 1)] * 10
+    records = [
+        shadow.build_shadow_record(vars(patient), predict_state(patient)[0], "1", 0.00001)
+        for patient in patients
+    ]
+    started = time.perf_counter()
+    for record in records:
+        assert evaluator.submit(record)
+    # El candidato tarda 2 ms por paciente; encolar 30 no lo espera
+    assert time.perf_counter() - started < 0.05
+    evaluator.close()
+
+    records = _records(log_file)
+    assert len(records) == len(patients)
+    by_age = {rec["inputs"]["age"]: rec for rec in records}
+    assert by_age[30]["candidate"]["state"] == by_age[30]["rule"]["state"] == "NO ENFERMO"
+    assert by_age[40]["rule"] == {"state": "ENFERMEDAD LEVE", "version": "1", "seconds": 0.00001}
+    assert by_age[40]["candidate"]["state"] == "ENFERMEDAD AGUDA"
+    assert by_age[40]["candidate"]["seconds"] >= 0.002
+    assert "sin datos" in by_age[99]["candidate"]["error"]
+    assert evaluator.stats()["evaluated"] == 30 and evaluator.stats()["errors"] == 10
+
+
+## Test de cola llena:
+# Con la cola llena la muestra se descarta y se cuenta; nunca bloquea.
+def test_full_queue_drops(tmp_path):
+    candidate = tmp_path / "candidato.py"
+    candidate.write_text(CANDIDATE_SOURCE.replace("0.002", "0.05"), encoding="utf-8")
+    evaluator = shadow.ShadowEvaluator(str(candidate), tmp_path / "shadow.jsonl", maxsize=2)
+    record = shadow.build_shadow_record(vars(_patient(30, 1.0, 1)), "NO ENFERMO")
+    accepted = sum(evaluator.submit(dict(record)) for _ in range(20))
+    evaluator.close()
+    stats = evaluator.stats()
+    assert accepted < 20
+    assert stats["dropped"] == 20 - accepted
+    assert stats["evaluated"] == accepted
+
+
+def _shadow_line(day: str, severity: float, rule: str, candidate: str, name="modelo:v1") -> dict:
+    return {
+        "timestamp": f"{day}T12:00:00",
+        "inputs": {"age": 40, "severity": severity, "duration_days": 3},
+        "rule": {"state": rule, "version": "1", "seconds": 0.00002},
+        "candidate": {"name": name, "state": candidate, "seconds": 0.003},
+    }
+
+
+def _append(log_file: Path, records) -> None:
+    with log_file.open("a", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+
+## Test del reporte de acuerdo y deriva:
+# Se arma leyendo solo lo nuevo del log; un día con otra distribución de
+# severidad se marca como deriva y el acuerdo se calcula por día.
+def test_report_is_incremental_and_flags_drift(tmp_path, monkeypatch):
+    monkeypatch.setattr(shadow, "REFERENCE_SIZE", 100)
+    log_file = tmp_path / "shadow.jsonl"
+    leve, aguda = "ENFERMEDAD LEVE", "ENFERMEDAD AGUDA"
+
+    _append(log_file, [_shadow_line("2024-03-01", 4.0, leve, leve) for _ in range(100)])
+    first = shadow.refresh(log_file)
+    assert first["total"] == 100 and first["agreement"] == 1.0
+    assert first["days"][0]["drift"] == []
+
+    _append(
+        log_file,
+        [_shadow_line("2024-03-02", 4.0, leve, leve) for _ in range(20)]
+        + [_shadow_line("2024-03-02", 7.0, aguda, leve) for _ in range(80)],
+    )
+    summary = shadow.refresh(log_file)
+    assert summary["total"] == 200
+    assert summary["agreement"] == 120 / 200
+    assert summary["confusion"] == {leve: {leve: 120}, aguda: {leve: 80}}
+    day = summary["days"][1]
+    assert day["agreement"] == 0.2
+    assert {"severity", "rule_state"} <= set(day["drift"])
+    assert "candidate_state" not in day["drift"]
+    assert summary["latency"]["rule"]["p50"] == 0.0001
+    assert summary["latency"]["candidate"]["p99"] == 0.005
+
+    # Sin líneas nuevas no cambia; con reset se recalcula igual
+    assert shadow.refresh(log_file) == summary
+    assert shadow.refresh(log_file, reset=True) == summary
+
+    # Otro candidato empieza un reporte nuevo
+    _append(log_file, [_shadow_line("2024-03-03", 4.0, leve, leve, name="modelo:v2")])
+    assert shadow.refresh(log_file)["candidate"] == "modelo:v2"
+    assert shadow.refresh(log_file)["total"] == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        [log_file.name, shadow.report_file(log_file).name]
+    )
+    assert shadow.format_ms(summary["latency"]["candidate"]["p99"]) == "≤ 5 ms"
+
+
+## Test de submit sin candidato:
+# Sin SHADOW_CANDIDATE no se crea evaluador ni se escribe nada.
+def test_submit_disabled(tmp_path, monkeypatch):
+    monkeypatch.setattr(shadow, "CANDIDATE", "")
+    monkeypatch.setattr(shadow, "SHADOW_LOG_FILE", tmp_path / "shadow.jsonl")
+    assert shadow.submit(_patient(30, 1.0, 1), "NO ENFERMO") is False
+    assert shadow.get_evaluator() is None
+    assert not (tmp_path / "shadow.jsonl").exists()
+
+
+## Test del candidato en otro proceso:
+# Con mode="process" los resultados y los errores del candidato son los
+# mismos que en el hilo de fondo.
+def test_evaluator_process_mode(tmp_path):
+    candidate = tmp_path / "candidato.py"
+    candidate.write_text(CANDIDATE_SOURCE, encoding="utf-8")
+    log_file = tmp_path / "shadow.jsonl"
+    evaluator = shadow.ShadowEvaluator(str(candidate), log_file, mode="process")
+    for patient in (_patient(40, 5.0, 3), _patient(99, 1.0, 1)):
+        state, _ = predict_state(patient)
+        assert evaluator.submit(shadow.build_shadow_record(vars(patient), state, "1"))
+    evaluator.close()
+
+    by_age = {rec["inputs"]["age"]: rec for rec in _records(log_file)}
+    assert by_age[40]["candidate"]["state"] == "ENFERMEDAD AGUDA"
+    assert "sin datos" in by_age[99]["candidate"]["error"]
+    assert evaluator.stats()["mode"] == "process"
+    assert evaluator.stats()["evaluated"] == 2 and evaluator.stats()["errors"] == 1
+
+    with pytest.raises(ValueError, match="inválido"):
+        shadow.ShadowEvaluator(str(candidate), log_file, mode="fibra")
+
+
+## Test del reporte en caché:
+# La página de operaciones solo relee el log en sombra cuando cambia.
+def test_cached_shadow_report(tmp_path, monkeypatch):
+    import utils.report_cache as report_cache
+
+    log_file = tmp_path / "shadow.jsonl"
+    monkeypatch.setattr(shadow, "SHADOW_LOG_FILE", log_file)
+    monkeypatch.setattr(report_cache, "default_cache", report_cache.ReportCache(2**20))
+    assert report_cache.cached_shadow_report() is None
+
+    leve = "ENFERMEDAD LEVE"
+    _append(log_file, [_shadow_line("2024-03-01", 4.0, leve, leve)])
+    first = report_cache.cached_shadow_report()
+    assert report_cache.cached_shadow_report() is first and first["total"] == 1
+    _append(log_file, [_shadow_line("2024-03-01", 4.0, leve, leve)])
+    assert report_cache.cached_shadow_report()["total"] == 2
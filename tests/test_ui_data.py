@@ -54,3 +54,130 @@ def test_log_prediction(tmp_path):
         assert record["state"] == state
         assert record["explanation"] == explanation
         assert record["inputs"]["age"] == patient.age
+
+
+def _write_lines(path, records, extra=""):
+    with path.open("a", encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        f.write(extra)
+
+
+def _record(i, state="ENFERMEDAD LEVE"):
+    return {
+        "timestamp": f"2024-01-01T00:00:{i:02d}",
+        "state": state,
+        "explanation": "x",
+        "inputs": {"age": i},
+    }
+
+
+## Test de estadísticas incrementales:
+# load_stats debe guardar un punto de control y, en la siguiente llamada,
+# incorporar solo las líneas agregadas, ignorando las corruptas.
+def test_load_stats_incremental(tmp_path):
+    ui_data.LOG_FILE = tmp_path / "predictions_log.jsonl"
+    _write_lines(ui_data.LOG_FILE, [_record(i) for i in range(4)], extra="{corrupta\n")
+
+    stats = ui_data.load_stats()
+    assert stats["total_by_state"] == {"ENFERMEDAD LEVE": 4}
+    assert ui_data.stats_checkpoint_file().exists()
+
+    _write_lines(ui_data.LOG_FILE, [_record(i, "NO ENFERMO") for i in range(4, 7)])
+    stats = ui_data.load_stats()
+    assert stats["total_by_state"] == {"ENFERMEDAD LEVE": 4, "NO ENFERMO": 3}
+    assert [r["inputs"]["age"] for r in stats["last_five"]] == [2, 3, 4, 5, 6]
+    assert stats["last_timestamp"] == "2024-01-01T00:00:06"
+
+
+## Test de checkpoint desde varios hilos:
+# Las sesiones de la app escriben el checkpoint a la vez desde el mismo
+# proceso; cada escritura usa su propio temporal y no queda ninguno.
+def test_checkpoint_written_from_threads(tmp_path):
+    import threading
+
+    ui_data.LOG_FILE = tmp_path / "predictions_log.jsonl"
+    _write_lines(ui_data.LOG_FILE, [_record(i) for i in range(4)])
+    errors = []
+
+    def write(n):
+        try:
+            for _ in range(50):
+                ui_data._write_checkpoint({**ui_data._empty_checkpoint(), "last_timestamp": str(n)})
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert ui_data._read_checkpoint()["last_timestamp"] in ("0", "1", "2", "3")
+    assert not list(tmp_path.glob("*.tmp"))
+    assert ui_data.load_stats()["total_by_state"] == {"ENFERMEDAD LEVE": 4}
+
+
+## Test de log truncado o rotado:
+# Si el log se reemplaza por uno más corto, las estadísticas se reconstruyen.
+def test_load_stats_rebuilds_after_rotation(tmp_path):
+    ui_data.LOG_FILE = tmp_path / "predictions_log.jsonl"
+    _write_lines(ui_data.LOG_FILE, [_record(i) for i in range(5)])
+    ui_data.load_stats()
+
+    ui_data.LOG_FILE.unlink()
+    _write_lines(ui_data.LOG_FILE, [_record(9, "ENFERMEDAD AGUDA")])
+    stats = ui_data.load_stats()
+    assert stats["total_by_state"] == {"ENFERMEDAD AGUDA": 1}
+    assert len(stats["last_five"]) == 1
+
+
+## Test de lectura desde el final del log:
+# tail_predictions debe devolver los últimos N registros completos aunque
+# los bloques corten caracteres UTF-8 multibyte y la última línea esté
+# incompleta.
+def test_tail_predictions(tmp_path):
+    ui_data.LOG_FILE = tmp_path / "predictions_log.jsonl"
+    records = [_record(i, "ENFERMEDAD CRÓNICA ñáé€") for i in range(20)]
+    _write_lines(ui_data.LOG_FILE, records, extra='{"timestamp": "2024-01-0')
+
+    for block_size in (1, 3, 7, 64, 1 << 16):
+        tail = ui_data.tail_predictions(5, block_size=block_size)
+        assert tail == records[-5:]
+
+    assert ui_data.tail_predictions(50, block_size=5) == records
+    assert ui_data.tail_predictions(0) == []
+
+
+## Test de log asíncrono:
+# Con LOG_ASYNC la predicción pasa por la cola y llega al log al cerrar;
+# el derrame que dejó un proceso terminado también se escribe.
+def test_log_prediction_async(tmp_path, monkeypatch):
+    ui_data.LOG_FILE = tmp_path / "predictions_log.jsonl"
+    monkeypatch.setattr(ui_data, "LOG_ASYNC", True)
+    # pid 999999999 no existe: su derrame se adopta
+    orphan = tmp_path / "predictions_log.jsonl.999999999.spill"
+    _write_lines(orphan, [_record(0, "NO ENFERMO")])
+
+    patient = PatientInput(
+        age=40,
+        severity=3,
+        duration_days=2,
+        has_chronic_disease=False,
+        has_metastasis=False,
+        recent_weight_loss=False,
+        is_bedridden=False,
+        refractory_pain=False,
+        multiple_organ_failure=False,
+        has_recent_imaging=False,
+    )
+    state, explanation = predict_state(patient)
+    ui_data.log_prediction(state, explanation, patient)
+    writer = ui_data.get_async_writer()
+    writer.close()
+
+    with ui_data.LOG_FILE.open("r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert sorted(r["state"] for r in records) == sorted(["NO ENFERMO", state])
+    assert not orphan.exists()
+    assert list(tmp_path.glob("*.spill*")) == []
@@ -0,0 +1,90 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from rules import AGUDA, LEVE, predict_state
+from verify_rules import DOMAIN, engines, partition, rule_thresholds, verify
+
+
+## Test de partición en clases de equivalencia:
+# Los tramos se cortan exactamente en los umbrales del conjunto de reglas.
+def test_partition_at_rule_thresholds():
+    thresholds = rule_thresholds(predict_state)
+    assert partition(DOMAIN["age"], thresholds["age"]) == [(0, 64), (65, 120)]
+    assert partition(DOMAIN["duration_days"], thresholds["duration_days"]) == [
+        (0, 2), (3, 7), (8, 30), (31, 60), (61, 90), (91, 180), (181, 3650)
+    ]
+    assert [lo for lo, _ in partition(DOMAIN["severity"], thresholds["severity"])] == [
+        0.0, 2.1, 3.0, 5.1, 6.0, 8.0
+    ]
+
+
+## Test de motores del repositorio:
+# predict_state, la tabla compilada, la versión por lotes y la caché
+# coinciden con la referencia independiente en todo el dominio, incluido el
+# rechazo de NaN e infinito.
+def test_repository_engines_match():
+    for name, (fn, batch) in engines().items():
+        report = verify(fn, batch=batch)
+        assert report["ok"], (name, report["mismatches"], report["inhomogeneous"])
+        assert report["classes"] == 128 * 2 * 6 * 7
+
+
+def _off_by_one(inp):
+    # Error típico: umbral de cuadro agudo en > 5.5 en vez de >= 6
+    result = predict_state(inp)
+    if inp.severity > 5.5 and result[0] == LEVE:
+        return AGUDA, "Alta severidad con duración corta-media sugiere cuadro agudo."
+    return result
+
+
+## Test de región en desacuerdo:
+# El umbral del candidato también parte el dominio, y la región reportada
+# es exactamente la que difiere.
+def test_reports_disagreeing_region():
+    report = verify(_off_by_one, limit=1000)
+    assert not report["ok"]
+    assert report["mismatch_count"] > 0
+    assert {m["severity"] for m in report["mismatches"]} == {(5.6, 5.9)}
+
+
+def _unseen_threshold(inp):
+    # Umbral que no aparece como constante: la partición no lo ve
+    limit = 40
+    if inp.age > limit:
+        return "X", "x"
+    return "Y", "y"
+
+
+## Test de clase no homogénea:
+# Si la referencia cambia dentro de una clase, la verificación no prueba
+# nada y lo reporta.
+def test_reports_inhomogeneous_reference():
+    report = verify(_unseen_threshold, reference=_unseen_threshold)
+    assert not report["ok"]
+    assert report["mismatch_count"] == 0
+    assert report["inhomogeneous"]
+
+
+## Test de referencia independiente:
+# La referencia no sigue el conjunto de reglas activo: si sus umbrales
+# cambian, la verificación de los motores reporta la diferencia.
+def test_reference_is_independent_of_ruleset(monkeypatch):
+    import json
+    import time
+
+    import ruleset
+
+    data = json.loads(ruleset.DEFAULT_RULESET_FILE.read_text(encoding="utf-8"))
+    data["version"] = "2-prueba"
+    data["thresholds"]["chronic_days"] = 45
+    monkeypatch.setattr(ruleset, "_active", ruleset.parse_ruleset(json.dumps(data)))
+    monkeypatch.setattr(ruleset, "_checked", time.monotonic())
+    monkeypatch.setattr(ruleset, "RELOAD_SECONDS", 3600)
+
+    report = verify(predict_state, limit=1000)
+    assert not report["ok"]
+    # 46–60 días cambia de estado; desde 61, el texto cita ">45 días"
+    spans = {m["duration_days"] for m in report["mismatches"]}
+    assert (46, 60) in spans and min(lo for lo, _ in spans) == 46
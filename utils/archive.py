@@ -0,0 +1,279 @@
+# utils/archive.py
+"""
+Archivo columnar (Parquet) del historial de predicciones.
+
+compact_log() pasa el log JSONL a archivos Parquet particionados por fecha
+(ARCHIVE_DIR/date=AAAA-MM-DD/part-NNNNNNNNNNNN.parquet) con columnas tipadas: edad y
+duración como uint32, severidad como float32, banderas booleanas y estado,
+explicación y versión de las reglas como categorías (diccionario). El job es incremental: guarda el
+byte del log ya compactado y en cada corrida solo procesa lo agregado. El
+log JSONL no se modifica. Cada lote recibe un número de parte correlativo
+guardado en el estado, de modo que una parte nunca reemplaza a otra (ni
+siquiera si tras una rotación el log nuevo reutiliza el inode). Los registros que no caben en el esquema
+(timestamp ilegible, edad o duración fuera de uint32, tipos incorrectos) se
+descartan y se cuentan en ARCHIVE_SKIPPED y en el estado de la compactación.
+
+La lectura con proyección de columnas y poda de particiones está en
+utils.ui_data.read_archive.
+
+Uso:
+    python -m utils.archive
+"""
+import json
+import math
+import os
+import re
+import tempfile
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import utils.ui_data as ui_data
+from utils import metrics
+
+# Registros por archivo Parquet escrito en cada corrida
+COMPACT_BATCH_SIZE = 100_000
+# Estado de la compactación dentro de la carpeta del archivo
+STATE_FILE_NAME = "_compaction.json"
+
+SCHEMA = pa.schema(
+    [
+        ("timestamp", pa.timestamp("us")),
+        ("state", pa.dictionary(pa.int8(), pa.string())),
+        ("explanation", pa.dictionary(pa.int16(), pa.string())),
+        # Nula en los registros anteriores a los conjuntos de reglas versionados
+        ("rule_version", pa.dictionary(pa.int16(), pa.string())),
+        ("age", pa.uint32()),
+        ("severity", pa.float32()),
+        ("duration_days", pa.uint32()),
+    ]
+    + [(name, pa.bool_()) for name in ui_data.INPUT_FIELDS[3:]]
+)
+UINT32_MAX = 2**32 - 1
+# Formatos de timestamp que Arrow convierte a timestamp("us")
+# Nombre de las partes: número correlativo del lote (state["next_part"])
+_PART = re.compile(r"part-(\d{12})\.parquet")
+_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?)?")
+
+ARCHIVE_SKIPPED = metrics.register(
+    metrics.Counter(
+        "medapp_archive_skipped_records_total",
+        "Registros del log que no caben en el esquema del archivo Parquet.",
+    )
+)
+
+
+def _read_state(archive_dir: Path) -> dict:
+    try:
+        with (archive_dir / STATE_FILE_NAME).open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"offset": 0, "inode": None, "signature": "", "files": 0, "skipped": 0}
+
+
+def _write_state(archive_dir: Path, state: dict) -> None:
+    path = archive_dir / STATE_FILE_NAME
+    fd, tmp = tempfile.mkstemp(dir=archive_dir, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _parts(archive_dir: Path):
+    """(número, ruta) de cada parte con nombre correlativo del archivo."""
+    for path in archive_dir.glob("date=*/part-*.parquet"):
+        match = _PART.fullmatch(path.name)
+        if match:
+            yield int(match.group(1)), path
+
+
+def _discard_unrecorded_parts(archive_dir: Path, next_part: int) -> None:
+    """
+    Borra las partes que una corrida interrumpida escribió sin llegar a
+    guardarlas en el estado; su lote se vuelve a compactar.
+    """
+    for n, path in _parts(archive_dir):
+        if n >= next_part:
+            path.unlink(missing_ok=True)
+
+
+def _resume_offset(f, state: dict) -> int:
+    """Byte desde el cual seguir; 0 si el log fue truncado o reemplazado."""
+    st = os.fstat(f.fileno())
+    if (
+        state["inode"] != st.st_ino
+        or st.st_size < state["offset"]
+        or not ui_data._log_signature(f).startswith(state["signature"])
+    ):
+        return 0
+    return state["offset"]
+
+
+def _iter_new_lines(f, offset: int):
+    """(offset_final, registro) de cada línea completa desde offset; ignora las corruptas."""
+    f.seek(offset)
+    for raw in f:
+        if not raw.endswith(b"\n"):
+            # Línea en escritura: se compacta en la próxima corrida
+            return
+        offset += len(raw)
+        rec = ui_data._parse_line(raw)
+        if rec is not None and rec.get("timestamp"):
+            yield offset, rec
+
+
+def fits_schema(rec: dict) -> bool:
+    """Si el registro se puede convertir al esquema del archivo sin error."""
+    ts = rec.get("timestamp")
+    if not isinstance(ts, str) or not _TIMESTAMP.fullmatch(ts):
+        return False
+    try:
+        datetime.fromisoformat(ts)
+    except ValueError:
+        return False
+    inputs = rec.get("inputs") or {}
+    if not isinstance(inputs, dict):
+        return False
+    for name in ("state", "explanation", "rule_version"):
+        if not isinstance(rec.get(name), (str, type(None))):
+            return False
+    for name in ("age", "duration_days"):
+        value = inputs.get(name)
+        if value is not None and (
+            type(value) is not int or not 0 <= value <= UINT32_MAX
+        ):
+            return False
+    severity = inputs.get("severity")
+    if severity is not None and (
+        type(severity) not in (int, float) or not math.isfinite(severity)
+    ):
+        return False
+    return all(
+        isinstance(inputs.get(name), (bool, type(None))) for name in ui_data.INPUT_FIELDS[3:]
+    )
+
+
+def to_table(records) -> pa.Table:
+    """
+    Registros del log como tabla Arrow con el esquema del archivo más la
+    columna date. Los que no caben en el esquema (ver fits_schema) se
+    descartan y se cuentan en ARCHIVE_SKIPPED.
+    """
+    columns = {name: [] for name in SCHEMA.names}
+    skipped = 0
+    for rec in records:
+        if not fits_schema(rec):
+            skipped += 1
+            continue
+        inputs = rec.get("inputs") or {}
+        columns["timestamp"].append(rec["timestamp"])
+        columns["state"].append(rec.get("state"))
+        columns["explanation"].append(rec.get("explanation"))
+        columns["rule_version"].append(rec.get("rule_version"))
+        for name in ui_data.INPUT_FIELDS:
+            columns[name].append(inputs.get(name))
+
+    arrays = [pa.array(columns["timestamp"], pa.string()).cast(pa.timestamp("us"))] + [
+        pa.array(columns[name], pa.string()).dictionary_encode().cast(SCHEMA.field(name).type)
+        for name in ("state", "explanation", "rule_version")
+    ] + [pa.array(columns[name], SCHEMA.field(name).type) for name in ui_data.INPUT_FIELDS]
+    table = pa.Table.from_arrays(arrays, schema=SCHEMA)
+    if skipped:
+        ARCHIVE_SKIPPED.inc(skipped)
+    dates = pa.array([ts[:10] for ts in columns["timestamp"]], pa.string())
+    return table.append_column("date", dates)
+
+
+def _write_partitions(archive_dir: Path, table: pa.Table, part: str) -> int:
+    """Escribe un archivo por fecha presente en la tabla; devuelve cuántos escribió."""
+    import pyarrow.compute as pc
+
+    written = 0
+    for date in pc.unique(table["date"]).to_pylist():
+        subset = table.filter(pc.equal(table["date"], date)).drop_columns(["date"])
+        folder = archive_dir / f"date={date}"
+        folder.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder, prefix=f".{part}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pq.write_table(subset, f)
+            # link en vez de replace: falla si la parte ya existe, nunca la pisa
+            os.link(tmp, folder / f"{part}.parquet")
+        finally:
+            os.unlink(tmp)
+        written += 1
+    return written
+
+
+def compact_log(
+    log_file: Path | None = None,
+    archive_dir: Path | None = None,
+    batch_size: int = COMPACT_BATCH_SIZE,
+) -> int:
+    """
+    Compacta lo agregado al log desde la última corrida. Si el log fue
+    truncado o reemplazado, se compacta el archivo nuevo desde el inicio.
+    Devuelve el número de registros compactados (sin los descartados, que
+    se acumulan en "skipped" del estado).
+    """
+    log_file = Path(log_file or ui_data.LOG_FILE)
+    archive_dir = Path(archive_dir or ui_data.ARCHIVE_DIR)
+    if not log_file.exists():
+        return 0
+
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    state = _read_state(archive_dir)
+    if "next_part" not in state:
+        # Estado nuevo, perdido o de una versión anterior: seguir tras la parte
+        # más alta y registrarlo antes de escribir, para reconocer las huérfanas
+        state["next_part"] = max((n + 1 for n, _ in _parts(archive_dir)), default=0)
+        _write_state(archive_dir, state)
+    _discard_unrecorded_parts(archive_dir, state["next_part"])
+    compacted = 0
+
+    with log_file.open("rb") as f:
+        st = os.fstat(f.fileno())
+        signature = ui_data._log_signature(f)
+        if _resume_offset(f, state) == 0:
+            state.update(offset=0, inode=st.st_ino, signature="")
+
+        lines = _iter_new_lines(f, state["offset"])
+        while batch := list(islice(lines, batch_size)):
+            part = f"part-{state['next_part']:012d}"
+            table = to_table(rec for _, rec in batch)
+            state["files"] += _write_partitions(archive_dir, table, part)
+            state["next_part"] += 1
+            state["skipped"] = state.get("skipped", 0) + len(batch) - table.num_rows
+            compacted += table.num_rows
+            state["offset"] = batch[-1][0]
+            state["signature"] = signature[
+                : 2 * min(state["offset"], ui_data.STATS_SIGNATURE_BYTES)
+            ]
+            # Guardar tras cada lote: una corrida interrumpida no duplica datos
+            _write_state(archive_dir, state)
+
+    return compacted
+
+
+def pending_table(log_file: Path | None = None, archive_dir: Path | None = None) -> pa.Table:
+    """Registros del log que aún no se han compactado, como tabla Arrow."""
+    log_file = Path(log_file or ui_data.LOG_FILE)
+    archive_dir = Path(archive_dir or ui_data.ARCHIVE_DIR)
+    if not log_file.exists():
+        return to_table([])
+
+    state = _read_state(archive_dir)
+    with log_file.open("rb") as f:
+        offset = _resume_offset(f, state)
+        return to_table(rec for _, rec in _iter_new_lines(f, offset))
+
+
+if __name__ == "__main__":
+    print(f"{compact_log()} registros compactados en {ui_data.ARCHIVE_DIR}.")
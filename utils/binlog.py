@@ -0,0 +1,348 @@
+# utils/binlog.py
+"""
+Formato binario de ancho fijo para el log de predicciones.
+
+Cada registro JSONL ocupa ~500 bytes: repite los nombres de los campos, el
+estado y la explicación completos. Aquí cada registro ocupa RECORD_DTYPE
+(17 bytes):
+
+- timestamp: int64, microsegundos desde 1970-01-01 (UTC, como el log).
+- age, duration_days: uint16.
+- severity: uint8 cuantizado a pasos de 1/SEVERITY_SCALE (0.05); el paso de
+  0.1 del formulario se conserva exacto.
+- flags: uint8 con las siete banderas, un bit cada una, en el orden de
+  rules_table.FLAG_FIELDS (el mismo índice de la tabla de decisión).
+- state (uint8) y explanation (uint16): códigos del vocabulario.
+
+El archivo es un encabezado de HEADER_SIZE bytes seguido de los registros,
+así que se puede mapear en memoria (open_records) y agregar con NumPy sin
+parsear nada. El vocabulario (estados y explicaciones, en orden de
+aparición) va en un archivo aparte, <log>.vocab.json; los escritores lo
+amplían antes de agregar registros que usen códigos nuevos, así que un
+lector que lee el vocabulario después de mapear siempre tiene todos los
+códigos que ve.
+
+La conversión desde JSONL escribe un archivo temporal y lo renombra sobre
+el destino, así que una corrida fallida no deja un binario sin encabezado.
+Los registros que no caben en el formato (timestamp ilegible, edad o
+duración fuera de uint16, tipos incorrectos) se descartan y se cuentan en
+BINLOG_SKIPPED.
+
+Conversión desde y hacia JSONL:
+    python -m utils.binlog to-binary predictions_log.jsonl predictions_log.bin
+    python -m utils.binlog to-jsonl predictions_log.bin predictions_log.jsonl
+"""
+import argparse
+import json
+import math
+import os
+import struct
+import tempfile
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+
+import utils.ui_data as ui_data
+from rules_table import FLAG_FIELDS
+from utils import metrics
+from utils.log_writer import encode_record, locked_log
+
+MAGIC = b"MEDPLOG\x00"
+FORMAT_VERSION = 1
+# Encabezado: magia, versión, tamaño del registro y relleno hasta 16 bytes
+_HEADER = struct.Struct("<8sHH4x")
+HEADER_SIZE = _HEADER.size
+SEVERITY_SCALE = 20
+CONVERT_CHUNK_SIZE = 100_000
+
+RECORD_DTYPE = np.dtype(
+    [
+        ("timestamp", "<i8"),
+        ("age", "<u2"),
+        ("duration_days", "<u2"),
+        ("severity", "u1"),
+        ("flags", "u1"),
+        ("state", "u1"),
+        ("explanation", "<u2"),
+    ]
+)
+
+_LIMITS = {
+    "age": np.iinfo(np.uint16).max,
+    "duration_days": np.iinfo(np.uint16).max,
+    "state": np.iinfo(np.uint8).max + 1,
+    "explanation": np.iinfo(np.uint16).max + 1,
+}
+
+BINLOG_SKIPPED = metrics.register(
+    metrics.Counter(
+        "medapp_binlog_skipped_records_total",
+        "Registros del log JSONL que no caben en el formato binario.",
+    )
+)
+
+
+def vocab_file(path: Path) -> Path:
+    return Path(path).with_name(Path(path).name + ".vocab.json")
+
+
+def read_vocab(path: Path) -> dict:
+    """Vocabulario del log binario: {"states": [...], "explanations": [...]}."""
+    try:
+        with vocab_file(path).open("r", encoding="utf-8") as f:
+            vocab = json.load(f)
+    except FileNotFoundError:
+        return {"states": [], "explanations": []}
+    return {"states": vocab["states"], "explanations": vocab["explanations"]}
+
+
+def _mkstemp(target: Path):
+    """Archivo temporal único junto a target: (fd, ruta)."""
+    fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".tmp")
+    return fd, Path(tmp)
+
+
+def _write_vocab(path: Path, vocab: dict) -> None:
+    target = vocab_file(path)
+    fd, tmp = _mkstemp(target)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": FORMAT_VERSION, **vocab}, f, ensure_ascii=False)
+        os.replace(tmp, target)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _codes(values, table: list, limit: int, what: str) -> np.ndarray:
+    """Códigos de values en table, agregando al final los valores nuevos."""
+    index = {value: code for code, value in enumerate(table)}
+    out = np.empty(len(values), dtype=np.int64)
+    for i, value in enumerate(values):
+        code = index.get(value)
+        if code is None:
+            if len(table) >= limit:
+                raise ValueError(f"Demasiados valores distintos de {what} para el formato binario.")
+            code = index[value] = len(table)
+            table.append(value)
+        out[i] = code
+    return out
+
+
+def fits_format(rec: dict) -> bool:
+    """Si el registro se puede codificar en RECORD_DTYPE sin error."""
+    ts = rec.get("timestamp")
+    if not isinstance(ts, str):
+        return False
+    try:
+        np.datetime64(ts, "us")
+    except ValueError:
+        return False
+    for name in ("state", "explanation"):
+        if not isinstance(rec.get(name), (str, type(None))):
+            return False
+    inputs = rec.get("inputs") or {}
+    if not isinstance(inputs, dict):
+        return False
+    for name in ("age", "duration_days"):
+        value = inputs.get(name, 0)
+        if type(value) is not int or not 0 <= value <= _LIMITS[name]:
+            return False
+    severity = inputs.get("severity", 0)
+    return type(severity) in (int, float) and math.isfinite(severity)
+
+
+def encode_records(records, vocab: dict) -> np.ndarray:
+    """
+    Registros del log (como los arma ui_data.build_record) en un arreglo
+    RECORD_DTYPE. Amplía vocab con los estados y explicaciones nuevos.
+    """
+    records = list(records)
+    inputs = [rec.get("inputs") or {} for rec in records]
+    out = np.zeros(len(records), dtype=RECORD_DTYPE)
+
+    out["timestamp"] = (
+        np.array([rec["timestamp"] for rec in records], dtype="datetime64[us]")
+        .astype(np.int64)
+    )
+    for name in ("age", "duration_days"):
+        values = np.array([inp.get(name, 0) for inp in inputs], dtype=np.int64)
+        if len(values) and (values.min() < 0 or values.max() > _LIMITS[name]):
+            raise ValueError(f"{name} fuera del rango del formato binario (0–{_LIMITS[name]}).")
+        out[name] = values
+    severity = np.array([inp.get("severity", 0) for inp in inputs], dtype=np.float64)
+    out["severity"] = np.clip(np.rint(severity * SEVERITY_SCALE), 0, 10 * SEVERITY_SCALE)
+    flags = np.zeros(len(records), dtype=np.uint8)
+    for bit, name in enumerate(FLAG_FIELDS):
+        flags |= np.array([bool(inp.get(name)) for inp in inputs], dtype=np.uint8) << bit
+    out["flags"] = flags
+    out["state"] = _codes(
+        [rec.get("state") for rec in records], vocab["states"], _LIMITS["state"], "estado"
+    )
+    out["explanation"] = _codes(
+        [rec.get("explanation") for rec in records],
+        vocab["explanations"],
+        _LIMITS["explanation"],
+        "explicación",
+    )
+    return out
+
+
+def decode_records(array: np.ndarray, vocab: dict):
+    """Registros del log (dicts de build_record) a partir de un arreglo RECORD_DTYPE."""
+    timestamps = array["timestamp"].astype("datetime64[us]").astype(datetime)
+    severity = array["severity"] / SEVERITY_SCALE
+    states = vocab["states"]
+    explanations = vocab["explanations"]
+    for i, row in enumerate(array.tolist()):
+        _, age, duration, _, flags, state, explanation = row
+        inputs = {"age": age, "severity": float(severity[i]), "duration_days": duration}
+        inputs.update({name: bool(flags >> bit & 1) for bit, name in enumerate(FLAG_FIELDS)})
+        yield ui_data.build_record(
+            states[state], explanations[explanation], inputs, timestamps[i].isoformat()
+        )
+
+
+def append_records(path: Path, records) -> int:
+    """Agrega registros al log binario (lo crea si no existe); devuelve cuántos agregó."""
+    path = Path(path)
+    with locked_log(path) as fd:
+        vocab = read_vocab(path)
+        sizes = (len(vocab["states"]), len(vocab["explanations"]))
+        data = encode_records(records, vocab)
+        if (len(vocab["states"]), len(vocab["explanations"])) != sizes:
+            # Antes que los registros: un lector nunca ve un código sin texto
+            _write_vocab(path, vocab)
+        size = os.fstat(fd).st_size
+        header = b""
+        if size < HEADER_SIZE:
+            header = _HEADER.pack(MAGIC, FORMAT_VERSION, RECORD_DTYPE.itemsize)
+            whole = 0
+        else:
+            whole = size - (size - HEADER_SIZE) % RECORD_DTYPE.itemsize
+        if whole != size:
+            # Descartar lo que dejó a medias una escritura interrumpida
+            os.ftruncate(fd, whole)
+        view = memoryview(header + data.tobytes())
+        while view:
+            view = view[os.write(fd, view) :]
+    return len(data)
+
+
+def _check_header(f) -> None:
+    header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise ValueError("Log binario incompleto: falta el encabezado.")
+    magic, version, itemsize = _HEADER.unpack(header)
+    if magic != MAGIC or version != FORMAT_VERSION or itemsize != RECORD_DTYPE.itemsize:
+        raise ValueError("No es un log binario de predicciones compatible.")
+
+
+def open_records(path: Path) -> np.ndarray:
+    """
+    Registros del log binario mapeados en memoria (solo lectura). Un
+    registro a medio escribir al final del archivo se ignora.
+    """
+    path = Path(path)
+    with path.open("rb") as f:
+        _check_header(f)
+        count = (os.fstat(f.fileno()).st_size - HEADER_SIZE) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+
+def state_counts(path: Path) -> dict:
+    """Número de predicciones por estado, contado sobre el mapeo con NumPy."""
+    records = open_records(path)
+    counts = np.bincount(records["state"])
+    states = read_vocab(path)["states"]
+    return {states[code]: int(n) for code, n in enumerate(counts) if n}
+
+
+def severity_values(records: np.ndarray) -> np.ndarray:
+    """Severidad (float) de un arreglo RECORD_DTYPE."""
+    return records["severity"] / SEVERITY_SCALE
+
+
+def flag_values(records: np.ndarray, name: str) -> np.ndarray:
+    """Columna booleana de la bandera name de un arreglo RECORD_DTYPE."""
+    return (records["flags"] >> FLAG_FIELDS.index(name) & 1).astype(bool)
+
+
+def jsonl_to_binary(src: Path, dst: Path, chunk_size: int = CONVERT_CHUNK_SIZE) -> int:
+    """
+    Escribe en dst (binario) los registros válidos del log JSONL src y
+    devuelve cuántos escribió. dst se reemplaza solo si la conversión
+    termina; los registros que no caben en el formato (ver fits_format) se
+    descartan y se cuentan en BINLOG_SKIPPED.
+    """
+    dst = Path(dst)
+    # Partir del vocabulario existente: los códigos de un dst anterior siguen
+    # siendo válidos para quien aún lo tenga mapeado
+    vocab = read_vocab(dst)
+    converted = skipped = 0
+    fd, tmp = _mkstemp(dst)
+    try:
+        with os.fdopen(fd, "wb") as out, Path(src).open("rb") as f:
+            out.write(_HEADER.pack(MAGIC, FORMAT_VERSION, RECORD_DTYPE.itemsize))
+            records = (rec for rec in map(ui_data._parse_line, f) if rec and rec.get("timestamp"))
+            while batch := list(islice(records, chunk_size)):
+                fit = [rec for rec in batch if fits_format(rec)]
+                skipped += len(batch) - len(fit)
+                out.write(encode_records(fit, vocab).tobytes())
+                converted += len(fit)
+        # Antes que los registros: un lector nunca ve un código sin texto
+        _write_vocab(dst, vocab)
+        os.replace(tmp, dst)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    if skipped:
+        BINLOG_SKIPPED.inc(skipped)
+    return converted
+
+
+def binary_to_jsonl(src: Path, dst: Path, chunk_size: int = CONVERT_CHUNK_SIZE) -> int:
+    """Escribe en dst (JSONL) los registros del log binario src."""
+    records = open_records(src)
+    vocab = read_vocab(src)
+    dst = Path(dst)
+    fd, tmp = _mkstemp(dst)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for start in range(0, len(records), chunk_size):
+                chunk = decode_records(records[start : start + chunk_size], vocab)
+                f.write(b"".join(map(encode_record, chunk)))
+        os.replace(tmp, dst)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return len(records)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Conversión del log entre JSONL y binario.")
+    parser.add_argument("direction", choices=("to-binary", "to-jsonl"))
+    parser.add_argument("src", type=Path)
+    parser.add_argument("dst", type=Path)
+    args = parser.parse_args(argv)
+
+    skipped = BINLOG_SKIPPED.value()
+    if args.direction == "to-binary":
+        n = jsonl_to_binary(args.src, args.dst)
+    else:
+        n = binary_to_jsonl(args.src, args.dst)
+    skipped = int(BINLOG_SKIPPED.value() - skipped)
+    src_size = args.src.stat().st_size
+    dst_size = args.dst.stat().st_size
+    print(f"{n} registros: {src_size} → {dst_size} bytes.")
+    if skipped:
+        print(f"{skipped} registros descartados por no caber en el formato binario.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
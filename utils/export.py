@@ -0,0 +1,188 @@
+# utils/export.py
+"""
+Exportación del log de predicciones a CSV o Parquet.
+
+El log se recorre en bloques de chunk_size registros y cada bloque se
+escribe al archivo de salida, por lo que nunca se arma el listado completo
+en memoria. Las columnas de entrada se aplanan como inputs.<campo>. El
+resultado queda en EXPORT_DIR con una llave derivada del tamaño y mtime
+del log: mientras el log no cambie, las descargas reutilizan el archivo.
+Una exportación reemplazada se borra recién EXPORT_GRACE_SECONDS después
+de que apareció la nueva, para no cortar a quien ya tenía su ruta.
+
+Uso:
+    python -m utils.export --format parquet
+"""
+import argparse
+import csv
+import hashlib
+import os
+import tempfile
+import time
+from itertools import islice
+from pathlib import Path
+
+import utils.ui_data as ui_data
+
+# Carpeta donde se guardan los archivos exportados
+EXPORT_DIR = Path(".exports")
+EXPORT_FORMATS = ("csv", "parquet")
+EXPORT_CHUNK_SIZE = 10_000
+# Segundos que se conserva una exportación después de ser reemplazada
+EXPORT_GRACE_SECONDS = 300
+# Intentos de open_export si la exportación desaparece entre crearla y abrirla
+OPEN_ATTEMPTS = 3
+
+COLUMNS = ["timestamp", "state", "explanation", "rule_version"] + [
+    f"inputs.{name}" for name in ui_data.INPUT_FIELDS
+]
+
+
+def flatten(record: dict) -> dict:
+    """Registro del log con las entradas aplanadas como columnas inputs.<campo>."""
+    inputs = record.get("inputs") or {}
+    row = {
+        "timestamp": record.get("timestamp"),
+        "state": record.get("state"),
+        "explanation": record.get("explanation"),
+        "rule_version": record.get("rule_version"),
+    }
+    for name in ui_data.INPUT_FIELDS:
+        row[f"inputs.{name}"] = inputs.get(name)
+    return row
+
+
+def _chunks(records, size: int):
+    it = iter(records)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def _write_csv(path: Path, records, chunk_size: int) -> None:
+    with path.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        for chunk in _chunks(records, chunk_size):
+            writer.writerows(flatten(rec) for rec in chunk)
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    types = {
+        "age": pa.int64(),
+        "severity": pa.float64(),
+        "duration_days": pa.int64(),
+    }
+    return pa.schema(
+        [
+            ("timestamp", pa.string()),
+            ("state", pa.string()),
+            ("explanation", pa.string()),
+            ("rule_version", pa.string()),
+        ]
+        + [
+            (f"inputs.{name}", types.get(name, pa.bool_()))
+            for name in ui_data.INPUT_FIELDS
+        ]
+    )
+
+
+def _write_parquet(path: Path, records, chunk_size: int) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema()
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in _chunks(records, chunk_size):
+            rows = [flatten(rec) for rec in chunk]
+            columns = {name: [row[name] for row in rows] for name in COLUMNS}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+
+def export_path(fmt: str, identity) -> Path:
+    """Archivo de exportación para el formato y la identidad del log dados."""
+    key = hashlib.sha1(repr(identity).encode("utf-8")).hexdigest()[:16]
+    return EXPORT_DIR / f"predicciones-{key}.{fmt}"
+
+
+def export_predictions(fmt: str = "csv", chunk_size: int = EXPORT_CHUNK_SIZE) -> Path:
+    """
+    Exporta el log al formato pedido y devuelve la ruta del archivo.
+    Si ya existe una exportación para el mismo tamaño/mtime del log, se
+    reutiliza sin volver a leer el log. Lanza FileNotFoundError si aún no
+    hay log.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportación inválido: {fmt!r}.")
+
+    identity = ui_data.log_identity()
+    if identity is None:
+        raise FileNotFoundError("No hay predicciones registradas.")
+
+    path = export_path(fmt, identity)
+    if path.exists():
+        return path
+
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    # Nombre único: varios hilos del mismo proceso pueden exportar a la vez
+    fd, tmp = tempfile.mkstemp(dir=EXPORT_DIR, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    tmp = Path(tmp)
+    try:
+        if fmt == "csv":
+            _write_csv(tmp, ui_data.iter_records(), chunk_size)
+        else:
+            _write_parquet(tmp, ui_data.iter_records(), chunk_size)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+    _remove_replaced(fmt, path)
+    return path
+
+
+def _remove_replaced(fmt: str, current: Path) -> None:
+    """
+    Borra las exportaciones de versiones anteriores del log cuya sucesora
+    (la siguiente más nueva) existe hace más de EXPORT_GRACE_SECONDS.
+    """
+    exports = []
+    for old in EXPORT_DIR.glob(f"predicciones-*.{fmt}"):
+        try:
+            exports.append((old.stat().st_mtime, old))
+        except FileNotFoundError:
+            continue
+    exports.sort()
+    cutoff = time.time() - EXPORT_GRACE_SECONDS
+    for (_, old), (replaced_at, _) in zip(exports, exports[1:]):
+        if old != current and replaced_at < cutoff:
+            old.unlink(missing_ok=True)
+
+
+def open_export(fmt: str = "csv"):
+    """
+    Exportación abierta en modo binario. Una vez abierta se puede leer
+    completa aunque otro proceso la borre; si desaparece antes de abrirla,
+    se vuelve a pedir.
+    """
+    for attempt in range(OPEN_ATTEMPTS):
+        try:
+            return export_predictions(fmt).open("rb")
+        except FileNotFoundError:
+            if attempt == OPEN_ATTEMPTS - 1 or ui_data.log_identity() is None:
+                raise
+
+
+def export_bytes(fmt: str = "csv") -> bytes:
+    """Contenido de la exportación; pensado como callable de st.download_button."""
+    with open_export(fmt) as f:
+        return f.read()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta el log de predicciones.")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    args = parser.parse_args()
+    print(export_predictions(args.format))
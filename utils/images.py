@@ -0,0 +1,93 @@
+# utils/images.py
+"""
+Manejo de las imágenes diagnósticas cargadas en el formulario.
+
+store_upload() copia el archivo subido por bloques a un almacén en disco
+direccionado por contenido (IMAGE_STORE_DIR/ab/<sha256>), lo decodifica una
+sola vez con Pillow y guarda una vista previa acotada a PREVIEW_MAX_SIZE
+junto al original. La sesión solo guarda el hash: la memoria por sesión no
+depende del tamaño de la imagen. Subir dos veces la misma imagen no duplica
+archivos.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from PIL import Image, UnidentifiedImageError
+
+IMAGE_STORE_DIR = Path(".image_store")
+# Lado máximo (px) de la vista previa que se muestra en la app
+PREVIEW_MAX_SIZE = (1024, 1024)
+PREVIEW_QUALITY = 85
+# Bloque de copia del archivo subido
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def original_path(digest: str) -> Path:
+    return IMAGE_STORE_DIR / digest[:2] / digest
+
+
+def preview_path(digest: str) -> Path:
+    return IMAGE_STORE_DIR / digest[:2] / f"{digest}.preview.jpg"
+
+
+def _spill(fileobj) -> str:
+    """Copia fileobj al almacén calculando su sha256; devuelve el hash."""
+    IMAGE_STORE_DIR.mkdir(parents=True, exist_ok=True)
+    sha = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=IMAGE_STORE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            fileobj.seek(0)
+            while chunk := fileobj.read(COPY_CHUNK_SIZE):
+                sha.update(chunk)
+                out.write(chunk)
+        digest = sha.hexdigest()
+        target = original_path(digest)
+        if target.exists():
+            os.unlink(tmp)
+        else:
+            target.parent.mkdir(exist_ok=True)
+            os.replace(tmp, target)
+        return digest
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def make_preview(digest: str) -> Path | None:
+    """
+    Genera (una vez) la vista previa de la imagen guardada. Devuelve None
+    si Pillow no puede decodificarla.
+    """
+    target = preview_path(digest)
+    if target.exists():
+        return target
+    # Nombre único por llamada: dos sesiones (hilos del mismo proceso) pueden
+    # generar la misma vista previa a la vez
+    fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out, Image.open(original_path(digest)) as im:
+            # En JPEG, draft() decodifica directamente a una escala reducida
+            im.draft("RGB", PREVIEW_MAX_SIZE)
+            im.thumbnail(PREVIEW_MAX_SIZE)
+            if im.mode not in ("L", "RGB"):
+                im = im.convert("RGB")
+            im.save(out, "JPEG", quality=PREVIEW_QUALITY)
+        os.replace(tmp, target)
+    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError):
+        os.unlink(tmp)
+        return None
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return target
+
+
+def store_upload(fileobj) -> str:
+    """Guarda la imagen subida y su vista previa; devuelve el hash que la identifica."""
+    digest = _spill(fileobj)
+    make_preview(digest)
+    return digest
@@ -0,0 +1,324 @@
+# utils/log_store.py
+"""
+Almacén SQLite para el log de predicciones.
+
+Se usa cuando PREDICTIONS_LOG_BACKEND=sqlite (ver utils/ui_data.py). La base
+trabaja en modo WAL, por lo que varias sesiones de Streamlit pueden escribir
+a la vez mientras otras leen, y tiene índices por timestamp y por estado
+para que conteos, últimas N y rangos de tiempo no recorran la tabla. El
+esquema (y su migración) se crea una sola vez por base y proceso, no en
+cada conexión.
+
+Importar un log JSONL existente (una sola vez):
+    python -m utils.log_store predictions_log.jsonl predictions_log.db
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+INPUT_COLUMNS = (
+    ("age", "INTEGER", int),
+    ("severity", "REAL", float),
+    ("duration_days", "INTEGER", int),
+    ("has_chronic_disease", "INTEGER", bool),
+    ("has_metastasis", "INTEGER", bool),
+    ("recent_weight_loss", "INTEGER", bool),
+    ("is_bedridden", "INTEGER", bool),
+    ("refractory_pain", "INTEGER", bool),
+    ("multiple_organ_failure", "INTEGER", bool),
+    ("has_recent_imaging", "INTEGER", bool),
+)
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT,
+    state TEXT,
+    explanation TEXT,
+    {", ".join(f"{name} {sql_type}" for name, sql_type, _ in INPUT_COLUMNS)},
+    rule_version TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions(timestamp);
+CREATE INDEX IF NOT EXISTS idx_predictions_state ON predictions(state, timestamp);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+_COLUMNS = (
+    ("timestamp", "state", "explanation")
+    + tuple(name for name, _, _ in INPUT_COLUMNS)
+    + ("rule_version",)
+)
+_INSERT = (
+    f"INSERT INTO predictions ({', '.join(_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in _COLUMNS)})"
+)
+
+# Milisegundos que una escritura espera si otra sesión tiene el bloqueo
+BUSY_TIMEOUT_MS = 5000
+
+# (ruta, dispositivo, inodo) de las bases con el esquema ya creado en este
+# proceso; una base reemplazada (otro inodo) o recreada vacía se vuelve a preparar
+_prepared = set()
+_prepare_lock = threading.Lock()
+
+
+def _to_row(record: dict) -> tuple:
+    inputs = record.get("inputs") or {}
+    return (
+        record.get("timestamp"),
+        record.get("state"),
+        record.get("explanation"),
+        *(inputs.get(name) for name, _, _ in INPUT_COLUMNS),
+        record.get("rule_version"),
+    )
+
+
+def _to_record(row: tuple) -> dict:
+    """Reconstruye un registro con la misma forma que una línea del log JSONL."""
+    timestamp, state, explanation, *inputs, rule_version = row
+    record = {
+        "timestamp": timestamp,
+        "state": state,
+        "explanation": explanation,
+        "inputs": {
+            name: None if value is None else cast(value)
+            for (name, _, cast), value in zip(INPUT_COLUMNS, inputs)
+        },
+    }
+    if rule_version is not None:
+        record["rule_version"] = rule_version
+    return record
+
+
+def _where(start=None, end=None, state=None) -> tuple[str, list]:
+    clauses, params = [], []
+    if state is not None:
+        clauses.append("state = ?")
+        params.append(state)
+    if start is not None:
+        clauses.append("timestamp >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append("timestamp < ?")
+        params.append(end)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def _count_by_state(conn: sqlite3.Connection, start=None, end=None) -> dict:
+    where, params = _where(start, end)
+    rows = conn.execute(
+        f"SELECT state, COUNT(*) FROM predictions{where} GROUP BY state", params
+    ).fetchall()
+    return dict(rows)
+
+
+def _last_timestamp(conn: sqlite3.Connection):
+    (ts,) = conn.execute("SELECT MAX(timestamp) FROM predictions").fetchone()
+    return ts
+
+
+def _latest(conn: sqlite3.Connection, n: int) -> list[dict]:
+    if n <= 0:
+        return []
+    rows = conn.execute(
+        f"SELECT {', '.join(_COLUMNS)} FROM predictions ORDER BY id DESC LIMIT ?", (n,)
+    ).fetchall()
+    return [_to_record(row) for row in reversed(rows)]
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """Agrega a una base anterior las columnas nuevas (rule_version)."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(predictions)")}
+    if "rule_version" not in columns:
+        try:
+            conn.execute("ALTER TABLE predictions ADD COLUMN rule_version TEXT")
+        except sqlite3.OperationalError as e:
+            # Otra conexión la agregó al mismo tiempo
+            if "duplicate column" not in str(e):
+                raise
+
+
+class SqliteLogStore:
+    """Log de predicciones en SQLite (modo WAL, índices por timestamp y estado)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def _identity(self):
+        """(ruta, dispositivo, inodo) de la base; None si no existe o está vacía."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        if st.st_size == 0:
+            # Recién creada (quizá con el inodo de una base borrada): sin esquema
+            return None
+        return (str(self.path.resolve()), st.st_dev, st.st_ino)
+
+    def connect(self) -> sqlite3.Connection:
+        """Abre una conexión nueva; cada sesión/hilo usa la suya."""
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000)
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        if self._identity() not in _prepared:
+            with _prepare_lock:
+                # journal_mode queda guardado en la base: basta con fijarlo una vez
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.executescript(_SCHEMA)
+                _migrate(conn)
+                _prepared.add(self._identity())
+                _prepared.discard(None)
+        return conn
+
+    @contextmanager
+    def session(self):
+        """Conexión dentro de una transacción; se cierra al salir."""
+        conn = self.connect()
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def snapshot(self):
+        """
+        Conexión dentro de una sola transacción de lectura: todas sus
+        consultas ven la misma versión de la base aunque otras sesiones
+        escriban mientras tanto.
+        """
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN")
+            yield conn
+        finally:
+            conn.rollback()
+            conn.close()
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def append(self, records) -> int:
+        """Inserta los registros en una sola transacción."""
+        rows = [_to_row(rec) for rec in records]
+        if not rows:
+            return 0
+        with self.session() as conn:
+            conn.executemany(_INSERT, rows)
+        return len(rows)
+
+    def count(self, start=None, end=None, state=None) -> int:
+        where, params = _where(start, end, state)
+        with self.session() as conn:
+            (n,) = conn.execute(f"SELECT COUNT(*) FROM predictions{where}", params).fetchone()
+        return n
+
+    def count_by_state(self, start=None, end=None) -> dict:
+        with self.session() as conn:
+            return _count_by_state(conn, start, end)
+
+    def last_timestamp(self):
+        with self.session() as conn:
+            return _last_timestamp(conn)
+
+    def latest(self, n: int) -> list[dict]:
+        """Últimos n registros en orden de inserción (el más reciente al final)."""
+        if n <= 0:
+            return []
+        with self.session() as conn:
+            return _latest(conn, n)
+
+    def query(self, start=None, end=None, state=None, limit=None) -> list[dict]:
+        """Registros en [start, end) y del estado dado, del más reciente al más antiguo."""
+        where, params = _where(start, end, state)
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM predictions{where} ORDER BY timestamp DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self.session() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [_to_record(row) for row in rows]
+
+    def iter_records(self, batch_size: int = 10_000):
+        """Recorre todos los registros en orden de inserción, en lotes por id."""
+        last_id = 0
+        while rows := self.read_after(last_id, batch_size):
+            last_id = rows[-1][0]
+            for _, record in rows:
+                yield record
+
+    def read_after(self, last_id: int, limit: int = 10_000) -> list[tuple[int, dict]]:
+        """Hasta limit pares (id, registro) con id > last_id, en orden de inserción."""
+        with self.session() as conn:
+            rows = conn.execute(
+                f"SELECT id, {', '.join(_COLUMNS)} FROM predictions "
+                "WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, limit),
+            ).fetchall()
+        return [(row[0], _to_record(row[1:])) for row in rows]
+
+    def stats(self) -> dict:
+        """
+        Mismas estadísticas que ui_data.load_stats, servidas por los índices
+        en una sola conexión y transacción de lectura (conteos, últimos cinco
+        y último timestamp son coherentes entre sí).
+        """
+        with self.snapshot() as conn:
+            return {
+                "total_by_state": _count_by_state(conn),
+                "last_five": _latest(conn, 5),
+                "last_timestamp": _last_timestamp(conn),
+            }
+
+    def import_jsonl(self, jsonl_path: Path, batch_size: int = 10_000, force: bool = False) -> int:
+        """
+        Importa un log JSONL existente. Solo se ejecuta una vez por archivo
+        (se registra en la tabla meta) salvo que force=True. Las líneas
+        vacías o corruptas se ignoran. Devuelve el número de registros
+        importados.
+        """
+        jsonl_path = Path(jsonl_path)
+        key = f"imported:{jsonl_path.resolve()}"
+        with self.session() as conn:
+            if not force and conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                return 0
+
+            imported = 0
+            batch = []
+            with jsonl_path.open("r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        # ignorar líneas corruptas
+                        continue
+                    if not isinstance(rec, dict):
+                        continue
+                    batch.append(_to_row(rec))
+                    if len(batch) >= batch_size:
+                        conn.executemany(_INSERT, batch)
+                        imported += len(batch)
+                        batch = []
+            if batch:
+                conn.executemany(_INSERT, batch)
+                imported += len(batch)
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (key, str(imported)),
+            )
+        return imported
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Uso: python -m utils.log_store <log.jsonl> <log.db>", file=sys.stderr)
+        sys.exit(2)
+    n = SqliteLogStore(Path(sys.argv[2])).import_jsonl(Path(sys.argv[1]))
+    print(f"{n} registros importados.")
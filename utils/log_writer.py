@@ -0,0 +1,412 @@
+# utils/log_writer.py
+"""
+Escritura del log JSONL segura entre procesos, con commit agrupado.
+
+Cada escritura toma un bloqueo consultivo (flock) sobre el archivo, de modo
+que los registros de distintos procesos de Streamlit nunca se intercalan.
+BufferedLogWriter además acumula registros en memoria y los escribe en
+grupo cuando se llena el buffer o pasa max_delay segundos, y vacía el
+buffer al terminar el proceso. AsyncLogWriter saca la escritura del camino
+de la petición: los registros pasan por una cola acotada a un hilo de fondo.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+
+from utils import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo consultivo
+    fcntl = None
+
+# Políticas de fsync
+FSYNC_NEVER = "never"
+FSYNC_BATCH = "batch"
+FSYNC_RECORD = "record"
+FSYNC_POLICIES = (FSYNC_NEVER, FSYNC_BATCH, FSYNC_RECORD)
+
+
+def encode_record(record: dict) -> bytes:
+    """Una línea JSON Lines en UTF-8, igual a la que escribe log_prediction."""
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+@contextmanager
+def locked_log(path: Path):
+    """
+    Descriptor del log (abierto para agregar) con el bloqueo exclusivo tomado.
+
+    Si mientras se esperaba el bloqueo el archivo fue rotado (la ruta ya no
+    apunta al mismo inodo), se vuelve a abrir la ruta: así ningún registro
+    queda en un archivo que ya salió del log.
+    """
+    while True:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if fcntl is None:
+            break
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.stat(path).st_ino == os.fstat(fd).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+    try:
+        yield fd
+    finally:
+        # Cerrar el descriptor libera también el bloqueo
+        os.close(fd)
+
+
+def write_locked(path: Path, data: bytes, fsync: bool = False) -> None:
+    """Agrega data al archivo bajo un bloqueo exclusivo y con una sola llamada de escritura."""
+    if not data:
+        return
+    with locked_log(path) as fd:
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+        if fsync:
+            os.fsync(fd)
+
+
+class BufferedLogWriter:
+    """
+    Logger con buffer y commit agrupado.
+
+    - max_records: tamaño del buffer; al llenarse se escribe de inmediato.
+    - max_delay: segundos máximos que un registro espera en el buffer.
+    - fsync: "never" (lo decide el SO), "batch" (fsync tras cada grupo) o
+      "record" (cada registro se escribe y sincroniza al llegar).
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_records: int = 64,
+        max_delay: float = 0.5,
+        fsync: str = FSYNC_BATCH,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Política de fsync inválida: {fsync!r}.")
+        self.path = Path(path)
+        self.max_records = max(1, max_records)
+        self.max_delay = max_delay
+        self.fsync = fsync
+
+        self._buffer = []
+        self._first_at = None
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._closed = False
+        self._flusher = threading.Thread(
+            target=self._run, name="log-writer-flush", daemon=True
+        )
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def write(self, record: dict) -> None:
+        line = encode_record(record)
+        if self.fsync == FSYNC_RECORD:
+            with self._io_lock:
+                write_locked(self.path, line, fsync=True)
+            return
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("El logger ya fue cerrado.")
+            if not self._buffer:
+                self._first_at = time.monotonic()
+            self._buffer.append(line)
+            full = len(self._buffer) >= self.max_records
+            self._cond.notify()
+        if full:
+            self.flush()
+
+    def write_many(self, records) -> None:
+        for record in records:
+            self.write(record)
+
+    def flush(self) -> int:
+        """Escribe el buffer como un solo grupo; devuelve los registros escritos."""
+        # _io_lock conserva el orden entre grupos del mismo proceso
+        with self._io_lock:
+            with self._cond:
+                lines, self._buffer = self._buffer, []
+                self._first_at = None
+            write_locked(self.path, b"".join(lines), fsync=self.fsync == FSYNC_BATCH)
+        return len(lines)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._buffer)
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._flusher.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._buffer and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                remaining = self._first_at + self.max_delay - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+            self.flush()
+
+
+# Qué hacer cuando la cola de AsyncLogWriter está llena
+ON_FULL_BLOCK = "block"
+ON_FULL_DROP = "drop"
+ON_FULL_SPILL = "spill"
+ON_FULL_POLICIES = (ON_FULL_BLOCK, ON_FULL_DROP, ON_FULL_SPILL)
+# Espera (segundos) antes de reintentar un derrame que no se pudo escribir
+SPILL_RETRY_MIN = 0.25
+SPILL_RETRY_MAX = 30.0
+_RETRY = object()
+
+_async_writers = weakref.WeakSet()
+
+WRITER_RECORDS = metrics.register(
+    metrics.Counter(
+        "medapp_log_writer_records_total",
+        "Registros recibidos por el escritor asíncrono, por resultado.",
+    )
+)
+WRITER_BATCH_SECONDS = metrics.register(
+    metrics.Histogram(
+        "medapp_log_writer_batch_seconds", "Duración de cada escritura de un lote al log."
+    )
+)
+WRITER_QUEUE_DEPTH = metrics.register(
+    metrics.Gauge(
+        "medapp_log_writer_queue_depth",
+        "Registros en cola en los escritores asíncronos del proceso.",
+        fn=lambda: sum(w.depth() for w in list(_async_writers)),
+    )
+)
+
+
+class AsyncLogWriter:
+    """
+    Escritor de fondo: submit() deja el registro en una cola acotada y
+    vuelve de inmediato; un hilo escribe la cola por lotes con sink(records).
+
+    Con la cola llena, on_full decide:
+    - "block": submit espera hasta block_timeout segundos (None = sin límite)
+      y luego descarta.
+    - "drop": se descarta y se cuenta.
+    - "spill": se agrega a un archivo local (spill_path) que el hilo vuelve a
+      escribir en el log cuando la cola se vacía. Los registros derramados
+      pueden quedar en el log después de otros más nuevos.
+
+    close() (también al salir del proceso) escribe lo pendiente. Si sink
+    falla, el lote va al archivo de derrame (o se cuenta como fallido si la
+    política no es "spill"). El derrame se reintenta con espera creciente
+    (SPILL_RETRY_MIN a SPILL_RETRY_MAX) y solo se borra lo que se escribió;
+    si al cerrar el sink aún falla, el archivo queda para el próximo proceso.
+    """
+
+    def __init__(
+        self,
+        sink,
+        maxsize: int = 10_000,
+        on_full: str = ON_FULL_SPILL,
+        spill_path: Path | None = None,
+        batch_size: int = 256,
+        block_timeout: float | None = None,
+    ):
+        if on_full not in ON_FULL_POLICIES:
+            raise ValueError(f"Política de cola llena inválida: {on_full!r}.")
+        if on_full == ON_FULL_SPILL and spill_path is None:
+            raise ValueError('on_full="spill" requiere spill_path.')
+        self.sink = sink
+        self.on_full = on_full
+        self.spill_path = None if spill_path is None else Path(spill_path)
+        self.batch_size = max(1, batch_size)
+        self.block_timeout = block_timeout
+        self.counts = {"written": 0, "dropped": 0, "spilled": 0, "failed": 0}
+
+        self._queue = queue.Queue(maxsize)
+        self._spill_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="log-writer-async", daemon=True)
+        self._thread.start()
+        _async_writers.add(self)
+        atexit.register(self.close)
+
+    def _count(self, outcome: str, n: int = 1) -> None:
+        self.counts[outcome] += n
+        WRITER_RECORDS.inc(n, outcome=outcome)
+
+    def submit(self, record: dict) -> bool:
+        """Encola el registro; devuelve False si se descartó."""
+        if self._closed:
+            raise RuntimeError("El logger ya fue cerrado.")
+        try:
+            if self.on_full == ON_FULL_BLOCK:
+                self._queue.put(record, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            pass
+        if self.on_full == ON_FULL_SPILL:
+            self._spill([record])
+            return True
+        self._count("dropped")
+        return False
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def stats(self) -> dict:
+        return {"queue_depth": self.depth(), **self.counts}
+
+    # --- Derrame a disco ---
+
+    def _spill(self, records) -> None:
+        with self._spill_lock:
+            with self.spill_path.open("ab") as f:
+                f.write(b"".join(encode_record(rec) for rec in records))
+        self._count("spilled", len(records))
+
+    def _drain_spill(self) -> bool:
+        """
+        Escribe en el log lo derramado, si hay. El archivo se borra solo si
+        se escribió todo; si sink falla, lo no escrito vuelve al archivo de
+        derrame (antes de lo derramado mientras tanto) y devuelve False.
+        """
+        if self.spill_path is None:
+            return True
+        draining = self.spill_path.with_name(self.spill_path.name + ".draining")
+        with self._spill_lock:
+            if not draining.exists():
+                if not self.spill_path.exists():
+                    return True
+                os.replace(self.spill_path, draining)
+        with draining.open("rb") as f:
+            batch = []
+            done = 0  # bytes de draining ya escritos en el log
+            pending = 0  # bytes de las líneas en batch
+            for raw in f:
+                pending += len(raw)
+                try:
+                    batch.append(json.loads(raw))
+                except ValueError:
+                    continue
+                if len(batch) >= self.batch_size:
+                    if not self._write(batch, spill_on_error=False, count_failed=False):
+                        break
+                    batch, done, pending = [], done + pending, 0
+            else:
+                if self._write(batch, spill_on_error=False, count_failed=False):
+                    draining.unlink()
+                    return True
+            f.seek(done)
+            tail = f.read()
+        self._respill(draining, tail)
+        return False
+
+    def _respill(self, draining: Path, tail: bytes) -> None:
+        """Devuelve tail (lo no escrito de draining) al archivo de derrame."""
+        tmp = self.spill_path.with_name(self.spill_path.name + ".respill")
+        with self._spill_lock:
+            with tmp.open("wb") as out:
+                out.write(tail)
+                if self.spill_path.exists():
+                    with self.spill_path.open("rb") as newer:
+                        out.write(newer.read())
+            os.replace(tmp, self.spill_path)
+            draining.unlink()
+
+    # --- Hilo escritor ---
+
+    def _write(self, batch: list, spill_on_error: bool = True, count_failed: bool = True) -> bool:
+        if not batch:
+            return True
+        t0 = time.perf_counter()
+        try:
+            self.sink(batch)
+        except Exception:
+            if spill_on_error and self.on_full == ON_FULL_SPILL:
+                self._spill(batch)
+            elif count_failed:
+                self._count("failed", len(batch))
+            return False
+        finally:
+            WRITER_BATCH_SECONDS.observe(time.perf_counter() - t0)
+        self._count("written", len(batch))
+        return True
+
+    def _run(self) -> None:
+        retry_at = None  # próximo intento de vaciar el derrame tras un fallo
+        backoff = SPILL_RETRY_MIN
+        while True:
+            timeout = None if retry_at is None else max(0.0, retry_at - time.monotonic())
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                record = _RETRY  # solo toca reintentar el derrame
+            batch = [] if record is None or record is _RETRY else [record]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    record = None
+                    break
+                batch.append(item)
+            self._write(batch)
+            if record is None:
+                return
+            if not self._queue.empty() or (
+                retry_at is not None and time.monotonic() < retry_at
+            ):
+                continue
+            try:
+                drained = self._drain_spill()
+            except OSError:
+                drained = False
+            if drained:
+                retry_at, backoff = None, SPILL_RETRY_MIN
+            else:
+                # El sink sigue fallando: esperar antes de reintentar
+                retry_at = time.monotonic() + backoff
+                backoff = min(backoff * 2, SPILL_RETRY_MAX)
+
+    def close(self, timeout: float | None = None) -> None:
+        """Deja de aceptar registros y escribe lo pendiente (cola y derrame)."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        try:
+            self._drain_spill()
+        except OSError:
+            pass
+        atexit.unregister(self.close)
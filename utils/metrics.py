@@ -0,0 +1,288 @@
+# utils/metrics.py
+"""
+Instrumentación liviana del camino de predicción.
+
+- Contadores, medidores e histogramas en memoria (por proceso), seguros
+  entre hilos.
+- timed(stage) mide una etapa (rerun del formulario, predict_state,
+  log_prediction, imagen, CSV) en el histograma medapp_stage_seconds.
+- render_prometheus() devuelve todo en formato de texto de Prometheus.
+- Perfilador por muestreo opcional: con MEDAPP_PROFILE=1 en el entorno,
+  la primera llamada a maybe_start_profiler() del proceso lanza un hilo que
+  muestrea las pilas de todos los hilos cada MEDAPP_PROFILE_INTERVAL_MS ms.
+  Después se enciende y apaga con start_profiler() / stop_profiler(); las
+  llamadas siguientes a maybe_start_profiler() (cada rerun de la app) no lo
+  vuelven a encender.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+# Límites superiores (segundos) de los buckets de latencia
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_lock = threading.Lock()
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: tuple, extra: dict | None = None) -> str:
+    items = list(key) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _labels_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with _lock:
+            return self._values.get(_labels_key(labels), 0)
+
+    def samples(self) -> dict:
+        with _lock:
+            return dict(self._values)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.samples().items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge:
+    """Valor instantáneo; con fn, se calcula al exportar (por ejemplo, la profundidad de una cola)."""
+
+    def __init__(self, name: str, help: str, fn=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self._value = 0
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def value(self) -> float:
+        return self.fn() if self.fn is not None else self._value
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {self.value()}",
+        ]
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}  # llave ⇒ [conteos por bucket..., suma, total]
+
+    def observe(self, value: float, **labels) -> None:
+        key = _labels_key(labels)
+        with _lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def summary(self) -> dict:
+        """Conteo, suma y promedio por serie (para mostrar en la UI)."""
+        with _lock:
+            return {
+                key: {
+                    "count": s[-1],
+                    "sum": s[-2],
+                    "avg": s[-2] / s[-1] if s[-1] else 0.0,
+                }
+                for key, s in self._series.items()
+            }
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            series = {key: list(s) for key, s in self._series.items()}
+        for key, s in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, s):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(key, {'le': bound})} {cumulative}"
+                )
+            lines.append(f"{self.name}_bucket{_format_labels(key, {'le': '+Inf'})} {s[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {s[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {s[-1]}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "medapp_stage_seconds", "Duración de cada etapa del camino de predicción."
+)
+STAGE_ERRORS = Counter(
+    "medapp_stage_errors_total", "Etapas que terminaron con una excepción."
+)
+PREDICTIONS = Counter("medapp_predictions_total", "Predicciones por estado.")
+
+REGISTRY = [STAGE_SECONDS, STAGE_ERRORS, PREDICTIONS]
+
+
+def register(metric):
+    """Agrega una métrica al registro que exporta render_prometheus()."""
+    if metric not in REGISTRY:
+        REGISTRY.append(metric)
+    return metric
+
+
+@contextmanager
+def timed(stage: str):
+    """Mide la duración de una etapa; las excepciones se cuentan y se propagan."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - t0, stage=stage)
+
+
+def record_prediction(state: str) -> None:
+    PREDICTIONS.inc(state=state)
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# --- Perfilador por muestreo ---
+
+PROFILE_ENV = "MEDAPP_PROFILE"
+PROFILE_INTERVAL_ENV = "MEDAPP_PROFILE_INTERVAL_MS"
+PROFILE_MAX_DEPTH = 30
+
+
+class SamplingProfiler:
+    """Muestrea periódicamente las pilas de todos los hilos y cuenta las pilas colapsadas."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = _Tally()
+        self.total = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="medapp-profiler", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    @property
+    def running(self) -> bool:
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                with _lock:
+                    self.samples[";".join(reversed(stack))] += 1
+                    self.total += 1
+
+    def top(self, n: int = 20) -> list[tuple[str, int]]:
+        """Pilas colapsadas más frecuentes (formato de flamegraph)."""
+        with _lock:
+            return self.samples.most_common(n)
+
+
+# Perfilador del proceso: uno solo, compartido por todas las sesiones de la app
+_profiler = None
+# Si maybe_start_profiler ya consultó MEDAPP_PROFILE en este proceso
+_profile_env_checked = False
+
+
+def start_profiler(interval: float | None = None) -> SamplingProfiler:
+    """
+    Arranca el perfilador del proceso si no está corriendo (intervalo en
+    segundos; por defecto MEDAPP_PROFILE_INTERVAL_MS) y lo devuelve.
+    """
+    global _profiler
+    with _lock:
+        if _profiler is None or not _profiler.running:
+            if interval is None:
+                interval = float(os.environ.get(PROFILE_INTERVAL_ENV, "10")) / 1000
+            _profiler = SamplingProfiler(interval)
+            _profiler.start()
+        return _profiler
+
+
+def stop_profiler() -> None:
+    """Detiene el perfilador del proceso; sus muestras siguen en get_profiler()."""
+    with _lock:
+        if _profiler is not None:
+            _profiler.stop()
+
+
+def profiler_running() -> bool:
+    return _profiler is not None and _profiler.running
+
+
+def get_profiler():
+    """Último perfilador del proceso (corriendo o detenido), o None."""
+    return _profiler
+
+
+def maybe_start_profiler():
+    """
+    Solo en la primera llamada del proceso: arranca el perfilador si
+    MEDAPP_PROFILE está activo. Las siguientes no lo tocan, para que
+    apagarlo con stop_profiler() dure entre reruns. Devuelve el perfilador
+    o None.
+    """
+    global _profile_env_checked
+    with _lock:
+        first = not _profile_env_checked
+        _profile_env_checked = True
+    if not first or os.environ.get(PROFILE_ENV, "0") in ("", "0"):
+        return _profiler
+    return start_profiler()
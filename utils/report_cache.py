@@ -0,0 +1,234 @@
+# utils/report_cache.py
+"""
+Caché de los cálculos del reporte, compartida por todas las sesiones.
+
+Cada interacción en "Ver reporte" vuelve a ejecutar el script; sin caché,
+load_stats(), la lectura de la tabla y el ordenamiento se repiten en cada
+rerun y en cada sesión. Aquí los resultados se guardan en memoria del
+proceso con una llave que incluye la identidad del log (inodo, tamaño y
+mtime), así que se invalidan solos cuando llega una predicción nueva.
+
+La caché está acotada por un presupuesto de memoria (REPORT_CACHE_MB) y
+descarta primero las entradas usadas hace más tiempo. Si varias sesiones
+piden el mismo resultado a la vez, solo una lo calcula y las demás esperan.
+
+Los valores devueltos se comparten entre sesiones: no deben modificarse.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+
+import utils.ui_data as ui_data
+
+# Presupuesto de memoria por defecto, en MB (0 = sin caché)
+DEFAULT_BUDGET_MB = float(os.environ.get("REPORT_CACHE_MB", "256"))
+
+
+def estimate_size(value) -> int:
+    """Tamaño aproximado en bytes de un resultado (DataFrame, dict, lista o escalar)."""
+    if isinstance(value, pa.Table):
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ReportCache:
+    """
+    Caché LRU acotada por bytes para resultados derivados del log.
+
+    La llave es (nombre, identidad del log, argumentos). Un resultado más
+    grande que el presupuesto completo se devuelve sin guardarse.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2**20):
+        if max_bytes < 0:
+            raise ValueError("max_bytes debe ser >= 0.")
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._data = OrderedDict()  # llave ⇒ (valor, bytes)
+        self._inflight = {}  # llave ⇒ Lock del cálculo en curso
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, name: str, identity, args: tuple, compute):
+        """Devuelve el resultado guardado para la llave o lo calcula con compute()."""
+        if self.max_bytes == 0:
+            return compute()
+
+        key = (name, identity, args)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            flight = self._inflight.setdefault(key, threading.Lock())
+
+        with flight:
+            # Otra sesión pudo terminar el cálculo mientras se esperaba
+            with self._lock:
+                entry = self._data.get(key)
+                if entry is not None:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self.misses += 1
+            try:
+                value = compute()
+                self._store(key, value)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+        return value
+
+    def _store(self, key, value) -> None:
+        size = estimate_size(value)
+        with self._lock:
+            if size > self.max_bytes:
+                return
+            self._data[key] = (value, size)
+            self._bytes += size
+            # Entradas de un log anterior ya no se volverán a pedir
+            identity = key[1]
+            for old in [k for k in self._data if k[0] == key[0] and k[1] != identity]:
+                self._bytes -= self._data.pop(old)[1]
+                self.evictions += 1
+            while self._bytes > self.max_bytes:
+                _, (_, old_size) = self._data.popitem(last=False)
+                self._bytes -= old_size
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+
+# Caché compartida por el proceso (todas las sesiones de Streamlit)
+default_cache = ReportCache(int(DEFAULT_BUDGET_MB * 2**20))
+
+
+def cached_stats() -> dict:
+    """load_stats() del log actual."""
+    return default_cache.get_or_compute(
+        "stats", ui_data.log_identity(), (), ui_data.load_stats
+    )
+
+
+def cached_tail(n: int = 5) -> list[dict]:
+    """tail_predictions(n) del log actual."""
+    return default_cache.get_or_compute(
+        "tail", ui_data.log_identity(), (n,), lambda: ui_data.tail_predictions(n)
+    )
+
+
+def cached_sorted_table(
+    start=None,
+    end=None,
+    states=None,
+    age_range=None,
+    severity_range=None,
+    sort_by="timestamp",
+    descending=True,
+):
+    """ui_data.sorted_archive_table() del log actual (tabla Arrow filtrada y ordenada)."""
+    args = (
+        start,
+        end,
+        None if states is None else tuple(sorted(states)),
+        None if age_range is None else tuple(age_range),
+        None if severity_range is None else tuple(severity_range),
+        sort_by,
+        descending,
+    )
+    return default_cache.get_or_compute(
+        "table",
+        ui_data.log_identity(),
+        args,
+        lambda: ui_data.sorted_archive_table(*args),
+    )
+
+
+def prediction_page(page: int = 0, page_size: int = 50, **filters) -> tuple[pd.DataFrame, int]:
+    """
+    Página `page` (desde 0) de la tabla de predicciones y el total de filas
+    que cumplen los filtros. Solo las filas de la página pasan a pandas; la
+    tabla ordenada queda en la caché, así que cambiar de página no vuelve
+    a leer ni a ordenar.
+    """
+    table = cached_sorted_table(**filters)
+    page_df = table.slice(page * page_size, page_size).to_pandas()
+    return page_df, table.num_rows
+
+
+def cached_trends(granularity: str = "day", start=None, end=None) -> dict:
+    """
+    Tendencias del rango desde los rollups (utils/rollups.py): antes de
+    leer se agrega lo nuevo del log, una vez por cada cambio del log.
+    start y end se redondean al inicio de su tramo (hora o día), que es como
+    filtran los rollups: un rango móvil como "ahora - 48 h" da la misma
+    llave en cada rerun del mismo tramo.
+    """
+    from utils import rollups
+
+    if start is not None:
+        start = rollups.bucket_of(str(start), granularity)
+    if end is not None:
+        end = rollups.bucket_of(str(end), granularity)
+
+    def compute():
+        rollups.refresh()
+        return {
+            "trend": rollups.trend(granularity, start, end),
+            "severity": rollups.distribution("severity", granularity, start, end),
+            "age": rollups.distribution("age", granularity, start, end),
+        }
+
+    return default_cache.get_or_compute(
+        "trends", ui_data.log_identity(), (granularity, start, end), compute
+    )
+
+
+def cached_shadow_report() -> dict | None:
+    """
+    shadow.refresh() del log en sombra (SHADOW_LOG_FILE), o None si aún no
+    existe. La llave es la identidad de ese log (inodo, tamaño y mtime): los
+    reruns solo vuelven a leerlo cuando el evaluador agregó resultados.
+    """
+    import shadow
+
+    path = Path(shadow.SHADOW_LOG_FILE)
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    identity = (str(path.resolve()), st.st_ino, st.st_size, st.st_mtime_ns)
+    return default_cache.get_or_compute("shadow", identity, (), lambda: shadow.refresh(path))
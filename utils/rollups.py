@@ -0,0 +1,324 @@
+# utils/rollups.py
+"""
+Agregados por tramos de tiempo (rollups) para las tendencias del reporte.
+
+Por cada hora y cada día se guarda, por estado, el número de predicciones,
+la suma de severidad y de edad (para promedios) y dos histogramas de tamaño
+fijo: severidad por punto entero (0–10) y edad por década (0–9, …, 100+).
+Se guardan en una base SQLite aparte (ROLLUP_DB).
+
+refresh() es incremental: procesa solo lo agregado al log desde la última
+corrida (el byte ya leído del log JSONL, o el último id con el backend
+"sqlite"), así que leer las tendencias no depende del tamaño del log. Si el
+log se rota o se reemplaza, el archivo nuevo se agrega desde el inicio sin
+borrar los tramos ya acumulados.
+
+Reconstruir desde cero a partir de los logs existentes:
+    python -m utils.rollups --backfill [logs rotados ...]
+"""
+import argparse
+import json
+import os
+import sqlite3
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+import utils.ui_data as ui_data
+
+ROLLUP_DB = Path("predictions_rollups.db")
+GRANULARITIES = ("hour", "day")
+# Registros por transacción al refrescar
+REFRESH_BATCH_SIZE = 50_000
+SEVERITY_BINS = 11
+AGE_BINS = 11
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup (
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    state TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    severity_sum REAL NOT NULL,
+    age_sum INTEGER NOT NULL,
+    PRIMARY KEY (granularity, bucket, state)
+);
+CREATE TABLE IF NOT EXISTS rollup_hist (
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    bin INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (granularity, bucket, dimension, bin)
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def bucket_of(timestamp: str, granularity: str) -> str:
+    """Inicio del tramo de un timestamp ISO, sin parsearlo ('2024-03-01T12' o '2024-03-01')."""
+    return timestamp[:13] if granularity == "hour" else timestamp[:10]
+
+
+def severity_bin(severity) -> int:
+    return min(SEVERITY_BINS - 1, max(0, int(severity)))
+
+
+def age_bin(age) -> int:
+    return min(AGE_BINS - 1, max(0, int(age) // 10))
+
+
+def age_bin_label(b: int) -> str:
+    return f"{b * 10}+" if b == AGE_BINS - 1 else f"{b * 10}–{b * 10 + 9}"
+
+
+class Rollup:
+    """Acumulador en memoria de un lote de registros, listo para volcar a la base."""
+
+    def __init__(self):
+        self.sums = {}  # (gran, tramo, estado) ⇒ [n, Σsev, Σedad]
+        self.hist = Counter()  # (gran, tramo, dimensión, bin) ⇒ n
+
+    def add(self, record: dict) -> None:
+        timestamp = record.get("timestamp")
+        state = record.get("state")
+        if not timestamp or not state:
+            return
+        inputs = record.get("inputs") or {}
+        severity = inputs.get("severity")
+        age = inputs.get("age")
+        for gran in GRANULARITIES:
+            bucket = bucket_of(timestamp, gran)
+            key = (gran, bucket, state)
+            sums = self.sums.get(key)
+            if sums is None:
+                sums = self.sums[key] = [0, 0.0, 0]
+            sums[0] += 1
+            if severity is not None:
+                sums[1] += severity
+                self.hist[(gran, bucket, "severity", severity_bin(severity))] += 1
+            if age is not None:
+                sums[2] += age
+                self.hist[(gran, bucket, "age", age_bin(age))] += 1
+
+    def flush(self, conn: sqlite3.Connection) -> None:
+        conn.executemany(
+            "INSERT INTO rollup VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (granularity, bucket, state) DO UPDATE SET "
+            "count = count + excluded.count, "
+            "severity_sum = severity_sum + excluded.severity_sum, "
+            "age_sum = age_sum + excluded.age_sum",
+            [(*key, *sums) for key, sums in self.sums.items()],
+        )
+        conn.executemany(
+            "INSERT INTO rollup_hist VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (granularity, bucket, dimension, bin) DO UPDATE SET "
+            "count = count + excluded.count",
+            [(*key, n) for key, n in self.hist.items()],
+        )
+        self.sums.clear()
+        self.hist.clear()
+
+
+@contextmanager
+def _session(db: Path):
+    """Transacción exclusiva: dos refrescos simultáneos no cuentan dos veces."""
+    conn = sqlite3.connect(db, timeout=30, isolation_level=None)
+    try:
+        conn.executescript(_SCHEMA)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+
+def _get_meta(conn, key: str, default):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return default if row is None else json.loads(row[0])
+
+
+def _set_meta(conn, key: str, value) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value))
+    )
+
+
+def _refresh_jsonl(conn, log_file: Path, batch_size: int) -> int:
+    from utils.archive import _iter_new_lines, _resume_offset
+
+    if not log_file.exists():
+        return 0
+    state = _get_meta(conn, "jsonl", {"offset": 0, "inode": None, "signature": ""})
+    added = 0
+    with log_file.open("rb") as f:
+        signature = ui_data._log_signature(f)
+        offset = _resume_offset(f, state)
+        rollup = Rollup()
+        for offset, rec in _iter_new_lines(f, offset):
+            rollup.add(rec)
+            added += 1
+            if added % batch_size == 0:
+                rollup.flush(conn)
+        rollup.flush(conn)
+        state = {
+            "offset": offset,
+            "inode": os.fstat(f.fileno()).st_ino,
+            "signature": signature[: 2 * min(offset, ui_data.STATS_SIGNATURE_BYTES)],
+        }
+    _set_meta(conn, "jsonl", state)
+    return added
+
+
+def _refresh_sqlite(conn, batch_size: int) -> int:
+    if not ui_data.DB_FILE.exists():
+        return 0
+    store = ui_data.get_store()
+    last_id = _get_meta(conn, "sqlite_last_id", 0)
+    added = 0
+    while rows := store.read_after(last_id, batch_size):
+        rollup = Rollup()
+        for _, rec in rows:
+            rollup.add(rec)
+        rollup.flush(conn)
+        last_id = rows[-1][0]
+        added += len(rows)
+    _set_meta(conn, "sqlite_last_id", last_id)
+    return added
+
+
+def refresh(db: Path | None = None, batch_size: int = REFRESH_BATCH_SIZE) -> int:
+    """Agrega a los rollups lo nuevo del log actual; devuelve cuántos registros sumó."""
+    with _session(Path(db or ROLLUP_DB)) as conn:
+        if ui_data._use_sqlite():
+            return _refresh_sqlite(conn, batch_size)
+        return _refresh_jsonl(conn, Path(ui_data.LOG_FILE), batch_size)
+
+
+def backfill(log_files=(), db: Path | None = None, batch_size: int = REFRESH_BATCH_SIZE) -> int:
+    """
+    Reconstruye los rollups desde cero: suma los logs JSONL dados (por
+    ejemplo, logs rotados; los .gz se leen comprimidos), los segmentos del
+    manifiesto de rotación y luego el log actual completo.
+    """
+    import gzip
+
+    with _session(Path(db or ROLLUP_DB)) as conn:
+        conn.execute("DELETE FROM rollup")
+        conn.execute("DELETE FROM rollup_hist")
+        conn.execute("DELETE FROM meta")
+        added = 0
+        current = None if ui_data._use_sqlite() else Path(ui_data.LOG_FILE).resolve()
+        segments = [ui_data.SEGMENTS_DIR / s["file"] for s in ui_data.read_manifest()]
+        seen = set()
+        for path in map(Path, [*log_files, *segments]):
+            if path.resolve() in seen or (current is not None and path.resolve() == current):
+                continue
+            seen.add(path.resolve())
+            rollup = Rollup()
+            with (gzip.open(path, "rb") if path.suffix == ".gz" else path.open("rb")) as f:
+                for raw in f:
+                    rec = ui_data._parse_line(raw)
+                    if rec is None:
+                        continue
+                    rollup.add(rec)
+                    added += 1
+                    if added % batch_size == 0:
+                        rollup.flush(conn)
+            rollup.flush(conn)
+        if current is None:
+            added += _refresh_sqlite(conn, batch_size)
+        else:
+            added += _refresh_jsonl(conn, current, batch_size)
+    return added
+
+
+def _read(sql: str, params, db: Path | None):
+    db = Path(db or ROLLUP_DB)
+    if not db.exists():
+        return []
+    conn = sqlite3.connect(db, timeout=30)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def _range(granularity: str, start, end) -> tuple[str, list]:
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularidad inválida: {granularity!r}.")
+    clauses, params = ["granularity = ?"], [granularity]
+    if start is not None:
+        clauses.append("bucket >= ?")
+        params.append(bucket_of(str(start), granularity))
+    if end is not None:
+        clauses.append("bucket < ?")
+        params.append(bucket_of(str(end), granularity))
+    return " AND ".join(clauses), params
+
+
+def trend(granularity: str = "day", start=None, end=None, db: Path | None = None):
+    """
+    DataFrame con una fila por (tramo, estado) en [start, end): count,
+    severity_avg y age_avg. El costo depende del número de tramos pedidos,
+    no del tamaño del log.
+    """
+    import pandas as pd
+
+    where, params = _range(granularity, start, end)
+    rows = _read(
+        f"SELECT bucket, state, count, severity_sum, age_sum FROM rollup "
+        f"WHERE {where} ORDER BY bucket, state",
+        params,
+        db,
+    )
+    df = pd.DataFrame(rows, columns=["bucket", "state", "count", "severity_sum", "age_sum"])
+    df["severity_avg"] = df["severity_sum"] / df["count"]
+    df["age_avg"] = df["age_sum"] / df["count"]
+    return df.drop(columns=["severity_sum", "age_sum"])
+
+
+def distribution(
+    dimension: str, granularity: str = "day", start=None, end=None, db: Path | None = None
+):
+    """DataFrame (bucket, bin, count) del histograma de 'severity' o 'age' en [start, end)."""
+    import pandas as pd
+
+    if dimension not in ("severity", "age"):
+        raise ValueError(f"Dimensión inválida: {dimension!r}.")
+    where, params = _range(granularity, start, end)
+    rows = _read(
+        f"SELECT bucket, bin, count FROM rollup_hist WHERE {where} AND dimension = ? "
+        "ORDER BY bucket, bin",
+        params + [dimension],
+        db,
+    )
+    return pd.DataFrame(rows, columns=["bucket", "bin", "count"])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Rollups por hora y por día del log.")
+    parser.add_argument(
+        "--backfill",
+        nargs="*",
+        metavar="LOG",
+        help="Reconstruir desde cero con estos logs JSONL más el log actual",
+    )
+    parser.add_argument("--db", type=Path, default=None)
+    args = parser.parse_args(argv)
+
+    if args.backfill is not None:
+        n = backfill(args.backfill, args.db)
+        print(f"Rollups reconstruidos con {n} registros.")
+    else:
+        n = refresh(args.db)
+        print(f"{n} registros nuevos agregados a los rollups.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
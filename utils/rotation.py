@@ -0,0 +1,280 @@
+# utils/rotation.py
+"""
+Rotación, compresión y retención del log JSONL.
+
+rotate_log() mueve el contenido de LOG_FILE a un segmento comprimido con
+gzip en SEGMENTS_DIR y registra en el manifiesto (manifest.json) su rango
+de tiempo, el número de registros, los conteos por estado y los últimos
+registros. load_stats() suma los segmentos desde el manifiesto sin
+descomprimirlos, y iter_records() (exportaciones) salta los segmentos que
+caen fuera del rango pedido.
+
+Antes de sacar un segmento del log activo se ponen al día el archivo
+Parquet (utils/archive.py) y los rollups (utils/rollups.py), que siguen el
+log por byte: así no pierden los registros rotados.
+
+La mayor parte de la compresión se hace sin bloquear a los escritores; solo
+la cola final del log se copia con el bloqueo del log tomado.
+
+Configuración (variables de entorno):
+- PREDICTIONS_LOG_ROTATE=1: rotar automáticamente al escribir.
+- PREDICTIONS_LOG_ROTATE_MB: tamaño máximo del log activo (64; 0 = sin límite).
+- PREDICTIONS_LOG_ROTATE_HOURS: antigüedad máxima del primer registro (24; 0 = sin límite).
+- PREDICTIONS_LOG_RETENTION_DAYS: días que se conservan los segmentos (0 = siempre).
+- PREDICTIONS_LOG_RETENTION_SEGMENTS: máximo de segmentos (0 = sin límite).
+
+Uso (por ejemplo, desde cron):
+    python -m utils.rotation [--force]
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import utils.ui_data as ui_data
+from utils.log_writer import locked_log
+
+ROTATE_MAX_BYTES = int(float(os.environ.get("PREDICTIONS_LOG_ROTATE_MB", "64")) * 2**20)
+ROTATE_MAX_AGE_HOURS = float(os.environ.get("PREDICTIONS_LOG_ROTATE_HOURS", "24"))
+RETENTION_DAYS = float(os.environ.get("PREDICTIONS_LOG_RETENTION_DAYS", "0"))
+RETENTION_SEGMENTS = int(os.environ.get("PREDICTIONS_LOG_RETENTION_SEGMENTS", "0"))
+COMPRESS_LEVEL = 6
+MANIFEST_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+
+class _Summary:
+    """Resumen de un segmento mientras se comprime."""
+
+    def __init__(self):
+        self.records = 0
+        self.total_by_state = {}
+        self.start = None
+        self.end = None
+        self.recent = deque(maxlen=ui_data.RECENT_SIZE)
+
+    def add(self, raw: bytes) -> None:
+        rec = ui_data._parse_line(raw)
+        if rec is None:
+            return
+        self.records += 1
+        state = rec.get("state")
+        self.total_by_state[state] = self.total_by_state.get(state, 0) + 1
+        ts = rec.get("timestamp")
+        if ts:
+            if self.start is None or ts < self.start:
+                self.start = ts
+            if self.end is None or ts > self.end:
+                self.end = ts
+        self.recent.append(rec)
+
+
+class _Cancelled(Exception):
+    """La rotación no aplica: el log ya fue rotado por otro proceso o está vacío."""
+
+
+def _copy(src, gz, summary: _Summary, offset: int) -> int:
+    """Copia las líneas completas de src desde offset; devuelve el offset final."""
+    src.seek(offset)
+    for raw in src:
+        if not raw.endswith(b"\n"):
+            break
+        gz.write(raw)
+        summary.add(raw)
+        offset += len(raw)
+    return offset
+
+
+def _write_manifest(segments: list[dict]) -> None:
+    path = ui_data.manifest_file()
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "segments": segments}, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _catch_up_derived() -> None:
+    """Pone al día el archivo Parquet y los rollups con el log activo."""
+    from utils import rollups
+    from utils.archive import compact_log
+
+    compact_log()
+    rollups.refresh()
+
+
+def _first_timestamp(path: Path):
+    try:
+        with path.open("rb") as f:
+            rec = ui_data._parse_line(f.readline())
+    except OSError:
+        return None
+    return rec.get("timestamp") if rec else None
+
+
+def should_rotate(now: datetime | None = None) -> bool:
+    """True si el log activo supera el tamaño o la antigüedad configurados."""
+    try:
+        size = ui_data.LOG_FILE.stat().st_size
+    except FileNotFoundError:
+        return False
+    if size == 0:
+        return False
+    if ROTATE_MAX_BYTES and size >= ROTATE_MAX_BYTES:
+        return True
+    if ROTATE_MAX_AGE_HOURS:
+        first = _first_timestamp(ui_data.LOG_FILE)
+        now = now or datetime.utcnow()
+        if first and first < (now - timedelta(hours=ROTATE_MAX_AGE_HOURS)).isoformat():
+            return True
+    return False
+
+
+def rotate_log(force: bool = False, now: datetime | None = None) -> dict | None:
+    """
+    Rota el log activo si corresponde (o siempre con force=True). Devuelve la
+    entrada del manifiesto del segmento nuevo, o None si no se rotó. Si algo
+    falla (disco lleno, interrupción) se borra el segmento a medio escribir
+    o aún no registrado en el manifiesto, y el log activo queda intacto.
+    """
+    if ui_data._use_sqlite():
+        return None
+    log_file = Path(ui_data.LOG_FILE)
+    if not (force or should_rotate(now)):
+        return None
+
+    ui_data.SEGMENTS_DIR.mkdir(parents=True, exist_ok=True)
+    _catch_up_derived()
+    try:
+        src = log_file.open("rb")
+    except FileNotFoundError:
+        return None
+
+    with src:
+        inode = os.fstat(src.fileno()).st_ino
+        tmp = ui_data.SEGMENTS_DIR / f".segment-{inode}.{os.getpid()}.tmp"
+        summary = _Summary()
+        published = None  # segmento renombrado pero aún fuera del manifiesto
+        try:
+            with gzip.open(tmp, "wb", compresslevel=COMPRESS_LEVEL) as gz:
+                # Grueso del log sin bloquear a los escritores
+                offset = _copy(src, gz, summary, 0)
+                with locked_log(log_file) as fd:
+                    if os.fstat(fd).st_ino != inode:
+                        # Otro proceso rotó el log mientras tanto
+                        raise _Cancelled
+                    offset = _copy(src, gz, summary, offset)
+                    if summary.records == 0:
+                        raise _Cancelled
+                    _catch_up_derived()
+
+                    gz.close()
+                    stamp = (summary.start or datetime.utcnow().isoformat())[:19]
+                    stamp = stamp.replace("-", "").replace(":", "")
+                    name = f"{log_file.stem}-{stamp}-{inode}.jsonl.gz"
+                    published = ui_data.SEGMENTS_DIR / name
+                    os.replace(tmp, published)
+                    segment = {
+                        "file": name,
+                        "start": summary.start,
+                        "end": summary.end,
+                        "records": summary.records,
+                        "total_by_state": list(summary.total_by_state.items()),
+                        "recent": list(summary.recent),
+                        "raw_bytes": offset,
+                        "bytes": (ui_data.SEGMENTS_DIR / name).stat().st_size,
+                        "rotated_at": datetime.utcnow().isoformat(),
+                    }
+                    segments = ui_data.read_manifest() + [segment]
+                    _write_manifest(apply_retention(segments, now))
+                    published = None
+                    # Los escritores que esperaban el bloqueo abrirán un log nuevo
+                    log_file.unlink()
+                    ui_data.stats_checkpoint_file().unlink(missing_ok=True)
+        except _Cancelled:
+            tmp.unlink(missing_ok=True)
+            return None
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            if published is not None:
+                published.unlink(missing_ok=True)
+            raise
+    return segment
+
+
+def apply_retention(segments: list[dict], now: datetime | None = None) -> list[dict]:
+    """Borra los segmentos vencidos o que exceden el máximo; devuelve los que quedan."""
+    keep = list(segments)
+    if RETENTION_DAYS:
+        cutoff = ((now or datetime.utcnow()) - timedelta(days=RETENTION_DAYS)).isoformat()
+        keep = [s for s in keep if not (s["end"] and s["end"] < cutoff)]
+    if RETENTION_SEGMENTS and len(keep) > RETENTION_SEGMENTS:
+        keep = keep[-RETENTION_SEGMENTS:]
+    for segment in segments:
+        if segment not in keep:
+            (ui_data.SEGMENTS_DIR / segment["file"]).unlink(missing_ok=True)
+    return keep
+
+
+def enforce_retention(now: datetime | None = None) -> int:
+    """Aplica la retención al manifiesto actual; devuelve cuántos segmentos borró."""
+    if not ui_data.manifest_file().exists():
+        return 0
+    with locked_log(ui_data.LOG_FILE):
+        segments = ui_data.read_manifest()
+        keep = apply_retention(segments, now)
+        if len(keep) != len(segments):
+            _write_manifest(keep)
+    return len(segments) - len(keep)
+
+
+_rotating = threading.Lock()
+
+
+def maybe_rotate() -> None:
+    """
+    Llamado después de cada escritura con ui_data.LOG_ROTATE activo: si el
+    log debe rotarse, lo hace en un hilo de fondo (uno por proceso a la vez)
+    para no demorar la respuesta.
+    """
+    if not should_rotate() or not _rotating.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            rotate_log()
+        except Exception:
+            # El log activo queda intacto: se reintenta en la próxima escritura
+            logger.exception("No se pudo rotar el log %s", ui_data.LOG_FILE)
+        finally:
+            _rotating.release()
+
+    threading.Thread(target=run, name="log-rotation", daemon=True).start()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Rotación y retención del log de predicciones.")
+    parser.add_argument("--force", action="store_true", help="Rotar aunque no se cumplan los límites")
+    args = parser.parse_args(argv)
+
+    segment = rotate_log(force=args.force)
+    if segment is None:
+        print("No se rotó el log.")
+    else:
+        print(
+            f"Segmento {segment['file']}: {segment['records']} registros, "
+            f"{segment['raw_bytes']} → {segment['bytes']} bytes."
+        )
+    removed = enforce_retention()
+    if removed:
+        print(f"{removed} segmento(s) borrado(s) por retención.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,75 +1,665 @@
 # app.py
 import json
+import os
+import tempfile
+import threading
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 
-import streamlit as st
-
 from rules import PatientInput
+from utils.log_store import SqliteLogStore
+from utils.log_writer import AsyncLogWriter, BufferedLogWriter, encode_record, write_locked
 
 # Archivo donde se guardan las predicciones (dentro del contenedor /app)
 LOG_FILE = Path("predictions_log.jsonl")
+# Base SQLite usada cuando LOG_BACKEND == "sqlite"
+DB_FILE = Path("predictions_log.db")
+# Archivo Parquet particionado por fecha (ver utils/archive.py)
+ARCHIVE_DIR = Path("predictions_archive")
+# Segmentos rotados y comprimidos del log (ver utils/rotation.py)
+SEGMENTS_DIR = Path("predictions_segments")
+MANIFEST_NAME = "manifest.json"
+# Backend del log: "jsonl" (por defecto) o "sqlite"
+LOG_BACKEND = os.environ.get("PREDICTIONS_LOG_BACKEND", "jsonl")
+# Commit agrupado del log JSONL (ver utils/log_writer.py)
+LOG_BUFFERED = os.environ.get("PREDICTIONS_LOG_BUFFERED", "0") not in ("", "0")
+LOG_FSYNC = os.environ.get("PREDICTIONS_LOG_FSYNC", "batch")
+# Escritura en segundo plano (cola acotada; ver AsyncLogWriter)
+LOG_ASYNC = os.environ.get("PREDICTIONS_LOG_ASYNC", "0") not in ("", "0")
+LOG_QUEUE_SIZE = int(os.environ.get("PREDICTIONS_LOG_QUEUE_SIZE", "10000"))
+# Cola llena: "spill" (a disco), "block" o "drop"
+LOG_QUEUE_FULL = os.environ.get("PREDICTIONS_LOG_QUEUE_FULL", "spill")
+# PREDICTIONS_LOG_ROTATE=1 rota el log al escribir (ver utils/rotation.py)
+LOG_ROTATE = os.environ.get("PREDICTIONS_LOG_ROTATE", "0") not in ("", "0")
 
+# Predicciones recientes que conserva el punto de control de load_stats
+RECENT_SIZE = 5
+# Bytes iniciales del log usados para detectar que fue reemplazado
+STATS_SIGNATURE_BYTES = 256
+STATS_CHECKPOINT_VERSION = 1
+# Tamaño de bloque para leer el log desde el final
+TAIL_BLOCK_SIZE = 64 * 1024
 
-def log_prediction(state: str, explanation: str, patient: PatientInput) -> None:
-    """Append una predicción al archivo JSON Lines."""
+# Campos de entrada guardados en cada registro, en orden de PatientInput
+INPUT_FIELDS = (
+    "age",
+    "severity",
+    "duration_days",
+    "has_chronic_disease",
+    "has_metastasis",
+    "recent_weight_loss",
+    "is_bedridden",
+    "refractory_pain",
+    "multiple_organ_failure",
+    "has_recent_imaging",
+)
+
+
+def build_record(
+    state: str,
+    explanation: str,
+    inputs: dict,
+    timestamp: str | None = None,
+    rule_version: str | None = None,
+) -> dict:
+    """
+    Arma un registro del log a partir del estado, la explicación y las
+    entradas. rule_version es la versión del conjunto de reglas que produjo
+    el resultado (ver ruleset.py); sin ella el registro no lleva la llave.
+    """
     record = {
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": timestamp or datetime.utcnow().isoformat(),
         "state": state,
         "explanation": explanation,
-        "inputs": {
-            "age": patient.age,
-            "severity": patient.severity,
-            "duration_days": patient.duration_days,
-            "has_chronic_disease": patient.has_chronic_disease,
-            "has_metastasis": patient.has_metastasis,
-            "recent_weight_loss": patient.recent_weight_loss,
-            "is_bedridden": patient.is_bedridden,
-            "refractory_pain": patient.refractory_pain,
-            "multiple_organ_failure": patient.multiple_organ_failure,
-            "has_recent_imaging": patient.has_recent_imaging,
-        },
+        "inputs": {name: inputs[name] for name in INPUT_FIELDS},
     }
-    with LOG_FILE.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    if rule_version is not None:
+        record["rule_version"] = rule_version
+    return record
+
+
+def _use_sqlite() -> bool:
+    if LOG_BACKEND not in ("jsonl", "sqlite"):
+        raise ValueError(
+            f"Backend de log desconocido: {LOG_BACKEND!r} (use 'jsonl' o 'sqlite')."
+        )
+    return LOG_BACKEND == "sqlite"
+
+
+def get_store() -> SqliteLogStore:
+    """Almacén SQLite del log (backend "sqlite")."""
+    return SqliteLogStore(DB_FILE)
+
+
+def append_records(records) -> None:
+    """Append varios registros al log (JSON Lines o SQLite) en una sola escritura."""
+    if _use_sqlite():
+        get_store().append(records)
+        return
+
+    write_locked(LOG_FILE, b"".join(encode_record(rec) for rec in records))
+    _after_write()
+
+
+def _after_write() -> None:
+    if LOG_ROTATE:
+        from utils.rotation import maybe_rotate
+
+        maybe_rotate()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> BufferedLogWriter:
+    """Logger con buffer del proceso para el LOG_FILE actual."""
+    global _writer
+    with _writer_lock:
+        if _writer is None or _writer.path != LOG_FILE:
+            if _writer is not None:
+                _writer.close()
+            _writer = BufferedLogWriter(LOG_FILE, fsync=LOG_FSYNC)
+        return _writer
+
+
+_async_writer = None
+
+
+def _spill_file() -> Path:
+    return LOG_FILE.with_name(f"{LOG_FILE.name}.{os.getpid()}.spill")
+
+
+def _adopt_spills(target: Path) -> None:
+    """Junta en target los derrames que dejaron procesos ya terminados."""
+    for path in LOG_FILE.parent.glob(f"{LOG_FILE.name}.*.spill*"):
+        pid = path.name[len(LOG_FILE.name) + 1 :].split(".")[0]
+        if not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        try:
+            os.kill(int(pid), 0)
+            continue  # el proceso sigue vivo: su escritor lo vaciará
+        except ProcessLookupError:
+            pass
+        except PermissionError:
+            continue
+        with path.open("rb") as src, target.open("ab") as dst:
+            dst.write(src.read())
+        path.unlink()
+
+
+def get_async_writer() -> AsyncLogWriter:
+    """Escritor en segundo plano del proceso para el log actual."""
+    global _async_writer
+    with _writer_lock:
+        if (
+            _async_writer is None
+            or _async_writer.closed
+            or _async_writer.spill_path != _spill_file()
+        ):
+            if _async_writer is not None:
+                _async_writer.close()
+            spill = _spill_file()
+            _adopt_spills(spill)
+            _async_writer = AsyncLogWriter(
+                append_records,
+                maxsize=LOG_QUEUE_SIZE,
+                on_full=LOG_QUEUE_FULL,
+                spill_path=spill,
+            )
+        return _async_writer
+
+
+def log_prediction(
+    state: str, explanation: str, patient: PatientInput, rule_version: str | None = None
+) -> None:
+    """Append una predicción al archivo JSON Lines."""
+    record = build_record(
+        state,
+        explanation,
+        {name: getattr(patient, name) for name in INPUT_FIELDS},
+        rule_version=rule_version,
+    )
+    if LOG_ASYNC:
+        get_async_writer().submit(record)
+    elif LOG_BUFFERED and not _use_sqlite():
+        get_writer().write(record)
+        _after_write()
+    else:
+        append_records([record])
+
+
+def stats_checkpoint_file() -> Path:
+    """Archivo donde se persiste el punto de control de load_stats."""
+    return LOG_FILE.with_name(LOG_FILE.name + ".stats.json")
+
+
+def _log_signature(f) -> str:
+    """Primeros bytes del log (en hex); si cambian, el archivo fue reemplazado."""
+    f.seek(0)
+    return f.read(STATS_SIGNATURE_BYTES).hex()
+
+
+def _empty_checkpoint() -> dict:
+    return {
+        "offset": 0,
+        "inode": None,
+        "signature": "",
+        "total_by_state": [],
+        "last_timestamp": None,
+        "recent": [],
+    }
+
+
+def _read_checkpoint() -> dict:
+    try:
+        with stats_checkpoint_file().open("r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("version") == STATS_CHECKPOINT_VERSION:
+            return checkpoint
+    except (OSError, ValueError):
+        pass
+    return _empty_checkpoint()
+
+
+def _write_checkpoint(checkpoint: dict) -> None:
+    checkpoint = {"version": STATS_CHECKPOINT_VERSION, **checkpoint}
+    path = stats_checkpoint_file()
+    try:
+        # Nombre único: las sesiones de la app son hilos del mismo proceso
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    except OSError:
+        # Sin permisos de escritura: se recalcula en la próxima llamada
+        return
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError:
+        os.unlink(tmp)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _parse_line(raw: bytes):
+    """Devuelve el registro de una línea del log, o None si está vacía o corrupta."""
+    raw = raw.strip()
+    if not raw:
+        return None
+    try:
+        rec = json.loads(raw.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return None
+    return rec if isinstance(rec, dict) else None
+
+
+def manifest_file() -> Path:
+    return SEGMENTS_DIR / MANIFEST_NAME
+
+
+def read_manifest() -> list[dict]:
+    """Segmentos rotados del log, del más antiguo al más reciente."""
+    try:
+        with manifest_file().open("r", encoding="utf-8") as f:
+            return json.load(f)["segments"]
+    except (OSError, ValueError, KeyError):
+        return []
 
 
 def load_stats():
-    """Leer el log y calcular las estadísticas solicitadas."""
-    if not LOG_FILE.exists():
-        return {
-            "total_by_state": {},
-            "last_five": [],
-            "last_timestamp": None,
-        }
+    """
+    Leer el log y calcular las estadísticas solicitadas.
 
-    records = []
-    with LOG_FILE.open("r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                records.append(json.loads(line))
-            except json.JSONDecodeError:
-                # ignorar líneas corruptas
-                continue
+    Las estadísticas son incrementales: los conteos, el último timestamp, las
+    últimas RECENT_SIZE predicciones y el byte ya procesado se guardan en un
+    punto de control junto al log, y cada llamada solo parsea lo agregado
+    desde entonces. Si el log se truncó o se reemplazó (rotación), se
+    reconstruye desde el inicio. Los segmentos rotados se suman desde su
+    resumen en el manifiesto, sin descomprimirlos.
+
+    Con el backend "sqlite" las estadísticas se consultan a los índices.
+    """
+    if _use_sqlite():
+        if not DB_FILE.exists():
+            return {"total_by_state": {}, "last_five": [], "last_timestamp": None}
+        return get_store().stats()
+
+    segments = read_manifest()
+    if LOG_FILE.exists():
+        segments.append(_load_live_stats())
 
+    # Resúmenes (conteos, último timestamp y últimos registros) en orden
     total_by_state = {}
     last_timestamp = None
-    for rec in records:
-        state = rec.get("state")
-        total_by_state[state] = total_by_state.get(state, 0) + 1
-        ts = rec.get("timestamp")
-        if ts:
-            if last_timestamp is None or ts > last_timestamp:
-                last_timestamp = ts
+    recent = deque(maxlen=RECENT_SIZE)
+    for summary in segments:
+        for state, count in summary["total_by_state"]:
+            total_by_state[state] = total_by_state.get(state, 0) + count
+        ts = summary["end"]
+        if ts and (last_timestamp is None or ts > last_timestamp):
+            last_timestamp = ts
+        recent.extend(summary["recent"])
 
     # Últimas 5 predicciones (las últimas del archivo)
-    last_five = records[-5:] if len(records) >= 5 else records
-
     return {
         "total_by_state": total_by_state,
-        "last_five": last_five,
+        "last_five": list(recent)[-5:],
         "last_timestamp": last_timestamp,
     }
+
+
+def _load_live_stats() -> dict:
+    """Estadísticas incrementales del log activo (sin los segmentos rotados)."""
+    checkpoint = _read_checkpoint()
+
+    with LOG_FILE.open("rb") as f:
+        st = os.fstat(f.fileno())
+        signature = _log_signature(f)
+        offset = checkpoint["offset"]
+        if (
+            checkpoint["inode"] != st.st_ino
+            or st.st_size < offset
+            or not signature.startswith(checkpoint["signature"])
+        ):
+            # Log nuevo, truncado o rotado ⇒ reconstruir
+            checkpoint = _empty_checkpoint()
+            offset = 0
+
+        total_by_state = dict(
+            (state, count) for state, count in checkpoint["total_by_state"]
+        )
+        last_timestamp = checkpoint["last_timestamp"]
+        recent = deque(checkpoint["recent"], maxlen=RECENT_SIZE)
+
+        f.seek(offset)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                # Línea final incompleta: solo se consume si ya es JSON válido
+                if _parse_line(raw) is None:
+                    break
+            offset += len(raw)
+
+            rec = _parse_line(raw)
+            if rec is None:
+                # ignorar líneas vacías o corruptas
+                continue
+
+            state = rec.get("state")
+            total_by_state[state] = total_by_state.get(state, 0) + 1
+            ts = rec.get("timestamp")
+            if ts:
+                if last_timestamp is None or ts > last_timestamp:
+                    last_timestamp = ts
+            recent.append(rec)
+
+    _write_checkpoint(
+        {
+            "offset": offset,
+            "inode": st.st_ino,
+            "signature": signature[: 2 * min(offset, STATS_SIGNATURE_BYTES)],
+            "total_by_state": list(total_by_state.items()),
+            "last_timestamp": last_timestamp,
+            "recent": list(recent),
+        }
+    )
+
+    return {
+        "total_by_state": list(total_by_state.items()),
+        "end": last_timestamp,
+        "recent": list(recent),
+    }
+
+
+def tail_predictions(n: int = 5, block_size: int = TAIL_BLOCK_SIZE) -> list[dict]:
+    """
+    Devuelve los últimos n registros completos del log (el más reciente al final)
+    leyendo el archivo desde el final en bloques, sin recorrerlo completo.
+
+    El log se corta por b"\\n" antes de decodificar, por lo que un carácter
+    UTF-8 partido entre dos bloques nunca se decodifica a medias. La línea
+    final incompleta (escritura en curso) y las líneas corruptas se ignoran.
+    """
+    if _use_sqlite():
+        return get_store().latest(n) if DB_FILE.exists() else []
+
+    if n <= 0:
+        return []
+    records = _tail_live(n, block_size)
+    if len(records) < n:
+        # El resto viene de los segmentos rotados (resumen del manifiesto)
+        records = _tail_segments(n - len(records)) + records
+    return records
+
+
+def _tail_live(n: int, block_size: int) -> list[dict]:
+    if not LOG_FILE.exists():
+        return []
+
+    records = []
+    with LOG_FILE.open("rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        pending = b""  # inicio de línea aún no completo
+        while pos > 0 and len(records) < n:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + pending).split(b"\n")
+            pending = lines[0]
+            for raw in reversed(lines[1:]):
+                rec = _parse_line(raw)
+                if rec is not None:
+                    records.append(rec)
+                    if len(records) == n:
+                        break
+        if pos == 0 and len(records) < n:
+            rec = _parse_line(pending)
+            if rec is not None:
+                records.append(rec)
+
+    records.reverse()
+    return records
+
+
+def _tail_segments(n: int) -> list[dict]:
+    """Últimos n registros guardados en el manifiesto (hasta RECENT_SIZE por segmento)."""
+    recent = deque(maxlen=n)
+    for segment in read_manifest():
+        recent.extend(segment["recent"])
+    return list(recent)
+
+
+def log_identity():
+    """
+    Identidad del log actual (backend, inodo, tamaño y mtime), o None si aún
+    no existe. Cambia cada vez que se agregan predicciones; sirve como llave
+    de caché para resultados derivados del log.
+    """
+    if _use_sqlite():
+        paths = [DB_FILE, DB_FILE.with_name(DB_FILE.name + "-wal")]
+    else:
+        # La rotación y la retención cambian el manifiesto de segmentos
+        paths = [LOG_FILE, manifest_file()]
+    identity = [LOG_BACKEND]
+    for path in paths:
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        identity += [str(path.resolve()), st.st_ino, st.st_size, st.st_mtime_ns]
+    return tuple(identity) if len(identity) > 1 else None
+
+
+def iter_records(start=None, end=None):
+    """
+    Recorre todos los registros del log en orden, ignorando líneas corruptas:
+    primero los segmentos rotados y luego el log activo. Con start / end
+    (timestamps ISO, rango [start, end)) se saltan los segmentos completos
+    que caen fuera del rango según el manifiesto.
+    """
+    if _use_sqlite():
+        if DB_FILE.exists():
+            for rec in get_store().iter_records():
+                if _in_range(rec, start, end):
+                    yield rec
+        return
+
+    import gzip
+
+    for segment in read_manifest():
+        if (start is not None and segment["end"] and segment["end"] < start) or (
+            end is not None and segment["start"] and segment["start"] >= end
+        ):
+            continue
+        with gzip.open(SEGMENTS_DIR / segment["file"], "rb") as f:
+            for raw in f:
+                rec = _parse_line(raw)
+                if rec is not None and _in_range(rec, start, end):
+                    yield rec
+
+    if not LOG_FILE.exists():
+        return
+    with LOG_FILE.open("rb") as f:
+        for raw in f:
+            rec = _parse_line(raw)
+            if rec is not None and _in_range(rec, start, end):
+                yield rec
+
+
+def _in_range(rec: dict, start, end) -> bool:
+    if start is None and end is None:
+        return True
+    ts = rec.get("timestamp") or ""
+    return (start is None or ts >= start) and (end is None or ts < end)
+
+
+def predictions_dataframe(start=None, end=None, state=None):
+    """
+    Predicciones registradas como DataFrame (columnas timestamp, state,
+    explanation, inputs), opcionalmente filtradas por rango [start, end) de
+    timestamp y por estado. Lanza FileNotFoundError si aún no hay log.
+    """
+    import pandas as pd
+
+    if _use_sqlite():
+        if not DB_FILE.exists():
+            raise FileNotFoundError(DB_FILE)
+        records = get_store().query(start=start, end=end, state=state)
+        df = pd.DataFrame(
+            records, columns=["timestamp", "state", "explanation", "inputs"]
+        )
+        df["timestamp"] = pd.to_datetime(df["timestamp"])
+        return df
+
+    df = pd.read_json(LOG_FILE, lines=True)
+    if start is not None:
+        df = df[df["timestamp"] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df["timestamp"] < pd.Timestamp(end)]
+    if state is not None:
+        df = df[df["state"] == state]
+    return df
+
+
+def read_archive(start=None, end=None, states=None, columns=None, include_pending=True):
+    """
+    Lee el archivo Parquet de predicciones (ver utils/archive.py) como DataFrame.
+
+    - start / end: rango [start, end) de timestamp (fecha o ISO). Solo se
+      abren las particiones date=... que caen en el rango.
+    - states: lista de estados a incluir.
+    - columns: columnas a leer (proyección); por defecto todas.
+    - include_pending: agrega los registros del log aún no compactados
+      (con el backend "sqlite", los de la base).
+    """
+    import pandas as pd
+
+    from utils.archive import SCHEMA
+
+    table = archive_table(start, end, states, columns=columns, include_pending=include_pending)
+    if table is None:
+        return pd.DataFrame(columns=list(columns) if columns is not None else SCHEMA.names)
+    return table.to_pandas()
+
+
+def archive_table(
+    start=None,
+    end=None,
+    states=None,
+    age_range=None,
+    severity_range=None,
+    columns=None,
+    include_pending=True,
+):
+    """
+    Igual que read_archive pero devuelve una tabla Arrow (None si no hay
+    datos), sin pasar a pandas. age_range y severity_range son rangos
+    cerrados (mínimo, máximo) que se aplican en la lectura del Parquet.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    from utils.archive import SCHEMA, pending_table, to_table
+
+    expr = None
+    date_expr = None
+
+    def _and(a, b):
+        return b if a is None else a & b
+
+    if start is not None:
+        start = pd.Timestamp(start)
+        expr = _and(expr, ds.field("timestamp") >= pa.scalar(start, pa.timestamp("us")))
+        date_expr = _and(date_expr, ds.field("date") >= start.strftime("%Y-%m-%d"))
+    if end is not None:
+        end = pd.Timestamp(end)
+        expr = _and(expr, ds.field("timestamp") < pa.scalar(end, pa.timestamp("us")))
+        date_expr = _and(date_expr, ds.field("date") <= end.strftime("%Y-%m-%d"))
+    if states is not None:
+        expr = _and(expr, ds.field("state").isin(list(states)))
+    for name, bounds in (("age", age_range), ("severity", severity_range)):
+        if bounds is not None:
+            low, high = bounds
+            expr = _and(expr, (ds.field(name) >= low) & (ds.field(name) <= high))
+
+    names = list(columns) if columns is not None else list(SCHEMA.names)
+    tables = []
+    if ARCHIVE_DIR.exists():
+        dataset = ds.dataset(
+            ARCHIVE_DIR,
+            schema=SCHEMA.append(pa.field("date", pa.string())),
+            format="parquet",
+            partitioning=ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive"),
+        )
+        full_expr = expr if date_expr is None else _and(date_expr, expr)
+        tables.append(dataset.to_table(columns=names, filter=full_expr))
+    if include_pending:
+        if _use_sqlite():
+            # compact_log solo procesa el log JSONL: todo está en la base
+            records = []
+            if DB_FILE.exists():
+                records = get_store().query(
+                    start=None if start is None else start.isoformat(),
+                    end=None if end is None else end.isoformat(),
+                )
+            pending = to_table(records)
+        else:
+            pending = pending_table(LOG_FILE, ARCHIVE_DIR)
+        if expr is not None:
+            pending = pending.filter(expr)
+        tables.append(pending.select(names))
+
+    if not tables:
+        return None
+    return pa.concat_tables(tables).unify_dictionaries()
+
+
+# Columnas por las que se puede ordenar la tabla paginada
+SORTABLE_COLUMNS = ("timestamp", "state", "age", "severity", "duration_days")
+
+
+def sorted_archive_table(
+    start=None,
+    end=None,
+    states=None,
+    age_range=None,
+    severity_range=None,
+    sort_by="timestamp",
+    descending=True,
+):
+    """
+    Predicciones filtradas y ordenadas como tabla Arrow (columnar), lista
+    para cortar páginas con slice() sin materializar el resto. Los empates
+    se desempatan por timestamp descendente.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    from utils.archive import to_table
+
+    if sort_by not in SORTABLE_COLUMNS:
+        raise ValueError(f"No se puede ordenar por '{sort_by}'.")
+
+    table = archive_table(start, end, states, age_range, severity_range)
+    if table is None:
+        table = to_table([]).drop_columns(["date"])
+    order = "descending" if descending else "ascending"
+    keys = [(sort_by, order)]
+    if sort_by != "timestamp":
+        keys.append(("timestamp", "descending"))
+    if sort_by == "state":
+        # Los diccionarios no se ordenan directamente: se ordena por el texto
+        indices = pc.sort_indices(
+            pa.table(
+                {
+                    "state": table["state"].cast(pa.string()),
+                    "timestamp": table["timestamp"],
+                }
+            ),
+            sort_keys=keys,
+        )
+    else:
+        indices = pc.sort_indices(table, sort_keys=keys)
+    return table.take(indices).combine_chunks()
@@ -21,11 +21,8 @@ def header():
     )
 
 
-def style_cards():
-    """Add card-like styling for containers or dataframes (soft shadow and rounded corners)."""
-    st.markdown(
-        f"""
-        <style>
+# CSS armado una sola vez al importar el módulo; en cada rerun solo se inyecta
+_CARDS_CSS = f"""
         .stDataFrame, .stTable {{
             border-radius: 12px;
             background-color: {WHITE};
@@ -40,17 +37,9 @@ def style_cards():
             margin-top: 20px;
             margin-bottom: 30px;
         }}
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
+"""
 
-
-def style_sidebar():
-    """Style sidebar area: background, button color, and spacing."""
-    st.markdown(
-        f"""
-        <style>
+_SIDEBAR_CSS = f"""
         section[data-testid="stSidebar"] {{
             background-color: {LIGHT_RED};
             color: {DARK_GRAY};
@@ -60,7 +49,21 @@ def style_sidebar():
             color: {WHITE};
             border-radius: 8px;
         }}
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
+"""
+
+_ALL_CSS = f"<style>{_CARDS_CSS}{_SIDEBAR_CSS}</style>"
+
+
+def style_cards():
+    """Add card-like styling for containers or dataframes (soft shadow and rounded corners)."""
+    st.markdown(f"<style>{_CARDS_CSS}</style>", unsafe_allow_html=True)
+
+
+def style_sidebar():
+    """Style sidebar area: background, button color, and spacing."""
+    st.markdown(f"<style>{_SIDEBAR_CSS}</style>", unsafe_allow_html=True)
+
+
+def inject_styles():
+    """Inject all app styles (cards and sidebar) in a single element."""
+    st.markdown(_ALL_CSS, unsafe_allow_html=True)
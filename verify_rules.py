@@ -0,0 +1,330 @@
+# verify_rules.py
+"""
+Verificación exhaustiva de motores de reglas alternativos.
+
+El dominio de entrada es finito: edad 0–120, severidad 0–10 en pasos de
+0.1, duración 0–3650 días y 7 banderas (~5e10 puntos). Las reglas solo
+comparan edad, severidad y duración con umbrales, así que el dominio se
+parte en clases de equivalencia: para cada variable, los tramos de valores
+consecutivos que dan el mismo resultado en todas las comparaciones (los
+umbrales del conjunto de reglas activo, ruleset.py, más las constantes que
+se leen con ast del código de la referencia y del candidato). Dentro de una
+clase ninguna comparación cambia, y por lo tanto tampoco el resultado de
+las reglas.
+
+La referencia por defecto es rules.reference_predict_state: las reglas con
+los umbrales de rulesets/default.json escritas directamente, sin pasar por
+ruleset.py, así que la verificación no compara el conjunto de reglas
+consigo mismo.
+
+verify() evalúa la referencia y el candidato en las esquinas de cada clase
+(extremos de cada tramo × 128 combinaciones de banderas) y reporta las
+regiones donde difieren. Si la referencia misma no es constante dentro de
+una clase, faltó un umbral y la partición no prueba nada: se reporta como
+clase no homogénea. También comprueba que ambos rechacen entradas fuera
+del dominio (negativas, NaN o infinitas).
+
+Uso:
+    python verify_rules.py [--engine scalar|table|batch|cache|all]
+"""
+import argparse
+import ast
+import inspect
+import operator
+import sys
+import time
+from itertools import product
+
+import math
+
+from rules import PatientKey, reference_predict_state
+
+# Variables numéricas y su dominio (valores de la malla, en orden)
+DOMAIN = {
+    "age": tuple(range(0, 121)),
+    "severity": tuple(k / 10 for k in range(0, 101)),
+    "duration_days": tuple(range(0, 3651)),
+}
+# Nombres con que el código de las reglas se refiere a cada variable
+ALIASES = {
+    "age": "age",
+    "sev": "severity",
+    "severity": "severity",
+    "dur": "duration_days",
+    "duration_days": "duration_days",
+}
+FLAG_FIELDS = (
+    "has_chronic_disease",
+    "has_metastasis",
+    "recent_weight_loss",
+    "is_bedridden",
+    "refractory_pain",
+    "multiple_organ_failure",
+    "has_recent_imaging",
+)
+# Puntos fuera del dominio que todo motor debe rechazar (NaN es una celda
+# vacía en score.py)
+INVALID_POINTS = (
+    {"age": -1},
+    {"severity": -0.1},
+    {"severity": 10.1},
+    {"duration_days": -1},
+    {"age": math.nan},
+    {"severity": math.nan},
+    {"duration_days": math.nan},
+    {"age": math.inf},
+    {"duration_days": math.inf},
+)
+DEFAULT_REPORT_LIMIT = 20
+
+_OPS = {
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+_MIRROR = {ast.Lt: ast.Gt, ast.LtE: ast.GtE, ast.Gt: ast.Lt, ast.GtE: ast.LtE}
+_OP_NAMES = {"<": ast.Lt, "<=": ast.LtE, ">": ast.Gt, ">=": ast.GtE, "==": ast.Eq, "!=": ast.NotEq}
+
+
+def _variable(node):
+    if isinstance(node, ast.Name):
+        return ALIASES.get(node.id)
+    if isinstance(node, ast.Attribute):
+        return ALIASES.get(node.attr)
+    return None
+
+
+def _constant(node):
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        value = _constant(node.operand)
+        return None if value is None else -value
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+    return None
+
+
+def extract_thresholds(*functions) -> dict:
+    """
+    Comparaciones {variable: {(operador, constante)}} en el código de los
+    módulos de las funciones dadas (p. ej. `sev >= 6`, `0 <= sev <= 10`).
+    """
+    found = {name: set() for name in DOMAIN}
+    for fn in functions:
+        module = inspect.getmodule(inspect.unwrap(fn))
+        tree = ast.parse(inspect.getsource(module))
+        for node in ast.walk(tree):
+            if not isinstance(node, ast.Compare):
+                continue
+            operands = [node.left, *node.comparators]
+            for op, left, right in zip(node.ops, operands, operands[1:]):
+                op = type(op)
+                if op not in _OPS:
+                    continue
+                var, value = _variable(left), _constant(right)
+                if var is None or value is None:
+                    var, value = _variable(right), _constant(left)
+                    op = _MIRROR.get(op, op)
+                if var is not None and value is not None:
+                    found[var].add((op, value))
+    return found
+
+
+def rule_thresholds(*functions, comparisons: dict | None = None) -> dict:
+    """
+    extract_thresholds(*functions) más los umbrales del conjunto de reglas
+    activo y los de comparisons ({variable: {(">=", 6), ...}}, p. ej.
+    RuleSet.comparisons() de otro conjunto).
+    """
+    import ruleset
+
+    found = extract_thresholds(*functions)
+    for extra in (ruleset.current().comparisons(), comparisons or {}):
+        for name, pairs in extra.items():
+            found[name] |= {(_OP_NAMES[op], value) for op, value in pairs}
+    return found
+
+
+def partition(values, comparisons) -> list[tuple]:
+    """Tramos (primero, último) de valores consecutivos con las mismas comparaciones."""
+    comparisons = sorted(comparisons, key=lambda c: (c[1], c[0].__name__))
+    spans = []
+    previous = None
+    for value in values:
+        signature = tuple(_OPS[op](value, c) for op, c in comparisons)
+        if signature != previous:
+            spans.append([value, value])
+            previous = signature
+        else:
+            spans[-1][1] = value
+    return [tuple(span) for span in spans]
+
+
+def _corners(spans: dict):
+    """(clase, esquinas) por cada clase: extremos de cada tramo × banderas."""
+    for age, sev, dur in product(spans["age"], spans["severity"], spans["duration_days"]):
+        for flags in product((False, True), repeat=len(FLAG_FIELDS)):
+            region = {"age": age, "severity": sev, "duration_days": dur}
+            points = [
+                PatientKey(
+                    age=a,
+                    severity=s,
+                    duration_days=d,
+                    **dict(zip(FLAG_FIELDS, flags)),
+                )
+                for a, s, d in product(*(sorted(set(span)) for span in (age, sev, dur)))
+            ]
+            yield region, dict(zip(FLAG_FIELDS, flags)), points
+
+
+def _columns(points) -> dict:
+    return {name: [getattr(p, name) for p in points] for name in PatientKey.__slots__}
+
+
+def _batch_results(candidate, points) -> list:
+    states, explanations = candidate(_columns(points), on_invalid="mark")
+    return [None if s is None else (s, e) for s, e in zip(states, explanations)]
+
+
+def _scalar_result(fn, point):
+    try:
+        return fn(point)
+    except ValueError:
+        return None
+
+
+def verify(
+    candidate,
+    reference=reference_predict_state,
+    batch: bool = False,
+    limit: int = DEFAULT_REPORT_LIMIT,
+    comparisons: dict | None = None,
+) -> dict:
+    """
+    Compara candidate con reference en todas las clases de equivalencia.
+    Con batch=True, candidate recibe columnas como rules_batch.predict_state_batch.
+    comparisons agrega umbrales de otro conjunto de reglas (ver
+    rule_thresholds); los del conjunto activo se usan siempre.
+
+    Devuelve clases y puntos evaluados, segundos, las regiones en
+    desacuerdo (hasta limit, con el total en "mismatch_count"), las clases
+    no homogéneas de la referencia y los puntos inválidos mal aceptados.
+    Con "ok" True la equivalencia queda probada en todo el dominio.
+    """
+    started = time.perf_counter()
+    thresholds = rule_thresholds(reference, candidate, comparisons=comparisons)
+    spans = {name: partition(DOMAIN[name], thresholds[name]) for name in DOMAIN}
+
+    classes = list(_corners(spans))
+    points = [p for _, _, pts in classes for p in pts]
+    expected = [_scalar_result(reference, p) for p in points]
+    if batch:
+        got = _batch_results(candidate, points)
+    else:
+        got = [_scalar_result(candidate, p) for p in points]
+
+    mismatches = []
+    mismatch_count = 0
+    inhomogeneous = []
+    i = 0
+    for region, flags, pts in classes:
+        exp, res = expected[i : i + len(pts)], got[i : i + len(pts)]
+        i += len(pts)
+        if len(set(exp)) > 1:
+            inhomogeneous.append({**region, "flags": flags})
+        for point, e, g in zip(pts, exp, res):
+            if e != g:
+                mismatch_count += 1
+                if len(mismatches) < limit:
+                    mismatches.append(
+                        {**region, "flags": flags, "point": point, "expected": e, "got": g}
+                    )
+                break
+
+    invalid_accepted = []
+    base = PatientKey(30, 1.0, 1, *[False] * len(FLAG_FIELDS))
+    for change in INVALID_POINTS:
+        point = PatientKey(**{**{n: getattr(base, n) for n in PatientKey.__slots__}, **change})
+        result = (
+            _batch_results(candidate, [point])[0] if batch else _scalar_result(candidate, point)
+        )
+        if result is not None or _scalar_result(reference, point) is not None:
+            invalid_accepted.append(change)
+
+    return {
+        "ok": not (mismatch_count or inhomogeneous or invalid_accepted),
+        "classes": len(classes),
+        "points": len(points),
+        "spans": {name: len(s) for name, s in spans.items()},
+        "mismatch_count": mismatch_count,
+        "mismatches": mismatches,
+        "inhomogeneous": inhomogeneous[:limit],
+        "invalid_accepted": invalid_accepted,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def engines() -> dict:
+    """
+    Motores del repositorio: nombre ⇒ (función, es_por_lotes). Todos usan
+    el conjunto de reglas activo ("scalar" aplica sus reglas sin la tabla
+    compilada); la referencia, rules.reference_predict_state, no depende de
+    él, así que con un RULESET_FILE distinto del de por defecto las
+    diferencias reportadas son los cambios de umbrales.
+    """
+    from rules import predict_state
+    from rules_batch import predict_state_batch
+    from rules_cache import cached_predict_state
+    from rules_table import predict_state_table
+
+    return {
+        "scalar": (predict_state, False),
+        "table": (predict_state_table, False),
+        "batch": (predict_state_batch, True),
+        "cache": (cached_predict_state, False),
+    }
+
+
+def _format_span(span) -> str:
+    lo, hi = span
+    return f"{lo:g}" if lo == hi else f"{lo:g}–{hi:g}"
+
+
+def main(argv=None) -> int:
+    available = engines()
+    parser = argparse.ArgumentParser(
+        description="Prueba que los motores de reglas coinciden con rules.reference_predict_state."
+    )
+    parser.add_argument("--engine", choices=[*available, "all"], default="all")
+    parser.add_argument("--limit", type=int, default=DEFAULT_REPORT_LIMIT)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for name in available if args.engine == "all" else [args.engine]:
+        fn, batch = available[name]
+        report = verify(fn, batch=batch, limit=args.limit)
+        print(
+            f"{name}: {report['classes']} clases, {report['points']} puntos en "
+            f"{report['seconds']:.2f} s — {'OK' if report['ok'] else 'FALLA'}"
+        )
+        for m in report["mismatches"]:
+            flags = ", ".join(f for f, on in m["flags"].items() if on) or "sin banderas"
+            print(
+                f"  edad {_format_span(m['age'])}, severidad {_format_span(m['severity'])}, "
+                f"duración {_format_span(m['duration_days'])}, {flags}: "
+                f"esperado {m['expected']}, obtenido {m['got']}"
+            )
+        if report["mismatch_count"] > len(report["mismatches"]):
+            print(f"  … {report['mismatch_count']} regiones en total")
+        for region in report["inhomogeneous"]:
+            print(f"  Clase no homogénea en la referencia (falta un umbral): {region}")
+        for change in report["invalid_accepted"]:
+            print(f"  Entrada inválida aceptada: {change}")
+        failed |= not report["ok"]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())